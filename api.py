@@ -0,0 +1,222 @@
+"""Read-only JSON API behind ``/api/v1``.
+
+The API is framework-neutral: ``Api.handle`` takes a session, a path and the
+query arguments and returns a status and a payload, so the same code answers
+the Flask route in app.py and the ASGI application in asgi.py.
+
+    GET /api/v1/venues?fields=id,name,city&limit=20&after=<cursor>
+    GET /api/v1/venues/<id>?fields=...
+    GET /api/v1/artists, /api/v1/artists/<id>
+    GET /api/v1/shows?venue_id=1&upcoming=true
+    GET /api/v1/search?type=venues&q=jazz
+
+Lists are keyset paginated: a page carries ``next``, the cursor of its last
+row, which is passed back as ``?after=`` for the following page.
+"""
+import json
+from collections import namedtuple
+from datetime import datetime
+
+import sqlalchemy as sa
+
+from search import search
+
+API_PAGE_SIZE = 20
+API_MAX_PAGE_SIZE = 100
+
+# fields: public field name -> column (of model, or of a joined model);
+# default_fields: returned when there is no ?fields=; joins: joined model ->
+# onclause, applied only when a requested field needs it; key: the columns a
+# list is ordered and cursored by; genre_column: the model's foreign key in its
+# *_genre table, or None; search_target: a search.SearchTarget, or None;
+# filters: query argument -> function from its value to a filter clause
+ApiResource = namedtuple('ApiResource', [
+    'model', 'fields', 'default_fields', 'joins', 'key', 'genre_column', 'search_target', 'filters'])
+
+
+class ApiError(Exception):
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def parse_bool(value):
+    value = value.strip().lower()
+    if value in ('1', 'true', 'yes'):
+        return True
+    if value in ('0', 'false', 'no'):
+        return False
+    raise ValueError(f'expected true or false, got {value!r}')
+
+
+def equals(column):
+    """Filter on ``column == value``, the value converted to the column's type."""
+    def clause(value):
+        return column == _convert(column, value)
+    return clause
+
+
+def _convert(column, value):
+    python_type = column.type.python_type
+    if python_type is datetime:
+        return datetime.fromisoformat(value)
+    if python_type is bool:
+        return parse_bool(value)
+    return python_type(value)
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+def dumps(payload):
+    return json.dumps(payload, separators=(',', ':'), default=_json_default)
+
+
+class Api:
+
+    def __init__(self, resources, genre_registry):
+        # resources: url segment ('venues') -> ApiResource
+        self.resources = resources
+        self.genre_registry = genre_registry
+
+    def handle(self, session, path, args):
+        """Answer ``GET /api/v1<path>``; return (status, payload)."""
+        try:
+            return 200, self._dispatch(session, path, args)
+        except ApiError as e:
+            return e.status, {'error': e.message}
+
+    def _dispatch(self, session, path, args):
+        parts = [part for part in path.split('/') if part]
+        if parts == ['search']:
+            return self.search_resource(session, args)
+        if not parts or parts[0] not in self.resources or len(parts) > 2:
+            raise ApiError(404, 'not found')
+        resource = self.resources[parts[0]]
+        if len(parts) == 1:
+            return self.list_resource(session, resource, args)
+        try:
+            entity_id = int(parts[1])
+        except ValueError:
+            raise ApiError(404, 'not found')
+        return self.get_resource(session, resource, entity_id, args)
+
+    def list_resource(self, session, resource, args):
+        fields = self._fields(resource, args)
+        limit = self._limit(args)
+        query = self._query(session, resource, fields)
+        for name, clause in resource.filters.items():
+            if args.get(name) not in (None, ''):
+                try:
+                    query = query.filter(clause(args[name]))
+                except ValueError as e:
+                    raise ApiError(400, f'invalid {name}: {e}')
+        after = args.get('after')
+        if after:
+            query = query.filter(_after(resource.key, self._decode_cursor(resource, after)))
+        rows = query.order_by(*resource.key).limit(limit + 1).all()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        next_cursor = None
+        if has_more:
+            next_cursor = _encode_cursor(rows[-1][1:1 + len(resource.key)])
+        return {'data': self._records(session, resource, fields, rows), 'next': next_cursor}
+
+    def get_resource(self, session, resource, entity_id, args):
+        fields = self._fields(resource, args)
+        row = self._query(session, resource, fields).filter(resource.model.id == entity_id).first()
+        if row is None:
+            raise ApiError(404, 'not found')
+        return {'data': self._records(session, resource, fields, [row])[0]}
+
+    def search_resource(self, session, args):
+        searchable = [name for name, resource in self.resources.items() if resource.search_target]
+        resource = self.resources.get(args.get('type'))
+        if resource is None or resource.search_target is None:
+            raise ApiError(400, f'type must be one of {", ".join(searchable)}')
+        fields = self._fields(resource, args)
+        limit = self._limit(args)
+        ids = [row[0] for row in search(session, resource.search_target, args.get('q'), limit)]
+        if not ids:
+            return {'data': []}
+        rows = self._query(session, resource, fields).filter(resource.model.id.in_(ids)).all()
+        # keep the search ranking
+        rank = {entity_id: i for i, entity_id in enumerate(ids)}
+        rows.sort(key=lambda row: rank[row[0]])
+        return {'data': self._records(session, resource, fields, rows)}
+
+    def _fields(self, resource, args):
+        requested = args.get('fields')
+        if not requested:
+            return resource.default_fields
+        fields = [name.strip() for name in requested.split(',') if name.strip()]
+        available = list(resource.fields) + (['genres'] if resource.genre_column is not None else [])
+        unknown = [name for name in fields if name not in available]
+        if unknown:
+            raise ApiError(400, f'unknown fields {", ".join(unknown)}; '
+                                f'available: {", ".join(available)}')
+        return fields
+
+    @staticmethod
+    def _limit(args):
+        try:
+            limit = int(args.get('limit', API_PAGE_SIZE))
+        except ValueError:
+            raise ApiError(400, 'limit must be an integer')
+        return min(max(limit, 1), API_MAX_PAGE_SIZE)
+
+    @staticmethod
+    def _query(session, resource, fields):
+        # rows are (id, *key columns, *requested columns), read by position
+        model = resource.model
+        columns = [resource.fields[name] for name in fields if name != 'genres']
+        query = session.query(model.id, *resource.key, *columns).select_from(model)
+        needed = {column.class_ for column in columns + list(resource.key)}
+        for joined, onclause in resource.joins.items():
+            if joined in needed:
+                query = query.join(joined, onclause)
+        return query
+
+    def _records(self, session, resource, fields, rows):
+        names = [name for name in fields if name != 'genres']
+        offset = 1 + len(resource.key)
+        records = [dict(zip(names, row[offset:])) for row in rows]
+        if 'genres' in fields:
+            link = resource.genre_column
+            genre_ids = {row[0]: [] for row in rows}
+            if genre_ids:
+                for owner_id, genre_id in session.query(link, link.table.c.genre_id).filter(
+                        link.in_(list(genre_ids))).order_by(link, link.table.c.genre_id):
+                    genre_ids[owner_id].append(genre_id)
+            for record, row in zip(records, rows):
+                record['genres'] = self.genre_registry.names_for_ids(genre_ids[row[0]])
+        return records
+
+    @staticmethod
+    def _decode_cursor(resource, cursor):
+        parts = cursor.rsplit('_', len(resource.key) - 1)
+        if len(parts) != len(resource.key):
+            raise ApiError(400, 'invalid cursor')
+        try:
+            return [_convert(column, part) for column, part in zip(resource.key, parts)]
+        except ValueError:
+            raise ApiError(400, 'invalid cursor')
+
+
+def _encode_cursor(values):
+    # the same "<iso start_date>_<id>" form as the /shows page cursors
+    return '_'.join(value.isoformat() if isinstance(value, datetime) else str(value)
+                    for value in values)
+
+
+def _after(columns, values):
+    # (a, b) > (x, y) spelled out, so that it can use the (a, b) index everywhere
+    column, value = columns[0], values[0]
+    if len(columns) == 1:
+        return column > value
+    return sa.or_(column > value, sa.and_(column == value, _after(columns[1:], values[1:])))
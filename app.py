@@ -1,26 +1,93 @@
 # ----------------------------------------------------------------------------#
 # Imports
 # ----------------------------------------------------------------------------#
-import dateutil.parser
-import babel
-from flask import Flask, render_template, request, Response, flash, redirect, url_for, abort, jsonify
-from flask_moment import Moment
+# babel, dateutil, wtforms (through forms.py) and Flask-Migrate's alembic are
+# imported where they are first used, so that a worker builds the app
+# without loading them
+from flask import (Blueprint, Flask, render_template, request, Response, flash, redirect, url_for, abort, jsonify,
+                   session, before_render_template, current_app, send_from_directory, stream_with_context)
 from flask_sqlalchemy import SQLAlchemy
 import logging
 from logging import Formatter, FileHandler
-from flask_wtf import Form
-from forms import *
-from flask_migrate import Migrate
+from config import get_config
+from sqlalchemy import event, orm
+from sqlalchemy.exc import SQLAlchemyError
+from genres import GenreRegistry
+from page_cache import PageCache
+from profiler import RequestProfiler, logger as profiler_logger
+from http_cache import (STATIC_MAX_AGE, conditional_response, init_static_fingerprints, page_etag,
+                        templates_fingerprint)
+from search import SearchTarget, search
+from typeahead import PrefixIndex
+from upcoming import RefresherLock, UpcomingRefresher, UpcomingShows, ics_calendar
+from bookings import BookingValidator, schedule_from_records
+from deletes import CascadeDelete, DeleteTarget
+from recommendations import FeatureReloader, RecommendationSide, Recommender
+from replicas import ReplicaReads, ReplicaRouter, read_only
+from images import MEDIA_URL, ImageStore
+from geo import distance_km_sql, geohash, geohash_ranges, locate
+from api import Api, ApiResource, dumps as api_dumps, equals, parse_bool
 import sys
+import click
+from flask.cli import AppGroup
+from bulk import (BulkSpec, IMPORT_CHUNK_SIZE, Throughput, export_fieldnames, export_records,
+                  guess_format, import_records, read_records, write_records)
+from datetime import datetime
+from functools import lru_cache, partial
+from itertools import groupby
+from werkzeug.datastructures import CombinedMultiDict
 # ----------------------------------------------------------------------------#
 # App Config.
 # ----------------------------------------------------------------------------#
 
-app = Flask(__name__)
-moment = Moment(app)
-app.config.from_object('config')
-db = SQLAlchemy(app)
-migrate = Migrate(app, db)
+try:  # Flask-SQLAlchemy 3
+    from flask_sqlalchemy.session import Session as FlaskSession
+except ImportError:  # Flask-SQLAlchemy 2
+    from flask_sqlalchemy import SignallingSession as FlaskSession
+
+
+class RoutingSession(ReplicaReads, FlaskSession):
+    pass
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+
+    def create_session(self, options):
+        # Flask-SQLAlchemy 2; 3 takes the session class from session_options
+        return orm.sessionmaker(db=self, **options)
+
+
+# bound to an app by create_app below
+db = RoutingSQLAlchemy(session_options={'class_': RoutingSession})
+page_cache = PageCache()
+profiler = RequestProfiler()
+image_store = ImageStore()
+
+main_blueprint = Blueprint('main', __name__)
+venues_blueprint = Blueprint('venues', __name__)
+artists_blueprint = Blueprint('artists', __name__)
+shows_blueprint = Blueprint('shows', __name__)
+# operational JSON for the people running the site, registered only when
+# internal endpoints are enabled (see create_app)
+internal_blueprint = Blueprint('internal', __name__)
+
+
+def release_db_connection(sender, template, context, **extra):
+    # everything a page shows has been loaded by the time it renders, so end
+    # the transaction and return the connection to the pool rather than hold
+    # it while the template renders and the response is sent
+    db.session.close()
+
+
+def include_in_migrations(object, name, type_, reflected, compare_to):
+    # search.py's FTS5 tables and trigram indexes exist only in the database,
+    # so keep autogenerate from proposing to drop them
+    if type_ == 'table':
+        return '_fts' not in name
+    if type_ == 'index':
+        return not name.endswith('_trgm')
+    return True
+
 
 # ----------------------------------------------------------------------------#
 # Models.
@@ -29,20 +96,32 @@ migrate = Migrate(app, db)
 
 class Genre(db.Model):
     __tablename__ = 'Genre'
+    __table_args__ = (
+        db.Index('ix_Genre_name', 'name', unique=True),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String)
+    updated_at = db.Column(db.DateTime, nullable=False,
+                           default=datetime.utcnow, onupdate=datetime.utcnow)
 
 
 artist_genre = db.Table('artist_genre', db.Column('genre_id', db.Integer, db.ForeignKey(
-    'Genre.id'), primary_key=True), db.Column('artist_id', db.Integer, db.ForeignKey('Artist.id'), primary_key=True))
+    'Genre.id'), primary_key=True), db.Column('artist_id', db.Integer, db.ForeignKey('Artist.id'), primary_key=True),
+    db.Index('ix_artist_genre_artist_id', 'artist_id'))
 
 venue_genre = db.Table('venue_genre', db.Column('genre_id', db.Integer, db.ForeignKey(
-    'Genre.id'), primary_key=True), db.Column('venue_id', db.Integer, db.ForeignKey('Venue.id'), primary_key=True))
+    'Genre.id'), primary_key=True), db.Column('venue_id', db.Integer, db.ForeignKey('Venue.id'), primary_key=True),
+    db.Index('ix_venue_genre_venue_id', 'venue_id'))
 
 
 class Venue(db.Model):
     __tablename__ = 'Venue'
+    __table_args__ = (
+        db.Index('ix_Venue_state_city', 'state', 'city'),
+        db.Index('ix_Venue_updated_at', 'updated_at'),
+        db.Index('ix_Venue_geohash', 'geohash'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String, nullable=False)
@@ -50,14 +129,21 @@ class Venue(db.Model):
     state = db.Column(db.String(120), nullable=False)
     address = db.Column(db.String(120), nullable=False)
     phone = db.Column(db.String(120))
-    image_link = db.Column(db.String(500))
+    # the long text columns only load with undefer_group('profile') or on first access
+    image_link = db.deferred(db.Column(db.String(500)), group='profile')
     facebook_link = db.Column(db.String(120))
     website_Link = db.Column(db.String(120))
-    seeking_Description = db.Column(db.String(500))
+    seeking_Description = db.deferred(db.Column(db.String(500)), group='profile')
     genres = db.relationship(
         "Genre", secondary=venue_genre, backref=db.backref("venue"))
     talent = db.Column(db.Boolean, default=False)
     shows = db.relationship("Show", backref="venue", lazy=True)
+    # the centroid of the venue's city (see locate_venue), and its geohash
+    latitude = db.Column(db.Float)
+    longitude = db.Column(db.Float)
+    geohash = db.Column(db.BigInteger)
+    updated_at = db.Column(db.DateTime, nullable=False,
+                           default=datetime.utcnow, onupdate=datetime.utcnow)
 
     def __repr__(self):
         return f'<id= {self.id} name={self.name} city={self.city}>'
@@ -66,20 +152,25 @@ class Venue(db.Model):
 
 class Artist(db.Model):
     __tablename__ = 'Artist'
+    __table_args__ = (
+        db.Index('ix_Artist_updated_at', 'updated_at'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String, nullable=False)
     city = db.Column(db.String(120), nullable=False)
     state = db.Column(db.String(120), nullable=False)
     phone = db.Column(db.String(120))
-    image_link = db.Column(db.String(500))
+    image_link = db.deferred(db.Column(db.String(500)), group='profile')
     facebook_link = db.Column(db.String(120))
     website_Link = db.Column(db.String(120))
-    seeking_Description = db.Column(db.String(300))
+    seeking_Description = db.deferred(db.Column(db.String(300)), group='profile')
     genres = db.relationship(
         "Genre", secondary=artist_genre, backref=db.backref("artist"))
     seeking_venue = db.Column(db.Boolean, default=False)
     shows = db.relationship("Show", backref="artist", lazy=True)
+    updated_at = db.Column(db.DateTime, nullable=False,
+                           default=datetime.utcnow, onupdate=datetime.utcnow)
 
     def __repr__(self):
         return f'<id= {self.id} name={self.name} city={self.city}>'
@@ -90,37 +181,340 @@ class Artist(db.Model):
 
 class Show(db.Model):
     __tablename__ = 'Show'
+    __table_args__ = (
+        db.Index('ix_Show_venue_id_start_date', 'venue_id', 'start_date'),
+        db.Index('ix_Show_artist_id_start_date', 'artist_id', 'start_date'),
+        # also serves the (start_date, id) keyset order of /shows
+        db.Index('ix_Show_start_date_id', 'start_date', 'id'),
+        db.Index('ix_Show_updated_at', 'updated_at'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     venue_id = db.Column(db.Integer, db.ForeignKey("Venue.id"), nullable=False)
     artist_id = db.Column(db.Integer, db.ForeignKey(
         "Artist.id"), nullable=False)
     start_date = db.Column(db.DateTime, nullable=False)
+    updated_at = db.Column(db.DateTime, nullable=False,
+                           default=datetime.utcnow, onupdate=datetime.utcnow)
 
     def __repr__(self):
         return f'<id= {self.id} venue_id={self.venue_id} artist_id={self.artist_id}>'
 
+
+class UpcomingShow(db.Model):
+    # shows that have not started yet, with their venue and artist names copied
+    # in; written only through upcoming_shows below
+    __tablename__ = 'upcoming_show'
+    __table_args__ = (
+        db.Index('ix_upcoming_show_start_date_show_id', 'start_date', 'show_id'),
+        db.Index('ix_upcoming_show_venue_id_start_date', 'venue_id', 'start_date'),
+        db.Index('ix_upcoming_show_artist_id_start_date', 'artist_id', 'start_date'),
+    )
+    show_id = db.Column(db.Integer, db.ForeignKey('Show.id', ondelete='CASCADE'), primary_key=True)
+    venue_id = db.Column(db.Integer, nullable=False)
+    artist_id = db.Column(db.Integer, nullable=False)
+    start_date = db.Column(db.DateTime, nullable=False)
+    venue_name = db.Column(db.String, nullable=False)
+    venue_image_link = db.Column(db.String(500))
+    artist_name = db.Column(db.String, nullable=False)
+    artist_image_link = db.Column(db.String(500))
+
+    def __repr__(self):
+        return f'<show_id= {self.show_id} start_date={self.start_date}>'
+
+
+class Recommendation(db.Model):
+    # each venue's best matching artists and each artist's best matching
+    # venues, best first; written only through recommender below
+    __tablename__ = 'recommendation'
+    __table_args__ = (
+        db.Index('ix_recommendation_owner_kind_target_id', 'owner_kind', 'target_id'),
+    )
+    owner_kind = db.Column(db.String(6), primary_key=True)
+    owner_id = db.Column(db.Integer, primary_key=True)
+    rank = db.Column(db.Integer, primary_key=True)
+    target_id = db.Column(db.Integer, nullable=False)
+    score = db.Column(db.Float, nullable=False)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<{self.owner_kind} {self.owner_id} #{self.rank} target_id={self.target_id}>'
+
+
+class ReplicationPosition(db.Model):
+    # a single row, bumped by every transaction that writes to the primary
+    # where the database has no replication position of its own (SQLite);
+    # see replicas.py
+    __tablename__ = 'replication_position'
+    id = db.Column(db.Integer, primary_key=True)
+    position = db.Column(db.BigInteger, nullable=False)
+    written_at = db.Column(db.DateTime, nullable=False)
+
+    def __repr__(self):
+        return f'<position={self.position} written_at={self.written_at}>'
+
+
+venue_search = SearchTarget(Venue, venue_genre.c.venue_id, Genre, 'venue_fts')
+artist_search = SearchTarget(Artist, artist_genre.c.artist_id, Genre, 'artist_fts')
+
+genre_registry = GenreRegistry(
+    lambda: db.session.query(Genre.id, Genre.name).order_by(Genre.id).all())
+
+for genre_event in ('after_insert', 'after_update', 'after_delete'):
+    event.listen(Genre, genre_event, lambda *args: genre_registry.invalidate())
+
+
+def locate_venue(mapper, connection, venue):
+    # no geocoder: venues are placed at their city's centroid from the bundled table
+    position = locate(venue.city, venue.state)
+    venue.latitude, venue.longitude = position or (None, None)
+    venue.geohash = geohash(*position) if position else None
+
+
+for venue_event in ('before_insert', 'before_update'):
+    event.listen(Venue, venue_event, locate_venue)
+
+
+def with_genre_choices(form):
+    form.genres.choices = genre_registry.choices()
+    return form
+
+
+def form_data():
+    # the submitted fields together with the uploaded image, if any
+    return CombinedMultiDict((request.files, request.form))
+
+
+def submitted_image_link(form):
+    # an uploaded image is stored, and replaces whatever link was typed in
+    if form.image.data:
+        return image_store.save(form.image.data)
+    return form.image_link.data
+
+
+def set_genres(link_column, owner_id, genre_ids, replace=False):
+    # writes the whole venue_genre / artist_genre set for one owner in a
+    # single executemany instead of one relationship append per genre
+    link_table = link_column.table
+    if replace:
+        db.session.execute(link_table.delete().where(link_column == owner_id))
+    if genre_ids:
+        db.session.execute(link_table.insert(), [
+            {'genre_id': genre_id, link_column.name: owner_id} for genre_id in genre_ids])
+
+
+typeahead_indexes = {
+    'venue': PrefixIndex(lambda: db.session.query(Venue.id, Venue.name).all()),
+    'artist': PrefixIndex(lambda: db.session.query(Artist.id, Artist.name).all())
+}
+
+upcoming_shows = UpcomingShows(UpcomingShow, Show, Venue, Artist)
+booking_validator = BookingValidator(Show, Venue, Artist)
+cascade_delete = CascadeDelete(Show, UpcomingShow, {
+    'venue': DeleteTarget(Venue, Show.venue_id, Show.artist_id, venue_genre.c.venue_id, UpcomingShow.venue_id),
+    'artist': DeleteTarget(Artist, Show.artist_id, Show.venue_id, artist_genre.c.artist_id, UpcomingShow.artist_id)
+})
+recommender = Recommender(Recommendation, {
+    'venue': RecommendationSide(Venue, Venue.talent, venue_genre.c.venue_id, Show.venue_id),
+    'artist': RecommendationSide(Artist, Artist.seeking_venue, artist_genre.c.artist_id, Show.artist_id)
+})
+replica_router = ReplicaRouter(ReplicationPosition, RoutingSession)
+
+
+upcoming_refresher_lock = RefresherLock()
+
+
+def holds_refresher_lock(app):
+    # called on the refresher's thread, outside any request
+    with app.app_context():
+        return upcoming_refresher_lock.acquire(db.engine)
+
+
+def reload_recommendations(app):
+    # called on the reloader's thread, outside any request
+    with app.app_context():
+        pages = recommender.reload(db.session)
+        db.session.commit()
+        invalidate_pages(pages)
+
+
+def refresh_upcoming_shows(app, rebuild=False):
+    with app.app_context():
+        if rebuild:
+            upcoming_shows.rebuild(db.session)
+        else:
+            upcoming_shows.expire(db.session)
+        db.session.commit()
+
+
+def upcoming_shows_filter(value):
+    now = datetime.now()
+    return Show.start_date > now if parse_bool(value) else Show.start_date <= now
+
+
+api_v1 = Api({
+    'venues': ApiResource(
+        Venue,
+        fields={
+            'id': Venue.id, 'name': Venue.name, 'city': Venue.city, 'state': Venue.state,
+            'address': Venue.address, 'phone': Venue.phone, 'image_link': Venue.image_link,
+            'facebook_link': Venue.facebook_link, 'website': Venue.website_Link,
+            'seeking_talent': Venue.talent, 'seeking_description': Venue.seeking_Description,
+            'latitude': Venue.latitude, 'longitude': Venue.longitude, 'updated_at': Venue.updated_at
+        },
+        default_fields=['id', 'name', 'city', 'state'],
+        joins={},
+        key=(Venue.id,),
+        genre_column=venue_genre.c.venue_id,
+        search_target=venue_search,
+        filters={'city': equals(Venue.city), 'state': equals(Venue.state)}),
+    'artists': ApiResource(
+        Artist,
+        fields={
+            'id': Artist.id, 'name': Artist.name, 'city': Artist.city, 'state': Artist.state,
+            'phone': Artist.phone, 'image_link': Artist.image_link,
+            'facebook_link': Artist.facebook_link, 'website': Artist.website_Link,
+            'seeking_venue': Artist.seeking_venue, 'seeking_description': Artist.seeking_Description,
+            'updated_at': Artist.updated_at
+        },
+        default_fields=['id', 'name', 'city', 'state'],
+        joins={},
+        key=(Artist.id,),
+        genre_column=artist_genre.c.artist_id,
+        search_target=artist_search,
+        filters={'city': equals(Artist.city), 'state': equals(Artist.state)}),
+    'shows': ApiResource(
+        Show,
+        fields={
+            'id': Show.id, 'start_time': Show.start_date,
+            'venue_id': Show.venue_id, 'venue_name': Venue.name,
+            'artist_id': Show.artist_id, 'artist_name': Artist.name,
+            'artist_image_link': Artist.image_link
+        },
+        default_fields=['id', 'start_time', 'venue_id', 'venue_name', 'artist_id', 'artist_name'],
+        joins={Venue: Venue.id == Show.venue_id, Artist: Artist.id == Show.artist_id},
+        key=(Show.start_date, Show.id),
+        genre_column=None,
+        search_target=None,
+        filters={'venue_id': equals(Show.venue_id), 'artist_id': equals(Show.artist_id),
+                 'upcoming': upcoming_shows_filter})
+}, genre_registry)
+
 # ----------------------------------------------------------------------------#
 # Filters.
 # ----------------------------------------------------------------------------#
 
 
-def format_datetime(value, format='medium'):
-    date = dateutil.parser.parse(value)
-    if format == 'full':
-        format = "EEEE MMMM, d, y 'at' h:mma"
-    elif format == 'medium':
-        format = "EE MM, dd, y h:mma"
-    return babel.dates.format_datetime(date, format, locale='en')
+DATETIME_FORMATS = {
+    'full': "EEEE MMMM, d, y 'at' h:mma",
+    'medium': "EE MM, dd, y h:mma"
+}
+
+
+@lru_cache(maxsize=None)
+def datetime_formatter(format, locale):
+    # parsing the babel pattern and loading the locale cost far more than
+    # applying them, so both are built once per (format, locale)
+    import babel
+    import babel.dates
+    pattern = babel.dates.parse_pattern(DATETIME_FORMATS.get(format, format))
+    return pattern, babel.Locale.parse(locale)
 
 
-app.jinja_env.filters['datetime'] = format_datetime
+@main_blueprint.app_template_filter('datetime')
+def format_datetime(value, format='medium', locale='en'):
+    # views pass datetimes straight through; strings are still accepted
+    if not isinstance(value, datetime):
+        import dateutil.parser
+        value = dateutil.parser.parse(value)
+    pattern, babel_locale = datetime_formatter(format, locale)
+    return pattern.apply(value, babel_locale)
+
 
 # ----------------------------------------------------------------------------#
 # Controllers.
 # ----------------------------------------------------------------------------#
 
 
-@app.route('/')
+@lru_cache(maxsize=None)
+def page_templates_version():
+    # every app create_app builds renders the same template folder
+    return templates_fingerprint(current_app)
+
+
+LISTING_BATCH_SIZE = 1000
+# template output events joined into each chunk written to the client
+LISTING_STREAM_BUFFER = 64
+
+
+def streamed_from_session(body):
+    # the view's app context, and with it the scoped session, is torn down as
+    # soon as the view returns; a streamed body reads its rows afterwards
+    # through that session, which is no longer in the registry for teardown to
+    # find, so close it (and return its connection) once the body is sent
+    session = db.session()
+
+    def generate():
+        try:
+            yield from body
+        finally:
+            session.close()
+    return stream_with_context(generate())
+
+
+def render_listing(template_name, **context):
+    # with STREAM_LISTINGS on, the page is rendered as it is sent: the template
+    # pulls rows from the iterators in context through a server-side cursor,
+    # so neither the rows nor the page are ever held in memory whole, and the
+    # connection stays checked out until the last row is written
+    if not current_app.config['STREAM_LISTINGS']:
+        return render_template(template_name, **context)
+    current_app.update_template_context(context)
+    stream = current_app.jinja_env.get_template(template_name).stream(context)
+    stream.enable_buffering(LISTING_STREAM_BUFFER)
+    return Response(streamed_from_session(stream), mimetype='text/html')
+
+
+def show_markers(*filters):
+    # how many shows there are and when one was last changed
+    return [
+        db.session.query(db.func.count(Show.id)).filter(*filters),
+        db.session.query(db.func.max(Show.updated_at)).filter(*filters)
+    ]
+
+
+def passed_show_boundary(*filters):
+    # the latest start time already in the past; pages that split shows into
+    # upcoming and past change exactly when this does
+    return db.session.query(db.func.max(Show.start_date)).filter(
+        Show.start_date <= datetime.now(), *filters)
+
+
+def conditional_page(markers, render, boundary=None, cached=None, image=None):
+    # every marker is a scalar subquery of a single SELECT, so validating a
+    # page costs one round trip however many tables it depends on; cached is
+    # the (kind, entity_id, variant) the page cache keeps the page under, the
+    # variant possibly a function of the markers' values; image selects the
+    # image_link of the record whose picture heads the page
+    queries = list(markers) + ([image] if image is not None else []) + (
+        [boundary] if boundary is not None else [])
+    values = tuple(db.session.query(
+        *[query.label(f'marker_{i}') for i, query in enumerate(queries)]).one())
+    # a 304 or a page cache hit needs nothing more from the database
+    db.session.close()
+    validators = (page_templates_version(),) + values
+    if image is not None:
+        # the page changes once the record's upload has its thumbnails
+        validators += (image_store.missing(values[len(markers)]),)
+    if cached is not None:
+        kind, entity_id, variant = cached
+        if callable(variant):
+            variant = variant(*values[:len(markers)])
+        render = partial(cached_page, kind, entity_id, variant, page_etag(validators), render)
+    return conditional_response(validators, render, cacheable='_flashes' not in session)
+
+
+
+@main_blueprint.route('/')
 def index():
     return render_template('pages/home.html')
 
@@ -128,123 +522,289 @@ def index():
 #  ----------------------------------------------------------------
 
 
-@app.route('/venues')
+@venues_blueprint.route('/venues')
 def venues():
     # TODO: replace with real venues data. (done)
-    #       num_upcoming_shows should be aggregated based on number of upcoming shows per venue.
-    venues_locations = Venue.query.distinct(Venue.city, Venue.state).all()
-    lists = []
-    for location in venues_locations:
-        venues = Venue.query.filter_by(
-            city=location.city, state=location.state).all()
-        list = {
-            'city': location.city,
-            'state': location.state,
-            'venues': venues
-        }
-        lists.append(list)
-
-    return render_template('pages/venues.html', areas=lists)
-
-
-@app.route('/venues/search', methods=['POST'])
+    #       num_upcoming_shows should be aggregated based on number of upcoming shows per venue. (done)
+    def render():
+        # upcoming_show holds only shows yet to start, so one GROUP BY over its
+        # (venue_id, start_date) index counts them for every venue at once
+        upcoming = db.session.query(
+            UpcomingShow.venue_id, db.func.count(UpcomingShow.show_id).label('num_upcoming_shows')
+        ).filter(UpcomingShow.start_date > datetime.now()).group_by(UpcomingShow.venue_id).subquery()
+
+        rows = db.session.query(
+            Venue.id, Venue.name, Venue.city, Venue.state,
+            db.func.coalesce(upcoming.c.num_upcoming_shows, 0).label('num_upcoming_shows')
+        ).outerjoin(upcoming, upcoming.c.venue_id == Venue.id).order_by(
+            Venue.state, Venue.city, Venue.id).execution_options(
+            stream_results=True).yield_per(LISTING_BATCH_SIZE)
+
+        # rows are already sorted by area, so a single lazy groupby pass builds
+        # the directory as the template walks it
+        areas = ({
+            'city': city,
+            'state': state,
+            'venues': area_rows
+        } for (state, city), area_rows in groupby(rows, key=lambda row: (row.state, row.city)))
+
+        return render_listing('pages/venues.html', areas=areas)
+
+    # the counts change as shows are added or moved and as they start
+    return conditional_page([
+        db.session.query(db.func.count(Venue.id)),
+        db.session.query(db.func.max(Venue.updated_at)),
+        *show_markers()
+    ], render, boundary=passed_show_boundary())
+
+
+@venues_blueprint.route('/venues/search', methods=['POST'])
+@read_only
 def search_venues():
     # TODO: implement search on artists with partial string search. Ensure it is case-insensitive. (done)
     # seach for Hop should return "The Musical Hop".
     # search for "Music" should return "The Musical Hop" and "Park Square Live Music & Coffee"
-    search = request.form.get('search_term')
-    venues = Venue.query.filter(Venue.name.ilike(f'%{search}%')).all()
-    results = []
-    for result in venues:
-        venue = {
-            "id": result.id,
-            "name": result.name
-        }
-        results.append(venue)
-
+    # (id, name) rows go to the template as they are
+    venues = search(db.session, venue_search, request.form.get('search_term'))
     response = {
         "count": len(venues),
-        "data": results
+        "data": venues
     }
     return render_template('pages/search_venues.html', results=response, search_term=request.form.get('search_term', ''))
 
 
-@app.route('/venues/<int:venue_id>')
+NEAR_DEFAULT_RADIUS_KM = 25
+NEAR_MAX_RADIUS_KM = 500
+NEAR_RESULT_LIMIT = 100
+
+
+@venues_blueprint.route('/venues/near')
+def venues_near():
+    latitude = request.args.get('lat', type=float)
+    longitude = request.args.get('lon', type=float)
+    radius = request.args.get('radius', NEAR_DEFAULT_RADIUS_KM, type=float)
+    if latitude is None or longitude is None or not -90 <= latitude <= 90 or \
+            not -180 <= longitude <= 180 or not 0 < radius <= NEAR_MAX_RADIUS_KM:
+        abort(400)
+
+    # a few index range scans on the geohash cells around the point; of the
+    # venues in those cells, the database keeps the nearest within the radius
+    cells = [Venue.geohash.between(low, high) for low, high in geohash_ranges(latitude, longitude, radius)]
+    distance = distance_km_sql(latitude, longitude, Venue.latitude, Venue.longitude)
+    rows = db.session.query(Venue.id, Venue.name, Venue.city, Venue.state, distance.label('distance')).filter(
+        db.or_(*cells), distance <= radius).order_by(distance, Venue.name).limit(NEAR_RESULT_LIMIT)
+    nearby = [{'id': row.id, 'name': row.name, 'city': row.city, 'state': row.state, 'distance': row.distance}
+              for row in rows]
+    return render_template('pages/venues_near.html', venues=nearby, latitude=latitude,
+                           longitude=longitude, radius=radius)
+
+
+DETAIL_SHOWS_PAGE_SIZE = 12
+
+
+def cached_page(kind, entity_id, variant, etag, render):
+    # render() returns the page html and the time it goes stale on its own;
+    # etag is the page's, so an entry rendered before the data changed is
+    # never served under the new one; pages carrying a flash message are
+    # per-user and never cached
+    cacheable = '_flashes' not in session
+    if cacheable:
+        html = page_cache.get(kind, entity_id, variant, etag)
+        if html is not None:
+            return html, {'X-Cache': 'HIT'}
+    html, expires_at = render()
+    # a page read from a replica that is still behind may miss a write whose
+    # invalidation has already happened
+    if cacheable and not replica_router.behind():
+        page_cache.set(kind, entity_id, variant, etag, html,
+                       expires_at.timestamp() if expires_at else None)
+    return html, {'X-Cache': 'MISS'}
+
+
+def show_counterpart_ids(owner_column, owner_id, counterpart_column):
+    # the venues an artist has played (or the artists a venue has hosted); their
+    # pages render this entity's name and image next to each show
+    return [row[0] for row in db.session.query(counterpart_column).filter(
+        owner_column == owner_id).distinct()]
+
+
+def get_recommendations(owner_kind, owner_id, target):
+    # the owner's stored list, best first, with what the panel shows of each
+    prefix = target.__tablename__.lower()
+    rows = db.session.query(target.id, target.name, target.image_link, target.city, target.state).join(
+        Recommendation, Recommendation.target_id == target.id).filter(
+        Recommendation.owner_kind == owner_kind, Recommendation.owner_id == owner_id).order_by(
+        Recommendation.rank).all()
+    return [{
+        f'{prefix}_id': row.id,
+        f'{prefix}_name': row.name,
+        f'{prefix}_image_link': row.image_link,
+        'city': row.city,
+        'state': row.state
+    } for row in rows]
+
+
+def recommendations_marker(owner_kind, owner_id):
+    # lists are rewritten whole, so a changed list has a new updated_at
+    return db.session.query(db.func.max(Recommendation.updated_at)).filter(
+        Recommendation.owner_kind == owner_kind, Recommendation.owner_id == owner_id)
+
+
+def invalidate_pages(pages):
+    # pages: {kind: ids}, as returned by recommender.refresh
+    for kind, ids in pages.items():
+        page_cache.invalidate(kind, *ids)
+
+
+def past_shows_count(owned):
+    return db.session.query(db.func.count(Show.id)).filter(owned, Show.start_date < datetime.now())
+
+
+def clamp_past_page(past_page, past_count):
+    past_pages = max((past_count + DETAIL_SHOWS_PAGE_SIZE - 1) // DETAIL_SHOWS_PAGE_SIZE, 1)
+    return min(max(past_page, 1), past_pages), past_pages
+
+
+def get_partitioned_shows(owner_column, owner_id, counterpart, past_page=1):
+    # splits an artist's or venue's shows into upcoming and past in SQL, joined
+    # to the other side of the booking; only one page of each is ever loaded
+    now = datetime.now()
+    prefix = counterpart.__tablename__.lower()
+    columns = (Show.start_date,
+               counterpart.id.label(f'{prefix}_id'),
+               counterpart.name.label(f'{prefix}_name'),
+               counterpart.image_link.label(f'{prefix}_image_link'))
+    counterpart_column = getattr(Show, f'{prefix}_id')
+
+    # upcoming shows come from the upcoming_show store, past ones from Show
+    store_owner = getattr(UpcomingShow, owner_column.key)
+    upcoming_count, past_count = db.session.query(
+        db.session.query(db.func.count(UpcomingShow.show_id)).filter(
+            store_owner == owner_id, UpcomingShow.start_date >= now).label('upcoming_count'),
+        db.session.query(db.func.count(Show.id)).filter(
+            owner_column == owner_id, Show.start_date < now).label('past_count')
+    ).one()
+
+    upcoming = db.session.query(
+        UpcomingShow.start_date,
+        getattr(UpcomingShow, f'{prefix}_id'),
+        getattr(UpcomingShow, f'{prefix}_name'),
+        getattr(UpcomingShow, f'{prefix}_image_link')
+    ).filter(store_owner == owner_id, UpcomingShow.start_date >= now).order_by(
+        UpcomingShow.start_date, UpcomingShow.show_id).limit(DETAIL_SHOWS_PAGE_SIZE).all()
+
+    base = db.session.query(*columns).join(
+        counterpart, counterpart.id == counterpart_column).filter(owner_column == owner_id)
+
+    past_page, past_pages = clamp_past_page(past_page, past_count)
+    past = base.filter(Show.start_date < now).order_by(
+        Show.start_date.desc(), Show.id.desc()).offset(
+        (past_page - 1) * DETAIL_SHOWS_PAGE_SIZE).limit(DETAIL_SHOWS_PAGE_SIZE).all()
+
+    def show_data(row):
+        return {
+            f'{prefix}_id': row[1],
+            f'{prefix}_name': row[2],
+            f'{prefix}_image_link': row[3],
+            'start_time': row.start_date
+        }
+
+    return {
+        "next_show_start": upcoming[0].start_date if upcoming else None,
+        "past_shows": [show_data(row) for row in past],
+        "upcoming_shows": [show_data(row) for row in upcoming],
+        "past_shows_count": past_count,
+        "upcoming_shows_count": upcoming_count,
+        "past_page": past_page,
+        "past_pages": past_pages
+    }
+
+
+@venues_blueprint.route('/venues/<int:venue_id>')
 def show_venue(venue_id):
     # shows the venue page with the given venue_id (done)
     # TODO: replace with real venue data from the venues table, using venue_id
-    venue = Venue.query.get(venue_id)
-    past_shows = []
-    upcoming_shows = []
-    for show in venue.shows:
-
-        show_data = {
-            'artist_id': show.artist_id,
-            'artist_name': show.artist.name,
-            'artist_image_link': show.artist.image_link,
-            'start_time': format_datetime(str(show.start_date))
+    past_page = request.args.get('past_page', 1, type=int)
+
+    def render():
+        venue = Venue.query.options(db.undefer_group('profile')).get(venue_id)
+        if venue is None:
+            abort(404)
+
+        data = {
+            "id": venue.id,
+            "name": venue.name,
+            "genres": [gener.name for gener in venue.genres],
+            "address": venue.address,
+            "city": venue.city,
+            "state": venue.state,
+            "phone": venue.phone,
+            "website": venue.website_Link,
+            "facebook_link": venue.facebook_link,
+            "seeking_talent": venue.talent,
+            "seeking_description": venue.seeking_Description,
+            "image_link": venue.image_link,
+            "recommended_artists": get_recommendations('venue', venue_id, Artist),
+            **get_partitioned_shows(Show.venue_id, venue_id, Artist, past_page)
         }
-        if show.start_date < datetime.now():
-            past_shows.append(show_data)
-        else:
-            upcoming_shows.append(show_data)
-
-    data = {
-        "id": venue.id,
-        "name": venue.name,
-        "genres": [gener.name for gener in venue.genres],
-        "address": venue.address,
-        "city": venue.city,
-        "state": venue.state,
-        "phone": venue.phone,
-        "website": venue.website_Link,
-        "facebook_link": venue.facebook_link,
-        "seeking_talent": venue.talent,
-        "seeking_description": venue.seeking_Description,
-        "image_link": venue.image_link,
-        "past_shows": past_shows,
-        "upcoming_shows": upcoming_shows,
-        "past_shows_count": len(past_shows),
-        "upcoming_shows_count": len(upcoming_shows)
-    }
-    return render_template('pages/show_venue.html', venue=data)
+        next_show_start = data.pop('next_show_start')
+        return render_template('pages/show_venue.html', venue=data), next_show_start
+
+    owned = Show.venue_id == venue_id
+    return conditional_page([
+        db.session.query(Venue.updated_at).filter(Venue.id == venue_id),
+        db.session.query(db.func.max(Artist.updated_at)).join(
+            Show, Show.artist_id == Artist.id).filter(owned),
+        db.session.query(db.func.max(Genre.updated_at)),
+        recommendations_marker('venue', venue_id),
+        *show_markers(owned),
+        past_shows_count(owned)
+    ], render, boundary=passed_show_boundary(owned),
+        # out-of-range pages render the nearest page, and are cached as it
+        cached=('venue', venue_id, lambda *values: clamp_past_page(past_page, values[-1])[0]),
+        image=db.session.query(Venue.image_link).filter(Venue.id == venue_id))
 
 #  Create Venue
 #  ----------------------------------------------------------------
 
 
-@app.route('/venues/create', methods=['GET'])
+@venues_blueprint.route('/venues/create', methods=['GET'])
 def create_venue_form():
-    form = VenueForm()
+    from forms import VenueForm
+    form = with_genre_choices(VenueForm())
     return render_template('forms/new_venue.html', form=form)
 
 
-@app.route('/venues/create', methods=['POST'])
+@venues_blueprint.route('/venues/create', methods=['POST'])
 def create_venue_submission():
     # TODO: insert form data as a new Venue record in the db, instead
     # TODO: modify data to be the data object returned from db insertion
 
-    form = VenueForm(request.form)
+    from forms import VenueForm
+    form = with_genre_choices(VenueForm(form_data()))
     if form.validate():
         try:
+            image_link = submitted_image_link(form)
             new_Venue = Venue(name=form.name.data,
                               city=form.city.data,
                               state=form.state.data,
                               address=form.address.data,
                               phone=form.phone.data,
-                              image_link=form.image_link.data,
+                              image_link=image_link,
                               facebook_link=form.facebook_link.data,
                               website_Link=form.website_link.data,
                               seeking_Description=form.seeking_description.data,
                               talent=form.seeking_talent.data)
 
-            geners = form.genres.data
-            for gener_id in geners:
-                data = Genre.query.get(gener_id)
-                new_Venue.genres.append(data)
-
             db.session.add(new_Venue)
+            db.session.flush()
+            set_genres(venue_genre.c.venue_id, new_Venue.id,
+                       genre_registry.resolve(form.genres.data))
+            recommended = recommender.refresh(db.session, {'venue': [new_Venue.id]})
             db.session.commit()
+            typeahead_indexes['venue'].add(new_Venue.id, new_Venue.name)
+            invalidate_pages(recommended)
+            image_store.generate(image_link, partial(page_cache.invalidate, 'venue', new_Venue.id))
             flash('Venue ' + request.form['name'] +
                   ' was successfully listed!')
         except:
@@ -262,107 +822,222 @@ def create_venue_submission():
     return render_template('pages/home.html')
 
 
-@app.route('/venues/<venue_id>', methods=['POST'])
+def delete_entities(kind, ids):
+    # the venues or artists go in one transaction with their shows, upcoming
+    # show rows and genre links; caches are only touched once it has committed
+    counts, counterpart_ids = cascade_delete.delete(db.session, kind, ids)
+    recommended = recommender.refresh(db.session, {kind: ids})
+    db.session.commit()
+    for entity_id in ids:
+        typeahead_indexes[kind].remove(entity_id)
+    invalidate_pages(recommended)
+    page_cache.invalidate(kind, *ids)
+    page_cache.invalidate('artist' if kind == 'venue' else 'venue', *counterpart_ids)
+    return counts
+
+
+@venues_blueprint.route('/venues/<int:venue_id>', methods=['POST'])
 def delete_venue(venue_id):
     # TODO: Complete this endpoint for taking a venue_id, and using
-    # SQLAlchemy ORM to delete a record. Handle cases where the session commit could fail.
+    # SQLAlchemy ORM to delete a record. Handle cases where the session commit could fail. (done)
 
     # BONUS CHALLENGE: Implement a button to delete a Venue on a Venue Page, have it so that
     # clicking that button delete it from the db then redirect the user to the homepage
     try:
-        db.session.query(venue_genre).filter_by(venue_id=venue_id).delete()
-        Venue.query.filter_by(id=venue_id).delete()
-        db.session.commit()
+        counts = delete_entities('venue', [venue_id])
+        if not counts[Venue.__tablename__]:
+            abort(404)
         flash('Venue was successfully deleted!')
-    except:
+    except SQLAlchemyError:
         db.session.rollback()
-        print(sys.exc_info())
+        current_app.logger.exception('deleting venue %s failed', venue_id)
         flash('An error occurred. Venue could not be deleted.')
     finally:
         db.session.close()
     return render_template('pages/home.html')
 
+
+@venues_blueprint.route('/venues/delete', methods=['GET', 'POST'], defaults={'kind': 'venue'})
+@artists_blueprint.route('/artists/delete', methods=['GET', 'POST'], defaults={'kind': 'artist'})
+def bulk_delete(kind):
+    from flask_wtf.csrf import generate_csrf
+    from forms import DeleteForm
+
+    if request.method == 'GET':
+        # the token a POST must carry, tied to this client's session; other
+        # sites cannot read it
+        return jsonify(csrf_token=generate_csrf())
+    # ids as a JSON body {"ids": [...]} or as repeated or comma separated
+    # form fields, with the CSRF token either way
+    if request.is_json and not isinstance(request.get_json(silent=True), dict):
+        return jsonify(error='expected a JSON object with ids'), 400
+    form = DeleteForm()
+    if not form.validate_on_submit():
+        return jsonify(error='ids must be a list of integers with a valid csrf_token', errors=form.errors), 400
+    ids = form.ids.data
+    try:
+        counts = delete_entities(kind, ids)
+    except SQLAlchemyError:
+        db.session.rollback()
+        current_app.logger.exception('deleting %ss %s failed', kind, ids)
+        return jsonify(error=f'the {kind}s could not be deleted'), 500
+    finally:
+        db.session.close()
+    return jsonify(requested=len(ids), deleted=counts)
+
 #  Artists
 #  ----------------------------------------------------------------
 
 
-@app.route('/artists')
+@artists_blueprint.route('/artists')
 def artists():
     # TODO: replace with real data returned from querying the database (done)
-    data = Artist.query.all()
-    return render_template('pages/artists.html', artists=data)
+    def render():
+        data = db.session.query(Artist.id, Artist.name).order_by(Artist.id).execution_options(
+            stream_results=True).yield_per(LISTING_BATCH_SIZE)
+        return render_listing('pages/artists.html', artists=data)
+
+    return conditional_page([
+        db.session.query(db.func.count(Artist.id)),
+        db.session.query(db.func.max(Artist.updated_at))
+    ], render)
 
 
-@app.route('/artists/search', methods=['POST'])
+@artists_blueprint.route('/artists/search', methods=['POST'])
 # TODO: implement search on artists with partial string search. Ensure it is case-insensitive. (done)
 # seach for "A" should return "Guns N Petals", "Matt Quevado", and "The Wild Sax Band".
 # search for "band" should return "The Wild Sax Band".
+@read_only
 def search_artists():
-    search = request.form.get('search_term')
-    artists = Artist.query.filter(Artist.name.ilike(f'%{search}%')).all()
-    results = []
-    for result in artists:
-        artist = {
-            "id": result.id,
-            "name": result.name
-        }
-        results.append(artist)
-
+    artists = search(db.session, artist_search, request.form.get('search_term'))
     response = {
         "count": len(artists),
-        "data": results
+        "data": artists
     }
 
     return render_template('pages/search_artists.html', results=response, search_term=request.form.get('search_term', ''))
 
 
-@app.route('/artists/<int:artist_id>')
+@main_blueprint.route('/api/search')
+def api_search():
+    # typeahead suggestions, answered from the in-process prefix index
+    index = typeahead_indexes.get(request.args.get('type', 'venue'))
+    if index is None:
+        abort(400)
+    data = index.lookup(request.args.get('q', ''))
+    return jsonify(count=len(data), data=data)
+
+
+@main_blueprint.route('/api/v1/', defaults={'path': ''})
+@main_blueprint.route('/api/v1/<path:path>')
+def api_v1_endpoint(path):
+    # asgi.py dispatches the same route without a worker thread per slow
+    # client
+    status, payload = api_v1.handle(db.session, path, request.args)
+    return Response(api_dumps(payload), status=status, mimetype='application/json')
+
+
+@artists_blueprint.route('/artists/<int:artist_id>')
 def show_artist(artist_id):
     # shows the artist page with the given artist_id
     # TODO: replace with real artist data from the artist table, using artist_id
-    artist = Artist.query.get(artist_id)
-    past_shows = []
-    upcoming_shows = []
-    for show in artist.shows:
-
-        show_data = {
-            'venue_id': show.venue_id,
-            'venue_name': show.venue.name,
-            'venue_image_link': show.venue.image_link,
-            'start_time': format_datetime(str(show.start_date))
+    past_page = request.args.get('past_page', 1, type=int)
+
+    def render():
+        artist = Artist.query.options(db.undefer_group('profile')).get(artist_id)
+        if artist is None:
+            abort(404)
+
+        data = {
+            "id": artist.id,
+            "name": artist.name,
+            "genres": [gener.name for gener in artist.genres],
+            "city": artist.city,
+            "state": artist.state,
+            "phone": artist.phone,
+            "website": artist.website_Link,
+            "facebook_link": artist.facebook_link,
+            "seeking_venue": artist.seeking_venue,
+            "seeking_description": artist.seeking_Description,
+            "image_link": artist.image_link,
+            "recommended_venues": get_recommendations('artist', artist_id, Venue),
+            **get_partitioned_shows(Show.artist_id, artist_id, Venue, past_page)
         }
-        if show.start_date < datetime.now():
-            past_shows.append(show_data)
-        else:
-            upcoming_shows.append(show_data)
-
-    data = {
-        "id": artist.id,
-        "name": artist.name,
-        "genres": [gener.name for gener in artist.genres],
-        "city": artist.city,
-        "state": artist.state,
-        "phone": artist.phone,
-        "website": artist.website_Link,
-        "facebook_link": artist.facebook_link,
-        "seeking_venue": artist.seeking_venue,
-        "seeking_description": artist.seeking_Description,
-        "image_link": artist.image_link,
-        "past_shows": past_shows,
-        "upcoming_shows": upcoming_shows,
-        "past_shows_count": len(past_shows),
-        "upcoming_shows_count": len(upcoming_shows)
-    }
-    return render_template('pages/show_artist.html', artist=data)
+        next_show_start = data.pop('next_show_start')
+        return render_template('pages/show_artist.html', artist=data), next_show_start
+
+    owned = Show.artist_id == artist_id
+    return conditional_page([
+        db.session.query(Artist.updated_at).filter(Artist.id == artist_id),
+        db.session.query(db.func.max(Venue.updated_at)).join(
+            Show, Show.venue_id == Venue.id).filter(owned),
+        db.session.query(db.func.max(Genre.updated_at)),
+        recommendations_marker('artist', artist_id),
+        *show_markers(owned),
+        past_shows_count(owned)
+    ], render, boundary=passed_show_boundary(owned),
+        # out-of-range pages render the nearest page, and are cached as it
+        cached=('artist', artist_id, lambda *values: clamp_past_page(past_page, values[-1])[0]),
+        image=db.session.query(Artist.image_link).filter(Artist.id == artist_id))
+
+
+def upcoming_calendar(owner_column, owner_id, name, event_url):
+    # streamed from the upcoming_show store a batch of rows at a time
+    rows = db.session.query(
+        UpcomingShow.show_id, UpcomingShow.start_date, UpcomingShow.venue_id,
+        UpcomingShow.venue_name, UpcomingShow.artist_id, UpcomingShow.artist_name
+    ).filter(owner_column == owner_id, UpcomingShow.start_date >= datetime.now()).order_by(
+        UpcomingShow.start_date, UpcomingShow.show_id).yield_per(500)
+    filename = f'{owner_column.key.split("_")[0]}-{owner_id}.ics'
+    return Response(streamed_from_session(ics_calendar(name, rows, event_url, request.host.split(':')[0])),
+                    mimetype='text/calendar',
+                    headers={'Content-Disposition': f'inline; filename="{filename}"'})
+
+
+@venues_blueprint.route('/venues/<int:venue_id>/calendar.ics')
+def venue_calendar(venue_id):
+    name = db.session.query(Venue.name).filter(Venue.id == venue_id).scalar()
+    if name is None:
+        abort(404)
+    # each event links to the page of the artist playing
+    return upcoming_calendar(UpcomingShow.venue_id, venue_id, name, lambda row: url_for(
+        'artists.show_artist', artist_id=row.artist_id, _external=True))
+
+
+@artists_blueprint.route('/artists/<int:artist_id>/calendar.ics')
+def artist_calendar(artist_id):
+    name = db.session.query(Artist.name).filter(Artist.id == artist_id).scalar()
+    if name is None:
+        abort(404)
+    # each event links to the page of the venue it is at
+    return upcoming_calendar(UpcomingShow.artist_id, artist_id, name, lambda row: url_for(
+        'venues.show_venue', venue_id=row.venue_id, _external=True))
+
+
+@artists_blueprint.route('/artists/<int:artist_id>', methods=['POST'])
+def delete_artist(artist_id):
+    try:
+        counts = delete_entities('artist', [artist_id])
+        if not counts[Artist.__tablename__]:
+            abort(404)
+        flash('Artist was successfully deleted!')
+    except SQLAlchemyError:
+        db.session.rollback()
+        current_app.logger.exception('deleting artist %s failed', artist_id)
+        flash('An error occurred. Artist could not be deleted.')
+    finally:
+        db.session.close()
+    return render_template('pages/home.html')
 
 #  Update
 #  ----------------------------------------------------------------
 
 
-@app.route('/artists/<int:artist_id>/edit', methods=['GET'])
+@artists_blueprint.route('/artists/<int:artist_id>/edit', methods=['GET'])
 def edit_artist(artist_id):
-    form = ArtistForm()
-    artist = Artist.query.get(artist_id)
+    from forms import ArtistForm
+    form = with_genre_choices(ArtistForm())
+    artist = Artist.query.options(db.undefer_group('profile')).get(artist_id)
 
     form.name.data = artist.name
     form.city.data = artist.city
@@ -373,36 +1048,45 @@ def edit_artist(artist_id):
     form.website_link.data = artist.website_Link
     form.seeking_description.data = artist.seeking_Description
     form.seeking_venue.data = artist.seeking_venue
-    form.genres.data = artist.genres
+    form.genres.data = [str(genre.id) for genre in artist.genres]
     # TODO: populate form with fields from artist with ID <artist_id>
     return render_template('forms/edit_artist.html', form=form, artist=artist)
 
 
-@app.route('/artists/<int:artist_id>/edit', methods=['POST'])
+@artists_blueprint.route('/artists/<int:artist_id>/edit', methods=['POST'])
 def edit_artist_submission(artist_id):
 
     # TODO: take values from the form submitted, and update existing
     # artist record with ID <artist_id> using the new attributes
 
-    form = ArtistForm(request.form)
+    from forms import ArtistForm
+    form = with_genre_choices(ArtistForm(form_data()))
     artist = Artist.query.get(artist_id)
     try:
+        image_link = submitted_image_link(form)
         artist.name = form.name.data
         artist.city = form.city.data
         artist.state = form.state.data
         artist.phone = form.phone.data
-        artist.image_link = form.image_link.data
+        artist.image_link = image_link
         artist.facebook_link = form.facebook_link.data
         artist.website_Link = form.website_link.data
         artist.seeking_Description = form.seeking_description.data
         artist.seeking_venue = form.seeking_venue.data
+        # genre rows are written below without touching the artist row itself
+        artist.updated_at = datetime.utcnow()
 
-        artist.genres.clear()  # clear old genres
-        genres = form.genres.data
-        for genre_id in genres:
-            data = Genre.query.get(genre_id)
-            artist.genres.append(data)
+        set_genres(artist_genre.c.artist_id, artist_id,
+                   genre_registry.resolve(form.genres.data), replace=True)
+        upcoming_shows.sync_artist(db.session, artist)
+        recommended = recommender.refresh(db.session, {'artist': [artist_id]})
         db.session.commit()
+        typeahead_indexes['artist'].add(artist_id, artist.name)
+        invalidate_pages(recommended)
+        pages = {'artist': [artist_id], 'venue': show_counterpart_ids(Show.artist_id, artist_id, Show.venue_id)}
+        invalidate_pages(pages)
+        # the pages show the new thumbnails once they are written
+        image_store.generate(image_link, partial(invalidate_pages, pages))
         flash('DONE!')
     except:
         print(sys.exc_info())
@@ -411,13 +1095,14 @@ def edit_artist_submission(artist_id):
     finally:
         db.session.close()
 
-    return redirect(url_for('show_artist', artist_id=artist_id))
+    return redirect(url_for('artists.show_artist', artist_id=artist_id))
 
 
-@app.route('/venues/<int:venue_id>/edit', methods=['GET'])
+@venues_blueprint.route('/venues/<int:venue_id>/edit', methods=['GET'])
 def edit_venue(venue_id):
-    form = VenueForm()
-    venue = Venue.query.get(venue_id)
+    from forms import VenueForm
+    form = with_genre_choices(VenueForm())
+    venue = Venue.query.options(db.undefer_group('profile')).get(venue_id)
     form.name.data = venue.name
     form.city.data = venue.city
     form.state.data = venue.state
@@ -428,36 +1113,45 @@ def edit_venue(venue_id):
     form.website_link.data = venue.website_Link
     form.seeking_description.data = venue.seeking_Description
     form.seeking_talent.data = venue.talent
-    form.genres.data = venue.genres
+    form.genres.data = [str(genre.id) for genre in venue.genres]
     # TODO: populate form with values from venue with ID <venue_id>
     return render_template('forms/edit_venue.html', form=form, venue=venue)
 
 
-@app.route('/venues/<int:venue_id>/edit', methods=['POST'])
+@venues_blueprint.route('/venues/<int:venue_id>/edit', methods=['POST'])
 def edit_venue_submission(venue_id):
     # TODO: take values from the form submitted, and update existing
     # venue record with ID <venue_id> using the new attributes
 
-    form = VenueForm(request.form)
+    from forms import VenueForm
+    form = with_genre_choices(VenueForm(form_data()))
     venue = Venue.query.get(venue_id)
     try:
+        image_link = submitted_image_link(form)
         venue.name = form.name.data
-        venue.city = form.city.data,
+        venue.city = form.city.data
         venue.state = form.state.data
         venue.phone = form.phone.data
         venue.address = form.address.data
-        venue.image_link = form.image_link.data
+        venue.image_link = image_link
         venue.facebook_link = form.facebook_link.data
         venue.website_Link = form.website_link.data
         venue.seeking_Description = form.seeking_description.data
         venue.talent = form.seeking_talent.data
+        # genre rows are written below without touching the venue row itself
+        venue.updated_at = datetime.utcnow()
 
-        venue.genres.clear()  # clear old genres
-        genres = form.genres.data
-        for genre_id in genres:
-            data = Genre.query.get(genre_id)
-            venue.genres.append(data)
+        set_genres(venue_genre.c.venue_id, venue_id,
+                   genre_registry.resolve(form.genres.data), replace=True)
+        upcoming_shows.sync_venue(db.session, venue)
+        recommended = recommender.refresh(db.session, {'venue': [venue_id]})
         db.session.commit()
+        typeahead_indexes['venue'].add(venue_id, venue.name)
+        invalidate_pages(recommended)
+        pages = {'venue': [venue_id], 'artist': show_counterpart_ids(Show.venue_id, venue_id, Show.artist_id)}
+        invalidate_pages(pages)
+        # the pages show the new thumbnails once they are written
+        image_store.generate(image_link, partial(invalidate_pages, pages))
         flash('DONE!')
     except:
         print(sys.exc_info())
@@ -466,43 +1160,48 @@ def edit_venue_submission(venue_id):
     finally:
         db.session.close()
 
-    return redirect(url_for('show_venue', venue_id=venue_id))
+    return redirect(url_for('venues.show_venue', venue_id=venue_id))
 
 #  Create Artist
 #  ----------------------------------------------------------------
 
 
-@app.route('/artists/create', methods=['GET'])
+@artists_blueprint.route('/artists/create', methods=['GET'])
 def create_artist_form():
-    form = ArtistForm()
+    from forms import ArtistForm
+    form = with_genre_choices(ArtistForm())
     return render_template('forms/new_artist.html', form=form)
 
 
-@app.route('/artists/create', methods=['POST'])
+@artists_blueprint.route('/artists/create', methods=['POST'])
 def create_artist_submission():
     # called upon submitting the new artist listing form
     # TODO: insert form data as a new Venue record in the db, instead
     # TODO: modify data to be the data object returned from db insertion
-    form = ArtistForm(request.form)
+    from forms import ArtistForm
+    form = with_genre_choices(ArtistForm(form_data()))
     if form.validate():
         try:
+            image_link = submitted_image_link(form)
             new_artist = Artist(name=form.name.data,
                                 city=form.city.data,
                                 state=form.state.data,
                                 phone=form.phone.data,
-                                image_link=form.image_link.data,
+                                image_link=image_link,
                                 facebook_link=form.facebook_link.data,
                                 website_Link=form.website_link.data,
                                 seeking_Description=form.seeking_description.data,
                                 seeking_venue=form.seeking_venue.data)
 
-            geners = form.genres.data
-            for gener_id in geners:
-                data = Genre.query.get(gener_id)
-                new_artist.genres.append(data)
-
             db.session.add(new_artist)
+            db.session.flush()
+            set_genres(artist_genre.c.artist_id, new_artist.id,
+                       genre_registry.resolve(form.genres.data))
+            recommended = recommender.refresh(db.session, {'artist': [new_artist.id]})
             db.session.commit()
+            typeahead_indexes['artist'].add(new_artist.id, new_artist.name)
+            invalidate_pages(recommended)
+            image_store.generate(image_link, partial(page_cache.invalidate, 'artist', new_artist.id))
             # on successful db insert, flash success
             flash('Artist ' + request.form['name'] +
                   ' was successfully listed!')
@@ -524,47 +1223,130 @@ def create_artist_submission():
 #  Shows
 #  ----------------------------------------------------------------
 
-@app.route('/shows')
-def shows():
-    # displays list of shows at /shows
-    # TODO: replace with real venues data. (done)
-    shows = Show.query.all()
-    data = []
-    for show in shows:
-        venue = Venue.query.get(show.venue_id)
-        artist = Artist.query.get(show.artist_id)
-
-        show_data = {
-            'venue_id': show.venue_id,
-            'artist_id': show.artist_id,
-            'venue_name': venue.name,
-            'artist_name': artist.name,
-            'artist_image_link': artist.image_link,
-            'start_time': format_datetime(str(show.start_date))
-        }
-        data.append(show_data)
+SHOWS_PAGE_SIZE = 30
+SHOWS_MAX_PAGE_SIZE = 100
 
-    return render_template('pages/shows.html', shows=data)
 
+def encode_show_cursor(start_date, show_id):
+    return f'{start_date.isoformat()}_{show_id}'
 
-@app.route('/shows/create')
+
+def decode_show_cursor(cursor):
+    # cursors look like "<iso start_date>_<show id>"; anything else is ignored
+    try:
+        start_date, show_id = cursor.rsplit('_', 1)
+        return datetime.fromisoformat(start_date), int(show_id)
+    except (AttributeError, ValueError):
+        return None
+
+
+@shows_blueprint.route('/shows')
+def shows():
+    # displays the upcoming shows at /shows, read from the upcoming_show store
+    # TODO: replace with real venues data. (done)
+    def render():
+        limit = min(max(request.args.get('limit', SHOWS_PAGE_SIZE, type=int), 1),
+                    SHOWS_MAX_PAGE_SIZE)
+        after = decode_show_cursor(request.args.get('after'))
+        before = decode_show_cursor(request.args.get('before'))
+
+        query = db.session.query(
+            UpcomingShow.show_id.label('id'), UpcomingShow.start_date,
+            UpcomingShow.venue_id, UpcomingShow.artist_id, UpcomingShow.venue_name,
+            UpcomingShow.artist_name, UpcomingShow.artist_image_link
+        ).filter(UpcomingShow.start_date >= datetime.now())
+
+        # keyset pagination on (start_date, show_id): every page is an index range
+        # scan of at most limit + 1 rows, however deep into the listing it is
+        if before is not None:
+            query = query.filter(db.or_(
+                UpcomingShow.start_date < before[0],
+                db.and_(UpcomingShow.start_date == before[0], UpcomingShow.show_id < before[1])
+            )).order_by(UpcomingShow.start_date.desc(), UpcomingShow.show_id.desc())
+        else:
+            if after is not None:
+                query = query.filter(db.or_(
+                    UpcomingShow.start_date > after[0],
+                    db.and_(UpcomingShow.start_date == after[0], UpcomingShow.show_id > after[1])
+                ))
+            query = query.order_by(UpcomingShow.start_date, UpcomingShow.show_id)
+
+        rows = query.limit(limit + 1).all()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        if before is not None:
+            rows.reverse()
+
+        data = []
+        for show in rows:
+            show_data = {
+                'venue_id': show.venue_id,
+                'artist_id': show.artist_id,
+                'venue_name': show.venue_name,
+                'artist_name': show.artist_name,
+                'artist_image_link': show.artist_image_link,
+                'start_time': show.start_date
+            }
+            data.append(show_data)
+
+        prev_cursor = next_cursor = None
+        if rows:
+            if after is not None or (before is not None and has_more):
+                prev_cursor = encode_show_cursor(rows[0].start_date, rows[0].id)
+            if before is not None or has_more:
+                next_cursor = encode_show_cursor(rows[-1].start_date, rows[-1].id)
+
+        return render_listing('pages/shows.html', shows=data, limit=limit,
+                              prev_cursor=prev_cursor, next_cursor=next_cursor)
+
+    return conditional_page([
+        db.session.query(db.func.max(Venue.updated_at)),
+        db.session.query(db.func.max(Artist.updated_at)),
+        *show_markers()
+    ], render, boundary=passed_show_boundary())
+
+
+@shows_blueprint.route('/shows/create')
 def create_shows():
     # renders form. do not touch.
+    from forms import ShowForm
     form = ShowForm()
     return render_template('forms/new_show.html', form=form)
 
 
-@app.route('/shows/create', methods=['POST'])
+def show_booking_errors(form):
+    # the venue and artist must exist and be free for the show's whole slot
+    try:
+        venue_id, artist_id = int(form.venue_id.data), int(form.artist_id.data)
+    except (TypeError, ValueError):
+        return ['venue_id and artist_id must be numbers']
+    return booking_validator.validate(db.session, venue_id, artist_id, form.start_time.data)
+
+
+@shows_blueprint.route('/shows/create', methods=['POST'])
 def create_show_submission():
     # called to create new shows in the db, upon submitting new show listing form
     # TODO: insert form data as a new Show record in the db, instead
+    from forms import ShowForm
     form = ShowForm(request.form)
-    if form.validate():
+    booking_errors = show_booking_errors(form) if form.validate() else []
+    if booking_errors:
+        for error in booking_errors:
+            flash(f'Show could not be listed: {error}', 'error')
+    elif not form.errors:
         try:
             new_show = Show(venue_id=form.venue_id.data,
                             artist_id=form.artist_id.data, start_date=form.start_time.data)
             db.session.add(new_show)
+            db.session.flush()
+            upcoming_shows.upsert_shows(db.session, new_show.id)
+            # the show adds to both sides' history
+            recommended = recommender.refresh(db.session, {
+                'venue': [int(form.venue_id.data)], 'artist': [int(form.artist_id.data)]})
             db.session.commit()
+            invalidate_pages(recommended)
+            page_cache.invalidate('venue', form.venue_id.data)
+            page_cache.invalidate('artist', form.artist_id.data)
             # on successful db insert, flash success
             flash('Show was successfully listed!')
         except:
@@ -581,18 +1363,204 @@ def create_show_submission():
     return render_template('pages/home.html')
 
 
-@app.errorhandler(404)
+@main_blueprint.route('/media/<path:filename>')
+def media(filename):
+    # uploads and thumbnails are named by their content, so they never change;
+    # a deployment behind a web server would serve MEDIA_DIR from there
+    response = send_from_directory(image_store.directory, filename)
+    response.headers['Cache-Control'] = f'public, max-age={STATIC_MAX_AGE}, immutable'
+    return response
+
+
+@main_blueprint.app_template_global()
+def thumbnail_sources(link, size):
+    return image_store.thumbnail_sources(link, size)
+
+
+@internal_blueprint.route('/__cache')
+def page_cache_stats():
+    return jsonify(page_cache.stats())
+
+
+@internal_blueprint.route('/__metrics')
+def request_metrics():
+    # per-route query count and timing percentiles of the sampled requests
+    return jsonify(profiler.metrics())
+
+
+@main_blueprint.app_errorhandler(404)
 def not_found_error(error):
     return render_template('errors/404.html'), 404
 
 
-@app.errorhandler(500)
+@main_blueprint.app_errorhandler(500)
 def server_error(error):
     return render_template('errors/500.html'), 500
 
 
-if not app.debug:
-    file_handler = FileHandler('error.log')
+# ----------------------------------------------------------------------------#
+# CLI.
+# ----------------------------------------------------------------------------#
+
+BULK_KINDS = ('artists', 'shows', 'venues')
+
+
+@lru_cache(maxsize=None)
+def bulk_spec(kind):
+    # the specs validate records with the web forms, so only the import and
+    # export commands load wtforms
+    from forms import ArtistForm, ShowForm, VenueForm
+    return {
+        'venues': BulkSpec(Venue, VenueForm, (
+            ('name', 'name'), ('city', 'city'), ('state', 'state'), ('address', 'address'),
+            ('phone', 'phone'), ('image_link', 'image_link'), ('facebook_link', 'facebook_link'),
+            ('website_link', 'website_Link'), ('seeking_talent', 'talent'),
+            ('seeking_description', 'seeking_Description')
+        ), venue_genre.c.venue_id),
+        'artists': BulkSpec(Artist, ArtistForm, (
+            ('name', 'name'), ('city', 'city'), ('state', 'state'), ('phone', 'phone'),
+            ('image_link', 'image_link'), ('facebook_link', 'facebook_link'),
+            ('website_link', 'website_Link'), ('seeking_venue', 'seeking_venue'),
+            ('seeking_description', 'seeking_Description')
+        ), artist_genre.c.artist_id),
+        'shows': BulkSpec(Show, ShowForm, (
+            ('venue_id', 'venue_id'), ('artist_id', 'artist_id'), ('start_time', 'start_date')
+        ), None)
+    }[kind]
+
+
+fyyur_cli = AppGroup('fyyur', help='Bulk import and export of Fyyur data.')
+
+
+@fyyur_cli.command('import')
+@click.argument('kind', type=click.Choice(BULK_KINDS))
+@click.argument('source', type=click.File('r', encoding='utf-8'))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'jsonl']),
+              help='Defaults to csv for *.csv files and jsonl otherwise.')
+@click.option('--chunk-size', default=IMPORT_CHUNK_SIZE, show_default=True)
+def import_command(kind, source, fmt, chunk_size):
+    """Import KIND records from SOURCE (a file, or - for stdin)."""
+    fmt = fmt or guess_format(source.name)
+    records = read_records(source, fmt)
+    prechecked = None
+    if kind == 'shows':
+        # the whole schedule is checked for double bookings in one sweep first,
+        # so show files are read into memory rather than streamed
+        records = list(records)
+        prechecked = booking_validator.check_schedule(db.session, schedule_from_records(records))
+    progress, rejected = import_records(
+        db.session, bulk_spec(kind), records, genre_registry, chunk_size,
+        report=lambda progress: click.echo(f'imported {progress}', err=True), prechecked=prechecked)
+    for number, errors in rejected:
+        click.echo(f'record {number} rejected: {errors}', err=True)
+    if kind == 'shows':
+        # imported shows bypass the incremental upcoming_show updates
+        upcoming_shows.rebuild(db.session)
+    # every import bypasses the incremental recommendation refreshes too
+    recommender.rebuild(db.session)
+    db.session.commit()
+    # imported rows change the detail pages of the venues and artists involved
+    page_cache.clear()
+    click.echo(f'{kind}: imported {progress}, rejected {len(rejected)}', err=True)
+
+
+@fyyur_cli.command('refresh-upcoming')
+def refresh_upcoming_command():
+    """Rebuild the upcoming_show store from the Show table."""
+    upcoming_shows.rebuild(db.session)
+    db.session.commit()
+    count = db.session.query(db.func.count(UpcomingShow.show_id)).scalar()
+    click.echo(f'upcoming_show: {count} upcoming shows', err=True)
+
+
+@fyyur_cli.command('make-thumbnails')
+def make_thumbnails_command():
+    """Write the missing thumbnails of uploaded venue and artist images."""
+    links = {row[0] for model in (Venue, Artist) for row in db.session.query(model.image_link).filter(
+        model.image_link.like(MEDIA_URL + '%'))}
+    futures = [future for future in map(image_store.generate, links) if future is not None]
+    failed = sum(1 for future in futures if future.exception() is not None)
+    page_cache.clear()
+    click.echo(f'thumbnails: {len(futures) - failed} images done, {failed} failed, '
+               f'{len(links) - len(futures)} already done', err=True)
+
+
+@fyyur_cli.command('refresh-recommendations')
+def refresh_recommendations_command():
+    """Recompute every venue's and artist's recommendations."""
+    recommender.rebuild(db.session)
+    db.session.commit()
+    page_cache.clear()
+    count = db.session.query(db.func.count(Recommendation.owner_id)).scalar()
+    click.echo(f'recommendation: {count} recommendations', err=True)
+
+
+@fyyur_cli.command('check-bookings')
+def check_bookings_command():
+    """List every pair of stored shows that double-book a venue or an artist."""
+    found = 0
+    for conflict in booking_validator.stored_conflicts(db.session):
+        found += 1
+        click.echo(f'{conflict.kind} {getattr(conflict.first, conflict.kind + "_id")}: '
+                   f'show {conflict.first.show_id} at {conflict.first.start_date} overlaps '
+                   f'show {conflict.second.show_id} at {conflict.second.start_date}')
+    click.echo(f'{found} conflicting bookings', err=True)
+    if found:
+        raise SystemExit(1)
+
+
+@fyyur_cli.command('delete')
+@click.argument('kind', type=click.Choice(['artists', 'venues']))
+@click.argument('ids', nargs=-1, type=int)
+@click.option('--ids-from', type=click.File('r', encoding='utf-8'),
+              help='Also delete the ids listed one per line in this file (or - for stdin).')
+def delete_command(kind, ids, ids_from):
+    """Delete KIND with IDS, with their shows and genre links, in one transaction."""
+    ids = set(ids)
+    if ids_from is not None:
+        ids.update(int(line) for line in ids_from if line.strip())
+    counts = delete_entities(kind[:-1], sorted(ids))
+    for table, count in counts.items():
+        click.echo(f'{table}: deleted {count}', err=True)
+
+
+@fyyur_cli.command('export')
+@click.argument('kind', type=click.Choice(BULK_KINDS))
+@click.argument('target', type=click.File('w', encoding='utf-8'))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'jsonl']),
+              help='Defaults to csv for *.csv files and jsonl otherwise.')
+def export_command(kind, target, fmt):
+    """Export every KIND record to TARGET (a file, or - for stdout)."""
+    spec = bulk_spec(kind)
+    progress = Throughput()
+
+    def counted(records):
+        for record in records:
+            progress.add(1)
+            yield record
+
+    write_records(target, fmt or guess_format(target.name), export_fieldnames(spec),
+                  counted(export_records(db.session, spec, genre_registry)))
+    click.echo(f'{kind}: exported {progress}', err=True)
+
+# ----------------------------------------------------------------------------#
+# App factory.
+# ----------------------------------------------------------------------------#
+
+
+def init_migrations(app):
+    # Flask-Migrate brings alembic with it, which only the flask db commands
+    # and scripts upgrading a database in process need
+    from flask_migrate import Migrate
+    Migrate(app, db, include_object=include_in_migrations)
+
+
+def init_logging(app):
+    # every app shares the 'app' logger, so its handlers are added only once;
+    # delay leaves error.log unopened until something is logged
+    if any(isinstance(handler, FileHandler) for handler in app.logger.handlers):
+        return
+    file_handler = FileHandler('error.log', delay=True)
     file_handler.setFormatter(
         Formatter(
             '%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]')
@@ -600,7 +1568,54 @@ if not app.debug:
     app.logger.setLevel(logging.INFO)
     file_handler.setLevel(logging.INFO)
     app.logger.addHandler(file_handler)
-    app.logger.info('errors')
+
+    # slow request profiles go to the same file as bare JSON lines
+    profile_handler = FileHandler('error.log', delay=True)
+    profile_handler.setFormatter(Formatter('%(message)s'))
+    profiler_logger.addHandler(profile_handler)
+
+
+def create_app(config=None):
+    """Build the Fyyur app from ``config``: a config object, a FYYUR_ENV name,
+    or by default the config FYYUR_ENV selects."""
+    app = Flask(__name__)
+    app.config.from_object(config if config is not None and not isinstance(config, str)
+                           else get_config(config))
+    db.init_app(app)
+    replica_router.init_app(app, lambda: db.engine)
+    page_cache.init_app(app)
+    profiler.init_app(app)
+    image_store.init_app(app)
+    init_static_fingerprints(app)
+    before_render_template.connect(release_db_connection, app)
+
+    upcoming_refresher = UpcomingRefresher(
+        lambda: refresh_upcoming_shows(app), lambda: refresh_upcoming_shows(app, rebuild=True),
+        app.config['UPCOMING_REFRESH_INTERVAL'], app.config['UPCOMING_REBUILD_INTERVAL'],
+        lock=partial(holds_refresher_lock, app))
+    # started by the first request rather than here, so that flask CLI
+    # commands (and migrations creating the table) do not run it; of the
+    # worker processes, only the one holding the lock refreshes
+    app.before_request(upcoming_refresher.start)
+    # every worker process loads its own recommendation features, off the
+    # request path
+    app.before_request(FeatureReloader(
+        recommender, partial(reload_recommendations, app), app.config['RECOMMENDATION_RELOAD_INTERVAL']).start)
+
+    for blueprint in (main_blueprint, venues_blueprint, artists_blueprint, shows_blueprint):
+        app.register_blueprint(blueprint)
+    # they need no login, and show SQL, traffic and which pages are cached,
+    # so a public deployment leaves them off
+    if app.debug or app.testing or app.config['ENABLE_INTERNAL_ENDPOINTS']:
+        app.register_blueprint(internal_blueprint)
+    app.cli.add_command(fyyur_cli)
+    # the flask command builds the app inside its click context; gunicorn and
+    # uvicorn workers never do, and never run migrations
+    if click.get_current_context(silent=True) is not None:
+        init_migrations(app)
+    if not app.debug:
+        init_logging(app)
+    return app
 
 # ----------------------------------------------------------------------------#
 # Launch.
@@ -608,11 +1623,11 @@ if not app.debug:
 
 # Default port:
 if __name__ == '__main__':
-    app.run()
+    create_app().run()
 
 # Or specify port manually:
 '''
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
-    app.run(host='0.0.0.0', port=port)
+    create_app().run(host='0.0.0.0', port=port)
 '''
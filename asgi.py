@@ -0,0 +1,88 @@
+"""ASGI entry point: ``/api/v1`` answered off the event loop, everything else
+by Flask through WsgiToAsgi.
+
+    uvicorn asgi:application --workers 2
+
+The event loop holds the client connections, so a slow mobile client costs a
+coroutine rather than a worker. API requests run on a pool of API_THREADS
+threads through the Flask app's own dispatch, so replica routing, the
+profiler and every other request hook apply as they do under WSGI, and give
+their database connection back before the response is written. Other paths
+go to the Flask app through asgiref's WsgiToAsgi; without asgiref installed
+only the API is served.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.test import EnvironBuilder
+
+from api import dumps
+from app import create_app
+
+app = create_app()
+
+API_PREFIX = '/api/v1'
+
+executor = ThreadPoolExecutor(max_workers=app.config['API_THREADS'], thread_name_prefix='api')
+
+try:
+    from asgiref.wsgi import WsgiToAsgi
+except ImportError:
+    flask_application = None
+else:
+    flask_application = WsgiToAsgi(app)
+
+
+def dispatch(scope):
+    # the request as the WSGI server would hand it to Flask; the request
+    # context's teardown removes the session, returning its connection, and
+    # closing the response records its profile
+    environ = EnvironBuilder(
+        path=scope['path'], method=scope['method'], query_string=scope['query_string'].decode('latin-1'),
+        headers=[(name.decode('latin-1'), value.decode('latin-1')) for name, value in scope['headers']]
+    ).get_environ()
+    with app.request_context(environ):
+        try:
+            response = app.full_dispatch_request()
+        except Exception as e:
+            response = app.handle_exception(e)
+        body = response.get_data()
+        response.close()
+    headers = [(name.lower().encode('latin-1'), value.encode('latin-1'))
+               for name, value in response.headers.items()]
+    return response.status_code, headers, body
+
+
+async def send_response(send, status, headers, body):
+    await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            executor.shutdown(wait=True)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+        return
+
+    path = scope['path']
+    if scope['type'] == 'http' and (path == API_PREFIX or path.startswith(API_PREFIX + '/')):
+        status, headers, body = await asyncio.get_running_loop().run_in_executor(executor, dispatch, scope)
+        await send_response(send, status, headers, body if scope['method'] != 'HEAD' else b'')
+        return
+
+    if flask_application is None:
+        body = dumps({'error': 'only /api/v1 is served without asgiref installed'}).encode()
+        await send_response(send, 404, [(b'content-type', b'application/json'),
+                                        (b'content-length', str(len(body)).encode())], body)
+        return
+    await flask_application(scope, receive, send)
@@ -0,0 +1,97 @@
+"""Many slow clients on the ASGI /api/v1 in one process.
+
+Drives ``asgi.application`` in-process with --clients concurrent requests
+whose client takes --delay seconds to receive the response body, as a slow
+mobile connection would, and prints the wall time. A server with a thread
+per request and API_THREADS threads would need about
+clients / API_THREADS * delay seconds for the same load.
+
+    python benchmarks/api_concurrency.py --clients 1000 --delay 1
+    python benchmarks/api_concurrency.py --database-url postgresql://.../fyyur_api
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+PATHS = [
+    ('/api/v1/venues', b'limit=20'),
+    ('/api/v1/artists', b'fields=id,name,genres'),
+    ('/api/v1/shows', b'upcoming=true&limit=50'),
+    ('/api/v1/venues/1', b'fields=id,name,genres,website'),
+]
+
+
+async def slow_client(application, path, query_string, delay):
+    status = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            status.append(message['status'])
+        elif message['type'] == 'http.response.body':
+            await asyncio.sleep(delay)
+            json.loads(message['body'])
+
+    scope = {'type': 'http', 'method': 'GET', 'path': path, 'query_string': query_string,
+             'headers': [], 'http_version': '1.1', 'scheme': 'http'}
+    await application(scope, receive, send)
+    return status[0]
+
+
+async def run(application, clients, delay):
+    return await asyncio.gather(*[
+        slow_client(application, *PATHS[i % len(PATHS)], delay) for i in range(clients)])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--clients', type=int, default=500)
+    parser.add_argument('--delay', type=float, default=1.0, help='seconds each client takes to read')
+    parser.add_argument('--database-url')
+    parser.add_argument('--venues', type=int, default=2000)
+    parser.add_argument('--artists', type=int, default=2000)
+    parser.add_argument('--shows', type=int, default=20000)
+    args = parser.parse_args()
+
+    database_url = args.database_url
+    seed_database = database_url is None
+    if seed_database:
+        database_url = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'api_concurrency.db')
+
+    # config.py reads the database from the environment when it is imported
+    os.environ['DATABASE_URL'] = database_url
+    from flask_migrate import upgrade
+    from app import db, init_migrations
+    from asgi import app, application
+    from seed_data import generate
+
+    if seed_database:
+        init_migrations(app)
+        with app.app_context():
+            upgrade(directory=os.path.join(ROOT, 'migrations'))
+            generate(args.venues, args.artists, args.shows, report=lambda line: print(line, file=sys.stderr))
+            db.session.remove()
+
+    start = time.perf_counter()
+    statuses = asyncio.run(run(application, args.clients, args.delay))
+    elapsed = time.perf_counter() - start
+    failed = sum(1 for status in statuses if status != 200)
+    threads = app.config['API_THREADS']
+    print(f'{args.clients} clients reading for {args.delay:.1f}s each: {elapsed:.2f}s wall time, '
+          f'{failed} failed')
+    print(f'thread per request with {threads} threads: ~{args.clients / threads * args.delay:.0f}s')
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
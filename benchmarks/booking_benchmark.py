@@ -0,0 +1,77 @@
+"""Time the show booking checks against a large, conflict-free Show table.
+
+Seeds a fresh database through the migrations (seed_data.generate, which
+never double-books), then times BookingValidator.validate for random
+bookings, the whole-schedule check of an import and the sweep over every
+stored show:
+
+    python benchmarks/booking_benchmark.py --shows 1000000
+    python benchmarks/booking_benchmark.py --database-url postgresql://.../fyyur_booking
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--venues', type=int, default=20000)
+    parser.add_argument('--artists', type=int, default=20000)
+    parser.add_argument('--shows', type=int, default=1000000)
+    parser.add_argument('--checks', type=int, default=2000, help='single bookings to validate')
+    parser.add_argument('--schedule', type=int, default=50000, help='bookings in the imported schedule')
+    parser.add_argument('--database-url')
+    args = parser.parse_args()
+
+    database_url = args.database_url or 'sqlite:///' + os.path.join(
+        tempfile.mkdtemp(), 'booking_benchmark.db')
+    os.environ['DATABASE_URL'] = database_url
+    from flask_migrate import upgrade
+    from app import db, booking_validator
+    from seed_data import benchmark_app, generate
+    from bookings import Booking
+
+    app = benchmark_app()
+
+    rng = random.Random(11)
+    now = datetime.now()
+    migrations = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'migrations')
+    with app.app_context():
+        upgrade(directory=migrations)
+        print(f'seeding {args.shows} shows into {database_url}')
+        generate(args.venues, args.artists, args.shows, report=lambda line: print(line, file=sys.stderr))
+
+        def random_booking(number=None):
+            return Booking(None, rng.randint(1, args.venues + 10), rng.randint(1, args.artists + 10),
+                           now + timedelta(minutes=rng.randint(-60 * 24 * 365 * 5, 60 * 24 * 365)), number)
+
+        bookings = [random_booking() for _ in range(args.checks)]
+        rejected = 0
+        start = time.perf_counter()
+        for booking in bookings:
+            rejected += bool(booking_validator.validate(
+                db.session, booking.venue_id, booking.artist_id, booking.start_date))
+        elapsed = time.perf_counter() - start
+        print(f'validate: {args.checks} bookings, {elapsed / args.checks * 1000:.3f} ms each, '
+              f'{rejected} rejected')
+
+        schedule = [random_booking(number) for number in range(1, args.schedule + 1)]
+        start = time.perf_counter()
+        errors = booking_validator.check_schedule(db.session, schedule)
+        elapsed = time.perf_counter() - start
+        print(f'check_schedule: {args.schedule} bookings in {elapsed:.2f} s, {len(errors)} rejected')
+
+        start = time.perf_counter()
+        conflicts = sum(1 for _ in booking_validator.stored_conflicts(db.session))
+        elapsed = time.perf_counter() - start
+        print(f'stored_conflicts: {args.shows} shows swept in {elapsed:.2f} s, {conflicts} conflicts')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+"""Per-tile cost of formatting a show's start time.
+
+"before" is the old path: the view stringified the datetime and formatted it
+with format_datetime, and the template parsed that string again and formatted
+it with |datetime('full'). "after" is a single format_datetime call on the
+datetime, as the views and templates do now.
+
+    python benchmarks/datetime_benchmark.py --tiles 10000
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+import babel.dates
+import dateutil.parser
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+LEGACY_FORMATS = {
+    'full': "EEEE MMMM, d, y 'at' h:mma",
+    'medium': "EE MM, dd, y h:mma"
+}
+
+
+def legacy_format_datetime(value, format='medium'):
+    date = dateutil.parser.parse(value)
+    return babel.dates.format_datetime(date, LEGACY_FORMATS[format], locale='en')
+
+
+def per_tile_us(fn, values):
+    start = time.perf_counter()
+    for value in values:
+        fn(value)
+    return (time.perf_counter() - start) / len(values) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tiles', type=int, default=10000)
+    args = parser.parse_args()
+
+    from app import format_datetime
+
+    first = datetime(2026, 1, 1, 20, 0)
+    values = [first + timedelta(hours=7 * i, minutes=i % 60) for i in range(args.tiles)]
+
+    before = per_tile_us(
+        lambda value: legacy_format_datetime(legacy_format_datetime(str(value)), 'full'), values)
+    after = per_tile_us(lambda value: format_datetime(value, 'full'), values)
+    print(f'{args.tiles} tiles: before {before:.1f} us/tile, after {after:.1f} us/tile '
+          f'({before / after:.1f}x faster)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+"""Fail if a page's queries fall back to a sequential scan on a large dataset.
+
+Builds a fresh database through the migrations, seeds it with
+seed_data.generate, requests every read-only page through the Flask test
+client and runs EXPLAIN (Postgres) or EXPLAIN QUERY PLAN (SQLite) on each
+SELECT the page issued. A full table scan
+of Show or upcoming_show is always an error; Venue and Artist may only be scanned by the
+directory pages that list all of them. Exits non-zero on any violation:
+
+    python benchmarks/explain_check.py --shows 1000000
+    python benchmarks/explain_check.py --database-url postgresql://.../fyyur_explain
+"""
+import argparse
+import os
+import re
+import sys
+import tempfile
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+GUARDED_TABLES = {'Show', 'Venue', 'Artist', 'upcoming_show'}
+# pages whose whole purpose is to list every row of a table
+FULL_LISTINGS = {'/venues': {'Venue'}, '/artists': {'Artist'}}
+
+
+def sequential_scans(connection, dialect, statement, parameters):
+    cursor = connection.cursor()
+    if dialect == 'postgresql':
+        cursor.execute('EXPLAIN (FORMAT JSON) ' + statement, parameters)
+        plan = cursor.fetchone()[0]
+        nodes = [plan[0]['Plan']]
+        found = set()
+        while nodes:
+            node = nodes.pop()
+            if node['Node Type'] == 'Seq Scan':
+                found.add(node['Relation Name'])
+            nodes.extend(node.get('Plans', []))
+        return found
+    cursor.execute('EXPLAIN QUERY PLAN ' + statement, parameters)
+    found = set()
+    for row in cursor.fetchall():
+        # "SCAN Show" is a table scan; "SCAN Show USING ... INDEX" is not
+        match = re.match(r'SCAN (?:TABLE )?"?(\w+)"?(.*)', row[-1])
+        if match and 'USING' not in match.group(2):
+            found.add(match.group(1))
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--venues', type=int, default=20000)
+    parser.add_argument('--artists', type=int, default=20000)
+    parser.add_argument('--shows', type=int, default=500000)
+    parser.add_argument('--database-url')
+    args = parser.parse_args()
+
+    database_url = args.database_url or 'sqlite:///' + os.path.join(
+        tempfile.mkdtemp(), 'explain_check.db')
+
+    # config.py reads the database from the environment when it is imported
+    os.environ['DATABASE_URL'] = database_url
+    from flask_migrate import upgrade
+    from sqlalchemy import event
+    from app import db, Venue, Artist, Show, page_cache
+    from seed_data import benchmark_app, generate
+    from page_cache import NullBackend
+
+    app = benchmark_app()
+    app.config['WTF_CSRF_ENABLED'] = False
+    page_cache.backend = NullBackend()
+    migrations = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'migrations')
+
+    with app.app_context():
+        upgrade(directory=migrations)
+        generate(args.venues, args.artists, args.shows, report=lambda line: print(line, file=sys.stderr))
+        engine = db.engine
+        dialect = engine.dialect.name
+        with engine.connect() as connection:
+            connection.execution_options(isolation_level='AUTOCOMMIT').execute(
+                db.text('VACUUM ANALYZE' if dialect == 'postgresql' else 'ANALYZE'))
+        busy_venue = db.session.query(Show.venue_id).group_by(Show.venue_id).order_by(
+            db.func.count(Show.id).desc()).limit(1).scalar()
+        busy_artist = db.session.query(Show.artist_id).group_by(Show.artist_id).order_by(
+            db.func.count(Show.id).desc()).limit(1).scalar()
+        venue_name = db.session.query(Venue.name).filter(Venue.id == busy_venue).scalar()
+        artist_name = db.session.query(Artist.name).filter(Artist.id == busy_artist).scalar()
+        db.session.remove()
+
+    pages = [
+        ('GET', '/venues', None),
+        ('GET', '/artists', None),
+        ('GET', '/shows', None),
+        ('GET', '/shows?after=' + datetime.now().isoformat() + '_1', None),
+        ('GET', f'/venues/{busy_venue}', None),
+        ('GET', f'/venues/{busy_venue}?past_page=5', None),
+        ('GET', f'/artists/{busy_artist}', None),
+        ('GET', f'/venues/{busy_venue}/calendar.ics', None),
+        ('GET', '/venues/near?lat=39.7392&lon=-104.9903&radius=50', None),
+        ('POST', '/venues/search', {'search_term': venue_name}),
+        ('POST', '/artists/search', {'search_term': artist_name}),
+    ]
+
+    captured = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if not executemany and statement.lstrip().upper().startswith('SELECT'):
+            captured.append((statement, parameters))
+
+    client = app.test_client()
+    failures = 0
+    with app.app_context():
+        engine = db.engine
+        event.listen(engine, 'before_cursor_execute', capture)
+        for method, url, data in pages:
+            del captured[:]
+            response = client.open(url, method=method, data=data)
+            response.get_data()  # run the queries of streamed responses too
+            allowed = FULL_LISTINGS.get(url, set())
+            raw = engine.raw_connection()
+            try:
+                for statement, parameters in captured:
+                    scans = (sequential_scans(raw, dialect, statement, parameters)
+                             & GUARDED_TABLES) - allowed
+                    if scans:
+                        failures += 1
+                        print(f'FAIL {method} {url}: sequential scan of {", ".join(sorted(scans))}\n'
+                              f'    {" ".join(statement.split())}')
+            finally:
+                raw.close()
+            print(f'{response.status_code} {method} {url}: {len(captured)} queries checked')
+        event.remove(engine, 'before_cursor_execute', capture)
+
+    if failures:
+        print(f'{failures} queries fell back to a sequential scan')
+        sys.exit(1)
+    print('no sequential scans')
+
+
+if __name__ == '__main__':
+    main()
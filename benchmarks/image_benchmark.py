@@ -0,0 +1,164 @@
+"""Time image uploads and check the thumbnails the worker pool writes for them.
+
+Creates artists through the Flask test client, each with a freshly drawn
+photo-sized JPEG uploaded, and reports:
+
+- how long the submissions took, against writing the same thumbnails in the
+  request (make_thumbnails called directly),
+- how long until each upload's thumbnails were written in the background,
+- the bytes a tile and a detail page load per image, against the original.
+
+Fails if any thumbnail is missing, exceeds its box, or is not what the
+artist's page shows, if the artist's page rendered before its thumbnails
+were written still revalidates once they are, or if the artist directory,
+which shows no images, stops revalidating when they are:
+
+    python benchmarks/image_benchmark.py
+    python benchmarks/image_benchmark.py --uploads 50 --width 4000 --height 3000
+"""
+import argparse
+import io
+import os
+import random
+import re
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def photo(width, height, rng):
+    # random noise compresses like nothing a camera takes; gradients with a
+    # few shapes on top come closer
+    from PIL import Image, ImageDraw
+
+    image = Image.linear_gradient('L').resize((width, height)).convert('RGB')
+    draw = ImageDraw.Draw(image)
+    for _ in range(40):
+        x, y = rng.randrange(width), rng.randrange(height)
+        radius = rng.randrange(20, max(21, width // 6))
+        draw.ellipse((x - radius, y - radius, x + radius, y + radius),
+                     fill=tuple(rng.randrange(256) for _ in range(3)))
+    data = io.BytesIO()
+    image.save(data, 'JPEG', quality=90)
+    return data.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--uploads', type=int, default=20)
+    parser.add_argument('--width', type=int, default=3000)
+    parser.add_argument('--height', type=int, default=2000)
+    parser.add_argument('--timeout', type=float, default=60, help='seconds to wait for the thumbnails')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    # the testing config turns CSRF off for the form posts
+    os.environ['FYYUR_ENV'] = 'testing'
+    os.environ['TEST_DATABASE_URL'] = 'sqlite:///' + os.path.join(directory, 'image_benchmark.db')
+    os.environ['MEDIA_DIR'] = os.path.join(directory, 'media')
+    from flask_migrate import upgrade
+    from PIL import Image
+    from app import Artist, db, image_store
+    from images import THUMBNAIL_SIZES, make_thumbnails, media_name
+    from profiler import percentiles
+    from seed_data import benchmark_app
+
+    app = benchmark_app()
+    with app.app_context():
+        upgrade(directory=os.path.join(ROOT, 'migrations'))
+    client = app.test_client()
+    rng = random.Random(args.seed)
+
+    photos = [photo(args.width, args.height, rng) for _ in range(args.uploads)]
+    timings, submitted = [], {}
+    for i, data in enumerate(photos):
+        start = time.perf_counter()
+        response = client.post('/artists/create', content_type='multipart/form-data', data={
+            'name': f'Upload Artist {i}', 'city': 'Austin', 'state': 'TX', 'phone': '5125550100',
+            'genres': ['1'], 'facebook_link': f'https://www.facebook.com/upload{i}',
+            'image': (io.BytesIO(data), f'photo{i}.jpg')})
+        timings.append(time.perf_counter() - start)
+        submitted[i] = time.perf_counter()
+        if response.status_code != 200:
+            sys.exit(f'upload {i} failed with {response.status_code}')
+    with app.app_context():
+        links = dict(db.session.query(Artist.id, Artist.image_link).filter(Artist.name.like('Upload Artist %')))
+    if len(links) != args.uploads or not all(media_name(link) for link in links.values()):
+        sys.exit(f'{args.uploads} uploads made {len(links)} artists with links {sorted(set(links.values()))[:3]}')
+
+    # the last upload's page, most likely rendered before its thumbnails exist
+    last_id = max(links)
+    early = client.get(f'/artists/{last_id}')
+    early_thumbnails = '-detail.webp' in early.get_data(as_text=True)
+    directory = client.get('/artists')
+    directory.get_data()  # the listing is streamed
+
+    ms = {key: value * 1000 for key, value in percentiles(timings).items()}
+    scratch = tempfile.mkdtemp()
+    with open(os.path.join(scratch, 'original.jpg'), 'wb') as f:
+        f.write(photos[0])
+    start = time.perf_counter()
+    make_thumbnails(scratch, 'original.jpg', 'original', THUMBNAIL_SIZES)
+    inline_ms = (time.perf_counter() - start) * 1000
+    print(f'{args.uploads} uploads of {args.width}x{args.height} JPEGs '
+          f'({statistics.mean(map(len, photos)) / 1024:.0f} KiB each): '
+          f'submission p50 {ms["p50"]:.1f} ms, p95 {ms["p95"]:.1f} ms; '
+          f'thumbnails written in the request would add {inline_ms:.0f} ms')
+
+    deadline = time.monotonic() + args.timeout
+    pending = set(links.values())
+    while pending and time.monotonic() < deadline:
+        pending = {link for link in pending if image_store.missing(link)}
+        time.sleep(0.05)
+    if pending:
+        sys.exit(f'{len(pending)} uploads still had no thumbnails after {args.timeout:.0f}s')
+    print(f'all thumbnails written {time.perf_counter() - max(submitted.values()):.2f}s after the last upload')
+
+    failures = []
+    weights = {}
+    for link in set(links.values()):
+        name = media_name(link)
+        for size, (width, height) in THUMBNAIL_SIZES.items():
+            for extension in ('webp', 'jpg'):
+                path = os.path.join(image_store.directory, f'{name}-{size}.{extension}')
+                with Image.open(path) as thumbnail:
+                    if thumbnail.width > width or thumbnail.height > height:
+                        failures.append(f'{path} is {thumbnail.width}x{thumbnail.height}, over {width}x{height}')
+                weights.setdefault((size, extension), []).append(os.path.getsize(path))
+    original = statistics.mean(map(len, photos))
+    for (size, extension), sizes in sorted(weights.items()):
+        print(f'{size:<7} {extension:<5} {statistics.mean(sizes) / 1024:7.1f} KiB '
+              f'({statistics.mean(sizes) / original:.1%} of the original)')
+
+    artist_id, link = next(iter(links.items()))
+    page = client.get(f'/artists/{artist_id}').get_data(as_text=True)
+    expected = [f'{link[:-len(".jpg")]}-detail.webp', f'{link[:-len(".jpg")]}-detail.jpg']
+    if not all(source in page for source in expected) or re.search(f'src="{re.escape(link)}"', page):
+        failures.append(f'/artists/{artist_id} does not show the detail thumbnails of {link}')
+    response = client.get(expected[0])
+    if response.status_code != 200 or 'immutable' not in response.headers.get('Cache-Control', ''):
+        failures.append(f'{expected[0]} served {response.status_code} {response.headers.get("Cache-Control")}')
+
+    if not early_thumbnails:
+        response = client.get(f'/artists/{last_id}', headers={'If-None-Match': early.headers['ETag']})
+        if response.status_code != 200 or '-detail.webp' not in response.get_data(as_text=True):
+            failures.append(f'/artists/{last_id} rendered before its thumbnails still revalidated '
+                            f'with {response.status_code} once they were written')
+    response = client.get('/artists', headers={'If-None-Match': directory.headers['ETag']})
+    response.get_data()
+    if response.status_code != 304:
+        failures.append(f'/artists answered {response.status_code} instead of 304 once thumbnails were written')
+
+    if failures:
+        print('\n'.join(failures))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
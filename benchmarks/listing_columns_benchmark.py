@@ -0,0 +1,111 @@
+"""Time and memory of loading the artist listing as ORM objects or as column rows.
+
+Seeds a fresh database through the migrations with --rows artists whose
+image_link and seeking_Description are filled to their full length, then
+loads the (id, name) pairs the listing renders in each way below, each in
+its own process, reporting wall time and the peak Python allocation traced
+by tracemalloc:
+
+    orm        Artist objects with every column (the profile group undeferred)
+    deferred   Artist objects, image_link and seeking_Description deferred
+    columns    (id, name) row tuples, as /artists and the searches query them
+    page       the whole /artists page through the test client
+
+    python benchmarks/listing_columns_benchmark.py --rows 100000
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+CHUNK_SIZE = 10000
+MODES = ['orm', 'deferred', 'columns', 'page']
+
+
+def seed(database_url, rows):
+    os.environ['DATABASE_URL'] = database_url
+    from flask_migrate import upgrade
+    from app import db, Artist
+    from seed_data import benchmark_app
+
+    app = benchmark_app()
+
+    with app.app_context():
+        upgrade(directory=os.path.join(ROOT, 'migrations'))
+        for start in range(0, rows, CHUNK_SIZE):
+            db.session.execute(Artist.__table__.insert(), [{
+                'name': f'Artist {i}', 'city': f'City {i % 2000}', 'state': 'CA',
+                'image_link': f'https://images.example.com/artists/{i}/'.ljust(500, 'x'),
+                'seeking_Description': f'Artist {i} is looking for '.ljust(300, '.')
+            } for i in range(start, min(start + CHUNK_SIZE, rows))])
+            db.session.commit()
+
+
+def measure(mode):
+    """Load the listing one way in this process and print the result as JSON."""
+    from app import db, Artist
+    from seed_data import benchmark_app
+
+    app = benchmark_app()
+
+    client = app.test_client()
+    client.get('/')
+    with app.app_context():
+        tracemalloc.start()
+        start = time.perf_counter()
+        if mode == 'page':
+            response = client.get('/artists')
+            count = response.get_data().count(b'href="/artists/')
+        else:
+            if mode == 'columns':
+                rows = db.session.query(Artist.id, Artist.name).order_by(Artist.id).all()
+            else:
+                query = Artist.query.order_by(Artist.id)
+                if mode == 'orm':
+                    query = query.options(db.undefer_group('profile'))
+                rows = query.all()
+            count = len([(row.id, row.name) for row in rows])
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    print(json.dumps({'rows': count, 'seconds': elapsed, 'peak_mb': peak / 1e6}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--database-url')
+    parser.add_argument('--no-seed', action='store_true', help='use --database-url as it is')
+    parser.add_argument('--measure', choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        measure(args.measure)
+        return
+
+    database_url = args.database_url or 'sqlite:///' + os.path.join(
+        tempfile.mkdtemp(), 'listing_columns_benchmark.db')
+    if not args.no_seed:
+        print(f'seeding {args.rows} artists into {database_url}')
+        seed(database_url, args.rows)
+
+    print(f'{"mode":<9} {"rows":>7} {"ms":>8} {"peak MB":>8}')
+    for mode in MODES:
+        env = dict(os.environ, DATABASE_URL=database_url, PAGE_CACHE_TYPE='null',
+                   UPCOMING_REFRESH_INTERVAL='0', PROFILER_ENABLED='0')
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--measure', mode],
+            env=env, check=True, capture_output=True, text=True).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        print(f'{mode:<9} {result["rows"]:>7} {result["seconds"] * 1000:>8.1f} {result["peak_mb"]:>8.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,183 @@
+"""Throughput of the read-only pages under gunicorn, by worker count.
+
+Starts ``gunicorn 'app:create_app()'`` once per worker count, drives it from several
+client processes for a fixed time and prints requests/second, latency
+percentiles and the speedup over a single worker. Each worker keeps its own
+connection pool, so the database sees up to
+workers * (DB_POOL_SIZE + DB_MAX_OVERFLOW) connections; keep that under the
+server's max_connections. Needs gunicorn (in requirements.txt):
+
+    python benchmarks/load_test.py --workers 1 2 4 8 --duration 20
+    python benchmarks/load_test.py --database-url postgresql://.../fyyur_load --path /venues/1
+
+Without --database-url (or DATABASE_URL) a temporary SQLite database is
+built through the migrations and seeded; SQLite serialises writers but reads
+scale, so it is good enough for comparing worker counts.
+"""
+import argparse
+import http.client
+import multiprocessing
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+DEFAULT_PATHS = ['/venues', '/artists', '/shows', '/venues/1', '/artists/1']
+
+
+def prepare_database(database_url, venues, artists, shows):
+    # config.py reads the database from the environment when it is imported
+    os.environ['DATABASE_URL'] = database_url
+    from flask_migrate import upgrade
+    from app import db
+    from seed_data import benchmark_app, generate
+
+    app = benchmark_app()
+
+    with app.app_context():
+        upgrade(directory=os.path.join(ROOT, 'migrations'))
+        generate(venues, artists, shows, report=lambda line: print(line, file=sys.stderr))
+        db.session.remove()
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def wait_until_serving(port, process, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError('gunicorn exited before it started serving')
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f'gunicorn was not serving on port {port} after {timeout}s')
+
+
+def client(port, paths, threads, warmup, duration):
+    """Run ``threads`` request loops; return (latencies of measured requests, errors)."""
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    start = time.time() + warmup
+    stop = start + duration
+
+    def loop(offset):
+        connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        mine = []
+        failed = 0
+        i = offset
+        while True:
+            began = time.time()
+            if began >= stop:
+                break
+            try:
+                connection.request('GET', paths[i % len(paths)])
+                response = connection.getresponse()
+                response.read()
+                ok = response.status == 200
+            except (OSError, http.client.HTTPException):
+                connection.close()
+                ok = False
+            finished = time.time()
+            if began >= start:
+                if ok:
+                    mine.append(finished - began)
+                else:
+                    failed += 1
+            i += 1
+        connection.close()
+        with lock:
+            latencies.extend(mine)
+            errors[0] += failed
+
+    workers = [threading.Thread(target=loop, args=(n,)) for n in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return latencies, errors[0]
+
+
+def percentile(ordered, fraction):
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def run(workers, args, env):
+    port = free_port()
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '--workers', str(workers), '--bind', f'127.0.0.1:{port}',
+         '--log-level', 'warning', 'app:create_app()'], cwd=ROOT, env=env)
+    try:
+        wait_until_serving(port, process)
+        clients = args.clients or max(2, workers)
+        with multiprocessing.Pool(clients) as pool:
+            results = pool.starmap(client, [
+                (port, args.path, args.threads, args.warmup, args.duration)] * clients)
+    finally:
+        process.terminate()
+        process.wait()
+    latencies = sorted(latency for result, _ in results for latency in result)
+    errors = sum(failed for _, failed in results)
+    return {
+        'workers': workers,
+        'requests': len(latencies),
+        'errors': errors,
+        'rps': len(latencies) / args.duration,
+        'p50': percentile(latencies, 0.50) * 1000,
+        'p95': percentile(latencies, 0.95) * 1000,
+        'p99': percentile(latencies, 0.99) * 1000
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--duration', type=float, default=15, help='measured seconds per run')
+    parser.add_argument('--warmup', type=float, default=3, help='unmeasured seconds per run')
+    parser.add_argument('--clients', type=int, help='client processes (default: max(2, workers))')
+    parser.add_argument('--threads', type=int, default=4, help='request loops per client process')
+    parser.add_argument('--path', action='append', help=f'page to request (default: {" ".join(DEFAULT_PATHS)})')
+    parser.add_argument('--database-url', default=os.environ.get('DATABASE_URL'))
+    parser.add_argument('--venues', type=int, default=2000)
+    parser.add_argument('--artists', type=int, default=2000)
+    parser.add_argument('--shows', type=int, default=50000)
+    args = parser.parse_args()
+    args.path = args.path or DEFAULT_PATHS
+
+    database_url = args.database_url
+    if not database_url:
+        database_url = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'load_test.db')
+        print(f'seeding {database_url}')
+        prepare_database(database_url, args.venues, args.artists, args.shows)
+
+    env = dict(os.environ, DATABASE_URL=database_url, FYYUR_ENV='production',
+               # the page cache would turn this into a benchmark of the cache
+               PAGE_CACHE_TYPE='null')
+    env.setdefault('SECRET_KEY', 'fyyur-load-test-key')
+
+    baseline = None
+    print(f'{"workers":>7} {"req/s":>9} {"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8} {"errors":>6} {"speedup":>7}')
+    for workers in args.workers:
+        result = run(workers, args, env)
+        baseline = baseline or result['rps']
+        speedup = result['rps'] / baseline if baseline else 0.0
+        print(f'{result["workers"]:>7} {result["rps"]:>9.1f} {result["p50"]:>8.1f} {result["p95"]:>8.1f} '
+              f'{result["p99"]:>8.1f} {result["errors"]:>6} {speedup:>6.2f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""Fail if a page issues more queries as the dataset grows.
+
+Seeds a fresh database with seed_data.generate, counts the statements each
+page runs through the Flask test client, seeds ``--growth`` times as much
+again and counts once more. The venue directory, like every page below,
+must issue the same number of queries at both sizes, however many venues,
+areas or shows there are. Exits non-zero when any count changed:
+
+    python benchmarks/query_count_check.py
+    python benchmarks/query_count_check.py --venues 200 --growth 20
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PAGES = ['/venues', '/artists', '/shows', '/venues/1', '/artists/1', '/venues/1?past_page=2']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--venues', type=int, default=50)
+    parser.add_argument('--artists', type=int, default=50)
+    parser.add_argument('--shows', type=int, default=500)
+    parser.add_argument('--growth', type=int, default=10, help='times the first dataset the second one adds')
+    args = parser.parse_args()
+
+    # config.py reads the database from the environment when it is imported;
+    # every request renders, rather than reading the page cache
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'query_count_check.db')
+    os.environ['PAGE_CACHE_TYPE'] = 'null'
+    from flask_migrate import upgrade
+    from sqlalchemy import event
+    from app import db
+    from seed_data import benchmark_app, generate
+
+    app = benchmark_app()
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    def page_counts():
+        client = app.test_client()
+        counts = {}
+        for path in PAGES:
+            del statements[:]
+            response = client.get(path)
+            response.get_data()  # streamed pages query while they are read
+            if response.status_code != 200:
+                sys.exit(f'{path} returned {response.status_code}')
+            counts[path] = len(statements)
+        return counts
+
+    report = lambda line: print(line, file=sys.stderr)
+    with app.app_context():
+        upgrade(directory=os.path.join(ROOT, 'migrations'))
+        generate(args.venues, args.artists, args.shows, seed=1, report=report)
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', count)
+    small = page_counts()
+    event.remove(engine, 'before_cursor_execute', count)
+
+    with app.app_context():
+        generate(args.venues * args.growth, args.artists * args.growth, args.shows * args.growth,
+                 seed=2, report=report)
+    event.listen(engine, 'before_cursor_execute', count)
+    large = page_counts()
+    event.remove(engine, 'before_cursor_execute', count)
+
+    failures = [path for path in PAGES if small[path] != large[path]]
+    for path in PAGES:
+        print(f'{"FAIL" if path in failures else "ok  "} {path}: {small[path]} queries, '
+              f'{large[path]} with {1 + args.growth} times the data')
+    if failures:
+        print(f'{len(failures)} pages issue more queries on more data')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,155 @@
+"""Time the recommendation rebuild, incremental refreshes and panel lookups.
+
+Seeds a fresh database with seed_data.generate and times:
+- a full Recommender.rebuild,
+- the panel query of random venue and artist pages,
+- the incremental refresh after each of a series of writes: new artists,
+  one of them in a genre created for it, venues moving city, artists
+  toggling seeking_venue,
+- the full reload a FeatureReloader makes on its own thread.
+
+The writes alternate between two Recommenders, standing in for two worker
+processes, and some are rolled back after their refresh. The second has
+not loaded its features when its first write comes, so it leaves that
+write to its reload. None of the writes changes another entity's features. The lists the refreshes leave must
+therefore score exactly like the ones a fresh rebuild computes, and the
+script exits non-zero when they do not:
+
+    python benchmarks/recommendation_benchmark.py --venues 20000 --artists 20000 --shows 500000
+    python benchmarks/recommendation_benchmark.py --database-url postgresql://.../fyyur_recommend
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def stored_lists(db, Recommendation):
+    lists = {}
+    for row in db.session.query(Recommendation.owner_kind, Recommendation.owner_id, Recommendation.score).order_by(
+            Recommendation.owner_kind, Recommendation.owner_id, Recommendation.rank):
+        lists.setdefault((row.owner_kind, row.owner_id), []).append(round(row.score, 5))
+    return lists
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--venues', type=int, default=5000)
+    parser.add_argument('--artists', type=int, default=5000)
+    parser.add_argument('--shows', type=int, default=100000)
+    parser.add_argument('--lookups', type=int, default=500)
+    parser.add_argument('--changes', type=int, default=60)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--database-url')
+    args = parser.parse_args()
+
+    database_url = args.database_url or 'sqlite:///' + os.path.join(
+        tempfile.mkdtemp(), 'recommendation_benchmark.db')
+    os.environ['DATABASE_URL'] = database_url
+    from flask_migrate import upgrade
+    from app import (db, Artist, Genre, Recommendation, Venue, artist_genre, get_recommendations,
+                     recommender, set_genres)
+    from profiler import percentiles
+    from recommendations import SYNC_OVERLAP, Recommender
+    from seed_data import benchmark_app, generate
+
+    app = benchmark_app()
+    rng = random.Random(args.seed)
+    with app.app_context():
+        upgrade(directory=os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'migrations'))
+        generate(args.venues, args.artists, args.shows, args.seed, report=lambda line: print(line, file=sys.stderr))
+
+        # every refresh reads back the rows written within SYNC_OVERLAP of the
+        # last sync, here the whole freshly seeded database
+        time.sleep(SYNC_OVERLAP)
+        start = time.perf_counter()
+        recommender.rebuild(db.session)
+        db.session.commit()
+        print(f'rebuild of {args.venues} venues x {args.artists} artists: {time.perf_counter() - start:.2f}s')
+
+        venue_ids = [row[0] for row in db.session.query(Venue.id)]
+        artist_ids = [row[0] for row in db.session.query(Artist.id)]
+        genre_ids = [row[0] for row in db.session.query(Genre.id)]
+        places = db.session.query(Venue.city, Venue.state).distinct().all()
+
+        timings = []
+        for _ in range(args.lookups):
+            kind, owner_id, target = rng.choice([('venue', rng.choice(venue_ids), Artist),
+                                                 ('artist', rng.choice(artist_ids), Venue)])
+            start = time.perf_counter()
+            get_recommendations(kind, owner_id, target)
+            timings.append(time.perf_counter() - start)
+            db.session.close()
+        ms = {key: value * 1000 for key, value in percentiles(timings).items()}
+        print(f'panel lookup: p50 {ms["p50"]:.2f} ms, p95 {ms["p95"]:.2f} ms, p99 {ms["p99"]:.2f} ms')
+
+        timings = {'new artist': [], 'venue moved': [], 'seeking toggled': []}
+        rewritten = rolled_back = 0
+        other_worker = Recommender(recommender.store, recommender.sides, recommender.count)
+        # as when its FeatureReloader has started but not loaded yet
+        other_worker.deferred = True
+        reload_ms = None
+        for i in range(args.changes):
+            start = time.perf_counter()
+            if i % 3 == 0:
+                city, state = rng.choice(places)
+                artist = Artist(name=f'New Artist {i}', city=city, state=state, seeking_venue=True)
+                db.session.add(artist)
+                db.session.flush()
+                genres = rng.sample(genre_ids, rng.randint(1, 3))
+                if i == 3:
+                    genre = Genre(name=f'New Genre {i}')
+                    db.session.add(genre)
+                    db.session.flush()
+                    genres.append(genre.id)
+                set_genres(artist_genre.c.artist_id, artist.id, genres)
+                changes, operation = {'artist': [artist.id]}, 'new artist'
+            elif i % 3 == 1:
+                venue = Venue.query.get(rng.choice(venue_ids))
+                venue.city, venue.state = rng.choice(places)
+                db.session.flush()
+                changes, operation = {'venue': [venue.id]}, 'venue moved'
+            else:
+                artist = Artist.query.get(rng.choice(artist_ids))
+                artist.seeking_venue = not artist.seeking_venue
+                db.session.flush()
+                changes, operation = {'artist': [artist.id]}, 'seeking toggled'
+            pages = (recommender, other_worker)[i % 2].refresh(db.session, changes)
+            if i % 7 == 6:
+                db.session.rollback()
+                rolled_back += 1
+                continue
+            db.session.commit()
+            timings[operation].append(time.perf_counter() - start)
+            rewritten += sum(len(ids) for ids in pages.values())
+            if reload_ms is None and i % 2:
+                start = time.perf_counter()
+                pages = other_worker.reload(db.session)
+                db.session.commit()
+                reload_ms = (time.perf_counter() - start) * 1000
+                rewritten += sum(len(ids) for ids in pages.values())
+        for operation, values in timings.items():
+            if values:
+                ms = {key: value * 1000 for key, value in percentiles(values).items()}
+                print(f'{operation}: p50 {ms["p50"]:.1f} ms, p95 {ms["p95"]:.1f} ms over {len(values)} writes')
+        if reload_ms is not None:
+            print(f'background reload, with the write made before it: {reload_ms:.0f} ms')
+        print(f'{rewritten} lists rewritten by {args.changes - rolled_back} writes, {rolled_back} rolled back')
+
+        refreshed = stored_lists(db, Recommendation)
+        recommender.rebuild(db.session)
+        db.session.commit()
+        rebuilt = stored_lists(db, Recommendation)
+        differing = [owner for owner in set(refreshed) | set(rebuilt) if refreshed.get(owner) != rebuilt.get(owner)]
+        print(f'{len(rebuilt)} lists after the writes, {len(differing)} differ from a full rebuild')
+        if differing:
+            print('first differing: ' + ', '.join(f'{kind} {owner_id}' for kind, owner_id in sorted(differing)[:10]))
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,168 @@
+"""Check read-replica routing with two SQLite files as primary and replica.
+
+Builds the primary through the migrations, seeds it and copies it to the
+replica with SQLite's backup API, which stands in for replication: the
+replica only sees a write once the script copies the file again. Then drives
+the app through the Flask test client and checks that:
+
+- pages, and the /api/v1 requests asgi.py serves, are read from the replica,
+- a user who has just created a venue reads it back from the primary, from
+  the pages and the ASGI API alike,
+- other users keep reading the replica until it lags past DB_REPLICA_MAX_LAG,
+- once the replica has caught up, the writer reads from it again,
+- a write after the replica has sat idle does not count the idle time as lag,
+- with the replica unreadable, every page is read from the primary.
+
+Exits non-zero when any check fails:
+
+    python benchmarks/replica_check.py
+    python benchmarks/replica_check.py --venues 5000 --artists 5000 --shows 100000
+"""
+import argparse
+import asyncio
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--venues', type=int, default=200)
+    parser.add_argument('--artists', type=int, default=200)
+    parser.add_argument('--shows', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--idle', type=float, default=2, help='seconds the replica sits idle before a write')
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    primary_path = os.path.join(directory, 'primary.db')
+    replica_path = os.path.join(directory, 'replica.db')
+    # the testing config reads these, and turns CSRF off for the form posts
+    os.environ['FYYUR_ENV'] = 'testing'
+    os.environ['TEST_DATABASE_URL'] = 'sqlite:///' + primary_path
+    os.environ['TEST_DATABASE_REPLICA_URL'] = 'sqlite:///' + replica_path
+    # read the replication position on every request
+    os.environ['DB_REPLICA_CHECK_INTERVAL'] = '0'
+    from flask_migrate import upgrade
+    from sqlalchemy import event
+    from app import Venue, db, replica_router
+    from replicas import WRITTEN_POSITION_KEY
+    import asgi
+    from seed_data import benchmark_app, generate
+
+    # the ASGI entry point built its own app on import; drive this one
+    app = asgi.app = benchmark_app()
+    with app.app_context():
+        upgrade(directory=os.path.join(ROOT, 'migrations'))
+        generate(args.venues, args.artists, args.shows, args.seed, report=lambda line: print(line, file=sys.stderr))
+        primary_engine = db.engine
+
+    def replicate():
+        source, target = sqlite3.connect(primary_path), sqlite3.connect(replica_path)
+        source.backup(target)
+        source.close()
+        target.close()
+    replicate()
+
+    # SELECTs per engine, leaving out the router's own position checks
+    reads = {}
+
+    def count(engine, name):
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            if 'replication_position' not in statement:
+                reads[name] = reads.get(name, 0) + 1
+        event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    count(primary_engine, 'primary')
+    count(replica_router.engine, 'replica')
+
+    failures = []
+
+    def report(description, path, status, expected_status, engine):
+        served = sorted(reads)
+        passed = status == expected_status and served == [engine]
+        print(f'{"ok  " if passed else "FAIL"} {description}: {path} {status} '
+              f'read from {", ".join(served) or "nothing"}')
+        if not passed:
+            failures.append(description)
+
+    def check(description, client, path, status, engine):
+        reads.clear()
+        response = client.get(path)
+        response.get_data()
+        report(description, path, response.status_code, status, engine)
+
+    def check_api(description, client, path, status, engine):
+        # through asgi.application, with the client's session cookie
+        reads.clear()
+        cookie = client.get_cookie('session')
+        headers = [(b'cookie', f'session={cookie.value}'.encode())] if cookie else []
+        messages = []
+
+        async def receive():
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+        async def send(message):
+            messages.append(message)
+        asyncio.run(asgi.application({'type': 'http', 'method': 'GET', 'path': path, 'query_string': b'',
+                                      'headers': headers, 'http_version': '1.1', 'scheme': 'http'},
+                                     receive, send))
+        report(description, path, messages[0]['status'], status, engine)
+
+    writer, reader = app.test_client(), app.test_client()
+    check('listing from the replica', reader, '/venues', 200, 'replica')
+    check('detail page from the replica', reader, '/venues/1', 200, 'replica')
+    check_api('ASGI API from the replica', reader, '/api/v1/venues/1', 200, 'replica')
+
+    response = writer.post('/venues/create', data={
+        'name': 'Replica Check Hall', 'city': 'Austin', 'state': 'TX', 'address': '1 Main St',
+        'phone': '5125550100', 'genres': ['1'], 'image_link': 'https://images.example.com/venue/replica.jpg',
+        'facebook_link': 'https://www.facebook.com/replicacheck'})
+    with app.app_context():
+        venue_id = db.session.query(db.func.max(Venue.id)).scalar()
+    with writer.session_transaction() as session:
+        written = session.get(WRITTEN_POSITION_KEY)
+    print(f'created venue {venue_id} at replication position {written} ({response.status_code})')
+    if written is None:
+        failures.append('write position stored in the session')
+
+    check('writer reads its own write from the primary', writer, f'/venues/{venue_id}', 200, 'primary')
+    check_api('writer reads its own write from the primary over the ASGI API', writer,
+              f'/api/v1/venues/{venue_id}', 200, 'primary')
+    replica_router.max_lag = 3600
+    check('other users read the lagging replica', reader, f'/venues/{venue_id}', 404, 'replica')
+    replica_router.max_lag = 0
+    check('replica past the lag limit falls back to the primary', reader, f'/venues/{venue_id}', 200, 'primary')
+
+    replicate()
+    check('writer back on the replica once it caught up', writer, f'/venues/{venue_id}', 200, 'replica')
+    with writer.session_transaction() as session:
+        if WRITTEN_POSITION_KEY in session:
+            failures.append('write position dropped once replayed')
+
+    # lag counts from when the write was made, not from the last write the
+    # replica replayed before sitting idle
+    time.sleep(args.idle)
+    replica_router.max_lag = args.idle
+    writer.post(f'/venues/{venue_id}/edit', data={
+        'name': 'Replica Check Hall', 'city': 'Austin', 'state': 'TX', 'address': '2 Main St',
+        'phone': '5125550100', 'genres': ['1'], 'image_link': 'https://images.example.com/venue/replica.jpg',
+        'facebook_link': 'https://www.facebook.com/replicacheck'})
+    check('a write after an idle spell is not lag', reader, f'/venues/{venue_id}', 200, 'replica')
+
+    replica_router.engine.dispose()
+    os.replace(replica_path, replica_path + '.moved')
+    check('unreadable replica falls back to the primary', reader, f'/venues/{venue_id}', 200, 'primary')
+
+    if failures:
+        print(f'{len(failures)} checks failed: ' + '; '.join(failures))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
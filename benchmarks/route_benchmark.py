@@ -0,0 +1,308 @@
+"""Latency, throughput and SQL query counts of every route, as comparable JSON.
+
+Seeds a fresh database with seed_data.py (unless --no-seed), then sends
+--requests requests to each route of app.py through the Flask test client
+from --concurrency threads, after --warmup unrecorded ones. Reports per
+route the p50/p95/p99/max latency, requests per second and SQL statements
+per request, prints a table and writes the results as JSON with the commit
+they were measured at. Exits non-zero if a route has no request defined
+below or answers with a server error, so it doubles as a smoke test:
+
+    python benchmarks/route_benchmark.py --output before.json
+    python benchmarks/route_benchmark.py --shows 1000000 --concurrency 8 --output after.json
+    python benchmarks/route_benchmark.py --compare before.json after.json
+
+Write routes run for real against the benchmark database: creates add rows,
+edits rewrite the busiest venue and artist with their own values, and
+deletes target ids that do not exist (the bulk deletes carry no CSRF token
+and are refused).
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from itertools import count
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT, check=True,
+                              capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def form_data(row, fields, genre_ids):
+    # a row as the edit form would post it back
+    data = {field: '' if getattr(row, attr) is None else str(getattr(row, attr)) for field, attr in fields}
+    data['genres'] = [str(genre_id) for genre_id in genre_ids]
+    return data
+
+
+def benchmark_context():
+    """Ids and form data the requests below need, read from the database."""
+    from werkzeug.datastructures import FileStorage
+    from app import db, Venue, Artist, Show, Genre, venue_genre, artist_genre, image_store
+    from seed_data import benchmark_app
+
+    app = benchmark_app()
+
+    with app.app_context():
+        venue_id = db.session.query(Show.venue_id).group_by(Show.venue_id).order_by(
+            db.func.count(Show.id).desc()).limit(1).scalar() or 1
+        artist_id = db.session.query(Show.artist_id).group_by(Show.artist_id).order_by(
+            db.func.count(Show.id).desc()).limit(1).scalar() or 1
+        venue = Venue.query.options(db.undefer_group('profile')).get(venue_id)
+        artist = Artist.query.options(db.undefer_group('profile')).get(artist_id)
+        venue_genres = [row[0] for row in db.session.query(venue_genre.c.genre_id).filter(
+            venue_genre.c.venue_id == venue_id)]
+        artist_genres = [row[0] for row in db.session.query(artist_genre.c.genre_id).filter(
+            artist_genre.c.artist_id == artist_id)]
+        context = {
+            'venue_id': venue_id,
+            'artist_id': artist_id,
+            'latitude': venue.latitude if venue.latitude is not None else 40.7128,
+            'longitude': venue.longitude if venue.longitude is not None else -74.006,
+            'search_term': venue.name.split()[1] if len(venue.name.split()) > 1 else venue.name,
+            'genre_id': db.session.query(db.func.min(Genre.id)).scalar(),
+            # ids no row will ever have, for the delete routes
+            'missing_id': max(db.session.query(db.func.max(Venue.id)).scalar() or 0,
+                              db.session.query(db.func.max(Artist.id)).scalar() or 0) + 10 ** 9,
+            'venue_form': form_data(venue, (
+                ('name', 'name'), ('city', 'city'), ('state', 'state'), ('address', 'address'),
+                ('phone', 'phone'), ('image_link', 'image_link'), ('facebook_link', 'facebook_link'),
+                ('website_link', 'website_Link'), ('seeking_description', 'seeking_Description')
+            ), venue_genres),
+            'artist_form': form_data(artist, (
+                ('name', 'name'), ('city', 'city'), ('state', 'state'), ('phone', 'phone'),
+                ('image_link', 'image_link'), ('facebook_link', 'facebook_link'),
+                ('website_link', 'website_Link'), ('seeking_description', 'seeking_Description')
+            ), artist_genres)
+        }
+        # an upload for /media/ to serve
+        with open(os.path.join(app.static_folder, 'img', 'front-splash.jpg'), 'rb') as f:
+            context['media_link'] = image_store.save(FileStorage(f, 'front-splash.jpg'))
+        if venue.talent:
+            context['venue_form']['seeking_talent'] = 'y'
+        if artist.seeking_venue:
+            context['artist_form']['seeking_venue'] = 'y'
+        db.session.remove()
+    return context
+
+
+def request_specs(context):
+    """{(method, rule): make(n) -> (path, test client keyword arguments)} for every route."""
+    venue_id, artist_id, missing = context['venue_id'], context['artist_id'], context['missing_id']
+    new_show_start = datetime(2100, 1, 1, 18)
+
+    def new_entity(kind, n):
+        return {'name': f'Benchmark {kind} {n}', 'city': 'Austin', 'state': 'TX', 'address': f'{n} Main St',
+                'phone': '5125550100', 'image_link': f'https://images.example.com/{kind}/b{n}.jpg',
+                'facebook_link': f'https://www.facebook.com/b{n}', 'genres': [str(context['genre_id'])]}
+
+    def get(path):
+        return lambda n: (path, {})
+
+    return {
+        ('GET', '/'): get('/'),
+        ('GET', '/venues'): get('/venues'),
+        ('POST', '/venues/search'): lambda n: ('/venues/search', {'data': {'search_term': context['search_term']}}),
+        ('GET', '/venues/near'): get(f'/venues/near?lat={context["latitude"]}&lon={context["longitude"]}&radius=50'),
+        ('GET', '/venues/<int:venue_id>'): get(f'/venues/{venue_id}'),
+        ('GET', '/venues/create'): get('/venues/create'),
+        ('POST', '/venues/create'): lambda n: ('/venues/create', {'data': new_entity('venue', n)}),
+        ('POST', '/venues/<int:venue_id>'): lambda n: (f'/venues/{missing + n}', {}),
+        ('GET', '/venues/delete'): get('/venues/delete'),
+        ('GET', '/artists/delete'): get('/artists/delete'),
+        ('POST', '/venues/delete'): lambda n: ('/venues/delete', {'json': {'ids': [missing + n]}}),
+        ('POST', '/artists/delete'): lambda n: ('/artists/delete', {'json': {'ids': [missing + n]}}),
+        ('GET', '/artists'): get('/artists'),
+        ('POST', '/artists/search'): lambda n: ('/artists/search', {'data': {'search_term': 'the'}}),
+        ('GET', '/api/search'): get('/api/search?type=venue&q=the'),
+        ('GET', '/api/v1/'): get('/api/v1/'),
+        ('GET', '/api/v1/<path:path>'): get('/api/v1/shows?upcoming=true&limit=50'),
+        ('GET', '/artists/<int:artist_id>'): get(f'/artists/{artist_id}'),
+        ('GET', '/venues/<int:venue_id>/calendar.ics'): get(f'/venues/{venue_id}/calendar.ics'),
+        ('GET', '/artists/<int:artist_id>/calendar.ics'): get(f'/artists/{artist_id}/calendar.ics'),
+        ('POST', '/artists/<int:artist_id>'): lambda n: (f'/artists/{missing + n}', {}),
+        ('GET', '/artists/<int:artist_id>/edit'): get(f'/artists/{artist_id}/edit'),
+        ('POST', '/artists/<int:artist_id>/edit'): lambda n: (
+            f'/artists/{artist_id}/edit', {'data': context['artist_form']}),
+        ('GET', '/venues/<int:venue_id>/edit'): get(f'/venues/{venue_id}/edit'),
+        ('POST', '/venues/<int:venue_id>/edit'): lambda n: (
+            f'/venues/{venue_id}/edit', {'data': context['venue_form']}),
+        ('GET', '/artists/create'): get('/artists/create'),
+        ('POST', '/artists/create'): lambda n: ('/artists/create', {'data': new_entity('artist', n)}),
+        ('GET', '/shows'): get('/shows'),
+        ('GET', '/shows/create'): get('/shows/create'),
+        # far-future starts three hours apart never double-book
+        ('POST', '/shows/create'): lambda n: ('/shows/create', {'data': {
+            'venue_id': str(venue_id), 'artist_id': str(artist_id),
+            'start_time': (new_show_start + timedelta(hours=3 * n)).strftime('%Y-%m-%d %H:%M:%S')}}),
+        ('GET', '/media/<path:filename>'): get(context['media_link']),
+        ('GET', '/__cache'): get('/__cache'),
+        ('GET', '/__metrics'): get('/__metrics'),
+    }
+
+
+def app_routes(app):
+    return sorted((method, rule.rule) for rule in app.url_map.iter_rules() if rule.endpoint != 'static'
+                  for method in rule.methods - {'HEAD', 'OPTIONS'})
+
+
+def run(args):
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+    from seed_data import benchmark_app
+    from profiler import percentiles
+
+    app = benchmark_app()
+
+    specs = request_specs(benchmark_context())
+    missing = [route for route in app_routes(app) if route not in specs]
+    if missing:
+        sys.exit('no benchmark request for: ' + ', '.join(f'{method} {rule}' for method, rule in missing))
+
+    local = threading.local()
+
+    def count_statement(*args):
+        local.queries = getattr(local, 'queries', 0) + 1
+    event.listen(Engine, 'before_cursor_execute', count_statement)
+
+    def send(method, make, n):
+        client = getattr(local, 'client', None)
+        if client is None:
+            client = local.client = app.test_client()
+        path, kwargs = make(n)
+        local.queries = 0
+        start = time.perf_counter()
+        response = client.open(path, method=method, **kwargs)
+        response.get_data()
+        response.close()
+        return response.status_code, time.perf_counter() - start, local.queries
+
+    numbers = count()
+    routes = {}
+    selected = [route for route in app_routes(app) if not args.route or route[1] in args.route]
+    with ThreadPoolExecutor(args.concurrency) as pool:
+        for method, rule in selected:
+            make = specs[(method, rule)]
+            list(pool.map(lambda _: send(method, make, next(numbers)), range(args.warmup)))
+            start = time.perf_counter()
+            results = list(pool.map(lambda _: send(method, make, next(numbers)), range(args.requests)))
+            elapsed = time.perf_counter() - start
+            statuses = {}
+            for status, _, _ in results:
+                statuses[str(status)] = statuses.get(str(status), 0) + 1
+            routes[f'{method} {rule}'] = {
+                'requests': len(results),
+                'statuses': statuses,
+                'errors': sum(1 for status, _, _ in results if status >= 500),
+                'throughput_rps': round(len(results) / elapsed, 1) if elapsed else None,
+                'latency_ms': {name: round(value * 1000, 3) for name, value in
+                               percentiles([seconds for _, seconds, _ in results]).items()},
+                'queries': percentiles([queries for _, _, queries in results])
+            }
+            print_route(f'{method} {rule}', routes[f'{method} {rule}'])
+    return routes
+
+
+def print_route(route, result):
+    latency = result['latency_ms']
+    print(f'{route:<46} {latency["p50"]:>8.2f} {latency["p95"]:>8.2f} {latency["p99"]:>8.2f} '
+          f'{result["throughput_rps"]:>8.1f} {result["queries"]["p50"]:>4} {result["errors"]:>4}', flush=True)
+
+
+def compare(before_path, after_path):
+    with open(before_path) as stream:
+        before = json.load(stream)
+    with open(after_path) as stream:
+        after = json.load(stream)
+    print(f'{before_path}: {before.get("commit")}  ->  {after_path}: {after.get("commit")}')
+    print(f'{"route":<46} {"p50 ms":>17} {"p95 ms":>17} {"req/s":>15} {"queries":>9}')
+    for route in sorted(set(before['routes']) | set(after['routes'])):
+        old, new = before['routes'].get(route), after['routes'].get(route)
+        if old is None or new is None:
+            print(f'{route:<46} {"only in " + (after_path if old is None else before_path)}')
+            continue
+
+        def change(name, key=None):
+            a = old[name][key] if key else old[name]
+            b = new[name][key] if key else new[name]
+            return f'{a:>7} {(b - a) / a * 100 if a else 0.0:>+8.1f}%'
+        print(f'{route:<46} {change("latency_ms", "p50")} {change("latency_ms", "p95")} '
+              f'{change("throughput_rps"):>15} {old["queries"]["p50"]:>4}->{new["queries"]["p50"]:<4}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--venues', type=int, default=2000)
+    parser.add_argument('--artists', type=int, default=2000)
+    parser.add_argument('--shows', type=int, default=50000)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--requests', type=int, default=100, help='recorded requests per route')
+    parser.add_argument('--warmup', type=int, default=5, help='unrecorded requests per route')
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--route', action='append', help='only this rule, e.g. /venues (repeatable)')
+    parser.add_argument('--page-cache', default='null', help='PAGE_CACHE_TYPE to run with')
+    parser.add_argument('--database-url')
+    parser.add_argument('--no-seed', action='store_true', help='use --database-url as it is')
+    parser.add_argument('--output', help='write the JSON results here (- for stdout)')
+    parser.add_argument('--compare', nargs=2, metavar=('BEFORE', 'AFTER'),
+                        help='compare two result files instead of running')
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    database_url = args.database_url or 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'route_benchmark.db')
+    # config.py reads these from the environment when it is imported
+    os.environ.update(DATABASE_URL=database_url, PAGE_CACHE_TYPE=args.page_cache,
+                      UPCOMING_REFRESH_INTERVAL='0', PROFILER_ENABLED='0')
+    from flask_migrate import upgrade
+    from app import db
+    from seed_data import benchmark_app, generate
+
+    app = benchmark_app()
+
+    dataset = None
+    if not args.no_seed:
+        with app.app_context():
+            upgrade(directory=os.path.join(ROOT, 'migrations'))
+            dataset = generate(args.venues, args.artists, args.shows, args.seed,
+                               report=lambda line: print(line, file=sys.stderr))
+            db.session.remove()
+
+    print(f'{"route":<46} {"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8} {"req/s":>8} {"SQL":>4} {"5xx":>4}')
+    routes = run(args)
+    results = {
+        'commit': git_commit(),
+        'created': datetime.utcnow().isoformat() + 'Z',
+        'database': database_url.split(':', 1)[0],
+        'dataset': dataset,
+        'settings': {'requests': args.requests, 'warmup': args.warmup, 'concurrency': args.concurrency,
+                     'page_cache': args.page_cache},
+        'routes': routes
+    }
+    if args.output == '-':
+        json.dump(results, sys.stdout, indent=2)
+    elif args.output:
+        with open(args.output, 'w') as stream:
+            json.dump(results, stream, indent=2)
+    errors = sum(result['errors'] for result in routes.values())
+    if errors:
+        sys.exit(f'{errors} requests failed with a server error')
+
+
+if __name__ == '__main__':
+    main()
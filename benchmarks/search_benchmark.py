@@ -0,0 +1,93 @@
+"""Compare venue search latency between the old name ILIKE scan and search.py.
+
+Builds a fresh database through the migrations, fills it with synthetic venues
+and times both paths for a handful of terms:
+
+    python benchmarks/search_benchmark.py --rows 1000000
+    python benchmarks/search_benchmark.py --database-url postgresql://.../fyyur_bench
+
+A --database-url must point at an empty database; the default is a fresh
+SQLite file in a temporary directory.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+WORDS = ['Musical', 'Hop', 'Park', 'Square', 'Live', 'Music', 'Coffee', 'Dueling',
+         'Pianos', 'Bar', 'Jazz', 'Hall', 'Lounge', 'Club', 'Garage', 'Theatre',
+         'Room', 'Cellar', 'Stage', 'Tavern', 'Warehouse', 'Gallery', 'Den']
+CITIES = [('San Francisco', 'CA'), ('New York', 'NY'), ('Austin', 'TX'), ('Seattle', 'WA'),
+          ('Chicago', 'IL'), ('Nashville', 'TN'), ('Denver', 'CO'), ('Boston', 'MA')]
+TERMS = ['hop', 'music', 'jazz hall', 'nashville', 'zzzz']
+CHUNK_SIZE = 10000
+
+
+def seed(db, Venue, rows):
+    rng = random.Random(42)
+    for start in range(0, rows, CHUNK_SIZE):
+        batch = []
+        for i in range(start, min(start + CHUNK_SIZE, rows)):
+            city, state = rng.choice(CITIES)
+            batch.append({
+                'name': ' '.join(rng.sample(WORDS, 3)) + f' {i}',
+                'city': city,
+                'state': state,
+                'address': f'{i} Main St'
+            })
+        db.session.execute(Venue.__table__.insert(), batch)
+        db.session.commit()
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--database-url')
+    args = parser.parse_args()
+
+    database_url = args.database_url or 'sqlite:///' + os.path.join(
+        tempfile.mkdtemp(), 'search_benchmark.db')
+
+    # config.py reads the database from the environment when it is imported
+    os.environ['DATABASE_URL'] = database_url
+    from flask_migrate import upgrade
+    from app import db, Venue, venue_search
+    from seed_data import benchmark_app
+    from search import search
+
+    app = benchmark_app()
+
+    migrations = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'migrations')
+    with app.app_context():
+        upgrade(directory=migrations)
+
+        start = time.perf_counter()
+        seed(db, Venue, args.rows)
+        print(f'seeded {args.rows} venues in {time.perf_counter() - start:.1f}s ({database_url})')
+
+        print(f'{"term":<12} {"ilike ms":>10} {"search ms":>10} {"hits":>6}')
+        for term in TERMS:
+            ilike_ms = timed(lambda: Venue.query.filter(
+                Venue.name.ilike(f'%{term}%')).all(), args.repeat)
+            search_ms = timed(lambda: search(db.session, venue_search, term), args.repeat)
+            hits = len(search(db.session, venue_search, term))
+            print(f'{term:<12} {ilike_ms:>10.1f} {search_ms:>10.1f} {hits:>6}')
+
+
+if __name__ == '__main__':
+    main()
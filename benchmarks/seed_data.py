@@ -0,0 +1,213 @@
+"""Generate a realistic, reproducible Fyyur dataset in SQLite or Postgres.
+
+Venues and artists get names, cities from data/city_centroids.csv (placed
+at their centroids), phones, links and one to three genres each. Shows follow
+Zipf-skewed popularity, so a few venues and artists carry most of the
+bookings as in real listings. Shows start in the evening between five years
+ago and a year ahead, and never double-book a venue or an artist, so the
+Postgres booking constraints accept them. The same --seed always produces
+the same rows, with dates relative to the day it runs:
+
+    python benchmarks/seed_data.py --venues 20000 --artists 20000 --shows 1000000
+    python benchmarks/seed_data.py --database-url postgresql://.../fyyur_bench --seed 3
+"""
+import argparse
+import csv
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from functools import lru_cache
+from itertools import accumulate
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+CHUNK_SIZE = 10000
+# draws before an over-booked venue or artist gives way to a uniformly chosen one
+BOOKING_ATTEMPTS = 20
+
+ADJECTIVES = ['Blue', 'Golden', 'Velvet', 'Electric', 'Silver', 'Midnight', 'Crimson', 'Wild',
+              'Lucky', 'Hidden', 'Rusty', 'Neon', 'Northern', 'Lonesome', 'Royal', 'Little']
+VENUE_NOUNS = ['Room', 'Hall', 'Lounge', 'Tavern', 'Theater', 'Club', 'Ballroom', 'Cellar',
+               'Garden', 'Warehouse', 'Saloon', 'Stage', 'Den', 'Loft']
+ARTIST_NOUNS = ['Foxes', 'Echoes', 'Rivers', 'Sparrows', 'Machines', 'Ghosts', 'Wolves',
+                'Satellites', 'Strangers', 'Horses', 'Tides', 'Lanterns']
+FIRST_NAMES = ['Ada', 'Miles', 'Nina', 'Otis', 'Etta', 'Hank', 'Joni', 'Ray', 'Billie', 'Sam',
+               'Aretha', 'Johnny', 'Patsy', 'Louis', 'Ella', 'Chet']
+LAST_NAMES = ['Carter', 'Reyes', 'Holiday', 'Nash', 'Monroe', 'Baker', 'Franklin', 'Young',
+              'Price', 'Wells', 'Simone', 'James', 'Cline', 'Parker', 'Rivera', 'Hughes']
+
+
+@lru_cache(maxsize=None)
+def benchmark_app():
+    """The app the benchmarks in this process drive, built once, with
+    Flask-Migrate set up so it can upgrade its database in process."""
+    from app import create_app, init_migrations
+    from config import get_config
+
+    config = get_config()
+    # no reloader thread querying the database behind the statements the
+    # benchmarks count and time; the first write loads the features instead
+    config.RECOMMENDATION_RELOAD_INTERVAL = 0
+    app = create_app(config)
+    init_migrations(app)
+    return app
+
+
+def zipf_weights(count, skew):
+    """Cumulative weights of ranks 1..count under a Zipf distribution."""
+    return list(accumulate(1 / rank ** skew for rank in range(1, count + 1)))
+
+
+def _cities():
+    with open(os.path.join(ROOT, 'data', 'city_centroids.csv'), encoding='utf-8') as stream:
+        return [(row['city'], row['state']) for row in csv.DictReader(stream) if row['city']]
+
+
+def _insert(db, table, rows):
+    for start in range(0, len(rows), CHUNK_SIZE):
+        db.session.execute(table.insert(), rows[start:start + CHUNK_SIZE])
+        db.session.commit()
+
+
+def _new_ids(db, model, before):
+    return [row[0] for row in db.session.query(model.id).filter(model.id > before).order_by(model.id)]
+
+
+def generate(venues, artists, shows, seed=1, skew=1.1, report=print):
+    """Add the dataset to the database of the current app context; return row counts."""
+    from app import db, Venue, Artist, Show, Genre, venue_genre, artist_genre, recommender, upcoming_shows
+    from geo import geohash, locate
+
+    rng = random.Random(seed)
+    cities = _cities()
+    genre_ids = [row[0] for row in db.session.query(Genre.id).order_by(Genre.id)]
+    genre_weights = zipf_weights(len(genre_ids), 1.0)
+    counts = {}
+
+    def profile(i, kind):
+        city, state = rng.choice(cities)
+        return {
+            'city': city, 'state': state,
+            'phone': f'{rng.randrange(200, 1000)}{rng.randrange(10 ** 7):07d}',
+            'image_link': f'https://images.example.com/{kind}/{seed}-{i}.jpg',
+            'facebook_link': f'https://www.facebook.com/{kind}{seed}x{i}',
+            'website_Link': f'https://{kind}{seed}x{i}.example.com',
+            'seeking_Description': (f'Looking for {rng.choice(ARTIST_NOUNS).lower()} fans to play with'
+                                    if rng.random() < 0.3 else None)
+        }
+
+    def link_genres(table, owner_column, owner_ids):
+        links = []
+        for owner_id in owner_ids:
+            for genre_id in set(rng.choices(genre_ids, cum_weights=genre_weights, k=rng.randint(1, 3))):
+                links.append({'genre_id': genre_id, owner_column: owner_id})
+        _insert(db, table, links)
+        return len(links)
+
+    started = time.perf_counter()
+    last_venue = db.session.query(db.func.max(Venue.id)).scalar() or 0
+    rows = []
+    for i in range(venues):
+        row = profile(i, 'venue')
+        position = locate(row['city'], row['state'])
+        row.update(name=f'The {rng.choice(ADJECTIVES)} {rng.choice(VENUE_NOUNS)} {i}',
+                   address=f'{rng.randrange(1, 9999)} {rng.choice(LAST_NAMES)} St',
+                   talent=rng.random() < 0.3, latitude=position[0], longitude=position[1],
+                   geohash=geohash(*position))
+        rows.append(row)
+    _insert(db, Venue.__table__, rows)
+    venue_ids = _new_ids(db, Venue, last_venue)
+    counts['venue_genre'] = link_genres(venue_genre, 'venue_id', venue_ids)
+    report(f'venues: {len(venue_ids)} in {time.perf_counter() - started:.1f}s')
+
+    started = time.perf_counter()
+    last_artist = db.session.query(db.func.max(Artist.id)).scalar() or 0
+    rows = []
+    for i in range(artists):
+        row = profile(i, 'artist')
+        name = (f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}' if rng.random() < 0.5
+                else f'The {rng.choice(ADJECTIVES)} {rng.choice(ARTIST_NOUNS)}')
+        row.update(name=f'{name} {i}', seeking_venue=rng.random() < 0.3)
+        rows.append(row)
+    _insert(db, Artist.__table__, rows)
+    artist_ids = _new_ids(db, Artist, last_artist)
+    counts['artist_genre'] = link_genres(artist_genre, 'artist_id', artist_ids)
+    report(f'artists: {len(artist_ids)} in {time.perf_counter() - started:.1f}s')
+
+    # popularity rank -> id, shuffled so the busiest rows are not simply the first ids
+    rng.shuffle(venue_ids)
+    rng.shuffle(artist_ids)
+    venue_weights = zipf_weights(len(venue_ids), skew)
+    artist_weights = zipf_weights(len(artist_ids), skew)
+
+    # two evening slots a day (18:00 and 21:00, up to an hour late), so shows
+    # in different slots always start at least the two hour show length apart
+    first_day = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=5 * 365)
+    slots = 2 * 6 * 365
+    booked = set()
+    started = time.perf_counter()
+    rows = []
+    for _ in range(shows):
+        for attempt in range(BOOKING_ATTEMPTS + 1):
+            if attempt < BOOKING_ATTEMPTS:
+                venue_id = rng.choices(venue_ids, cum_weights=venue_weights)[0]
+                artist_id = rng.choices(artist_ids, cum_weights=artist_weights)[0]
+            else:
+                venue_id, artist_id = rng.choice(venue_ids), rng.choice(artist_ids)
+            slot = rng.randrange(slots)
+            if ('venue', venue_id, slot) not in booked and ('artist', artist_id, slot) not in booked:
+                break
+        else:
+            continue
+        booked.update((('venue', venue_id, slot), ('artist', artist_id, slot)))
+        rows.append({'venue_id': venue_id, 'artist_id': artist_id, 'start_date': first_day + timedelta(
+            days=slot // 2, hours=18 + 3 * (slot % 2), minutes=rng.randrange(60))})
+        if len(rows) == CHUNK_SIZE:
+            _insert(db, Show.__table__, rows)
+            counts['Show'] = counts.get('Show', 0) + len(rows)
+            rows = []
+    _insert(db, Show.__table__, rows)
+    counts['Show'] = counts.get('Show', 0) + len(rows)
+    upcoming_shows.rebuild(db.session)
+    db.session.commit()
+    report(f'shows: {counts["Show"]} in {time.perf_counter() - started:.1f}s')
+
+    started = time.perf_counter()
+    recommender.rebuild(db.session)
+    db.session.commit()
+    report(f'recommendations in {time.perf_counter() - started:.1f}s')
+
+    counts.update(Venue=len(venue_ids), Artist=len(artist_ids))
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--venues', type=int, default=2000)
+    parser.add_argument('--artists', type=int, default=2000)
+    parser.add_argument('--shows', type=int, default=50000)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--skew', type=float, default=1.1, help='Zipf exponent of show popularity')
+    parser.add_argument('--database-url')
+    args = parser.parse_args()
+
+    database_url = args.database_url or 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'fyyur_seed.db')
+    # config.py reads the database from the environment when it is imported
+    os.environ['DATABASE_URL'] = database_url
+    from flask_migrate import upgrade
+
+    app = benchmark_app()
+    with app.app_context():
+        upgrade(directory=os.path.join(ROOT, 'migrations'))
+        counts = generate(args.venues, args.artists, args.shows, args.seed, args.skew,
+                          report=lambda line: print(line, file=sys.stderr))
+    print(json.dumps({'database_url': database_url, 'seed': args.seed, 'rows': counts}))
+
+
+if __name__ == '__main__':
+    main()
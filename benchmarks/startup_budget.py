@@ -0,0 +1,131 @@
+"""Check that building the app stays within a startup budget.
+
+Imports app.py and calls create_app() in fresh interpreters under
+``python -X importtime``, the way each gunicorn or uvicorn worker boots, and
+times a bare ``import flask, flask_sqlalchemy`` in interpreters started
+alternately with them. Fails when the fastest boot takes more than
+--budget-ms longer than the fastest bare import, so a slow or busy machine
+slows both alike, or when any module app.py only imports on first use
+(wtforms, babel, alembic, ...) was loaded. Prints the imports that cost the
+most:
+
+    python benchmarks/startup_budget.py
+    python benchmarks/startup_budget.py --budget-ms 100 --runs 10 --top 20
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# what app.py may add to the frameworks every worker imports anyway
+DEFAULT_BUDGET_MS = 200
+# imported by app.py only where they are first used; a worker that has just
+# built the app must not have loaded any of them
+LAZY_MODULES = ('alembic', 'flask_migrate', 'flask_wtf', 'wtforms', 'forms', 'babel', 'dateutil',
+                'numpy', 'scipy', 'PIL')
+
+BOOT = f'''
+import json, sys, time
+start = time.perf_counter()
+from app import create_app
+create_app()
+elapsed = time.perf_counter() - start
+print(json.dumps({{'ms': elapsed * 1000,
+                  'loaded': sorted(name for name in {LAZY_MODULES!r} if name in sys.modules)}}))
+'''
+
+BASELINE = '''
+import json, time
+start = time.perf_counter()
+import flask, flask_sqlalchemy
+print(json.dumps({'ms': (time.perf_counter() - start) * 1000}))
+'''
+
+
+def parse_importtime(output):
+    """[(depth, module, self us, cumulative us)] from -X importtime output."""
+    imports = []
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        module = name.strip()
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        imports.append((depth, module, int(self_us), int(cumulative_us)))
+    return imports
+
+
+def boot(env):
+    process = subprocess.run([sys.executable, '-X', 'importtime', '-c', BOOT], cwd=ROOT, env=env,
+                             capture_output=True, text=True)
+    if process.returncode != 0:
+        sys.exit(f'building the app failed:\n{process.stderr[-2000:]}')
+    return json.loads(process.stdout.strip().splitlines()[-1]), parse_importtime(process.stderr)
+
+
+def baseline(env):
+    process = subprocess.run([sys.executable, '-c', BASELINE], cwd=ROOT, env=env,
+                             capture_output=True, text=True, check=True)
+    return json.loads(process.stdout.strip().splitlines()[-1])['ms']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--budget-ms', type=float, default=DEFAULT_BUDGET_MS,
+                        help='how much longer than the bare framework import the fastest '
+                             'import app + create_app() may take')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=10, help='heaviest imports to list')
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env.setdefault('FYYUR_ENV', 'production')
+    env.setdefault('SECRET_KEY', 'startup-budget')
+    # create_app builds the engine, so the database driver has to be importable;
+    # nothing connects to the database while booting
+    env.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'startup_budget.db'))
+    env.setdefault('PAGE_CACHE_TYPE', 'memory')
+
+    # the first boot writes the bytecode caches a deployed worker would find
+    boot(env)
+    boots, baselines = [], []
+    for _ in range(args.runs):
+        boots.append(boot(env))
+        baselines.append(baseline(env))
+    result, imports = min(boots, key=lambda run: run[0]['ms'])
+    framework_ms = min(baselines)
+    overhead_ms = result['ms'] - framework_ms
+
+    # -X importtime lists a module after everything it imported
+    app_index = next(i for i, entry in enumerate(imports) if entry[:2] == (0, 'app'))
+    first = app_index
+    while first > 0 and imports[first - 1][0] > 0:
+        first -= 1
+    app_import = imports[app_index][3]
+    print(f'import app + create_app(): {result["ms"]:.0f} ms fastest of {args.runs} '
+          f'(import app {app_import / 1000:.0f} ms)')
+    print(f'import flask, flask_sqlalchemy: {framework_ms:.0f} ms fastest of {args.runs}')
+    print(f'app.py adds {overhead_ms:.0f} ms, budget {args.budget_ms:.0f} ms')
+    print(f'{"module":<40} {"self ms":>8} {"cumulative ms":>14}')
+    # the direct imports of app.py, heaviest first
+    top = sorted((entry for entry in imports[first:app_index] if entry[0] == 1), key=lambda entry: -entry[3])
+    for _, module, self_us, cumulative_us in top[:args.top]:
+        print(f'{module:<40} {self_us / 1000:>8.1f} {cumulative_us / 1000:>14.1f}')
+
+    failed = False
+    if result['loaded']:
+        print('loaded at startup instead of on first use: ' + ', '.join(result['loaded']))
+        failed = True
+    if overhead_ms > args.budget_ms:
+        print(f'over budget by {overhead_ms - args.budget_ms:.0f} ms')
+        failed = True
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
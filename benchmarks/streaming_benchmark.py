@@ -0,0 +1,114 @@
+"""Time to first byte and peak RSS of the listing pages, streamed or not.
+
+Seeds a fresh database through the migrations with --rows venues and
+artists, then requests each listing once per mode, each in its own process
+so that peak RSS is that request's alone:
+
+    python benchmarks/streaming_benchmark.py --rows 100000
+    python benchmarks/streaming_benchmark.py --database-url postgresql://.../fyyur_stream --no-seed
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+CHUNK_SIZE = 10000
+PAGES = ['/artists', '/venues']
+
+
+def seed(database_url, rows):
+    os.environ['DATABASE_URL'] = database_url
+    from flask_migrate import upgrade
+    from app import db, Venue, Artist
+    from seed_data import benchmark_app
+
+    app = benchmark_app()
+
+    rng = random.Random(7)
+    states = ['CA', 'NY', 'TX', 'WA', 'IL', 'TN', 'CO', 'MA']
+    with app.app_context():
+        upgrade(directory=os.path.join(ROOT, 'migrations'))
+        for start in range(0, rows, CHUNK_SIZE):
+            numbers = range(start, min(start + CHUNK_SIZE, rows))
+            db.session.execute(Venue.__table__.insert(), [{
+                'name': f'Venue {i}', 'city': f'City {rng.randrange(2000)}',
+                'state': rng.choice(states), 'address': f'{i} Main St'} for i in numbers])
+            db.session.execute(Artist.__table__.insert(), [{
+                'name': f'Artist {i}', 'city': f'City {rng.randrange(2000)}',
+                'state': rng.choice(states)} for i in numbers])
+            db.session.commit()
+
+
+def max_rss_mb():
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == 'darwin' else rss / 1024
+
+
+def measure(page):
+    """Request ``page`` in this process and print its timings as JSON."""
+    from seed_data import benchmark_app
+
+    app = benchmark_app()
+
+    for template in ('pages/artists.html', 'pages/venues.html', 'layouts/main.html'):
+        app.jinja_env.get_template(template)
+    client = app.test_client()
+    client.get('/')
+
+    rss_before = max_rss_mb()
+    start = time.perf_counter()
+    response = client.get(page, buffered=False)
+    chunks = iter(response.response)
+    size = len(next(chunks))
+    first_byte = time.perf_counter() - start
+    for chunk in chunks:
+        size += len(chunk)
+    response.close()
+    total = time.perf_counter() - start
+    print(json.dumps({'status': response.status_code, 'ttfb': first_byte, 'total': total,
+                      'bytes': size, 'rss_growth': max_rss_mb() - rss_before}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--database-url')
+    parser.add_argument('--no-seed', action='store_true', help='use --database-url as it is')
+    parser.add_argument('--measure', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        measure(args.measure)
+        return
+
+    database_url = args.database_url or 'sqlite:///' + os.path.join(
+        tempfile.mkdtemp(), 'streaming_benchmark.db')
+    if not args.no_seed:
+        print(f'seeding {args.rows} venues and artists into {database_url}')
+        seed(database_url, args.rows)
+
+    print(f'{"page":<9} {"mode":<9} {"ttfb ms":>9} {"total ms":>9} {"MB sent":>8} {"peak RSS +MB":>12}')
+    for page in PAGES:
+        for stream in ('0', '1'):
+            env = dict(os.environ, DATABASE_URL=database_url, STREAM_LISTINGS=stream,
+                       PAGE_CACHE_TYPE='null', UPCOMING_REFRESH_INTERVAL='0')
+            output = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), '--measure', page],
+                env=env, check=True, capture_output=True, text=True).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            mode = 'streamed' if stream == '1' else 'buffered'
+            print(f'{page:<9} {mode:<9} {result["ttfb"] * 1000:>9.1f} {result["total"] * 1000:>9.1f} '
+                  f'{result["bytes"] / 1e6:>8.1f} {result["rss_growth"]:>12.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,173 @@
+"""Show booking checks: the venue and artist exist and neither is double-booked.
+
+Every show occupies its venue and its artist for SHOW_DURATION from its
+start, so two shows conflict when they share a venue or an artist and start
+less than SHOW_DURATION apart. A single booking is checked with indexed range
+probes on (venue_id, start_date) and (artist_id, start_date); a whole
+schedule is checked with a sorted sweep, which only has to compare each show
+with the one before it on the same venue or artist. On Postgres the
+booking exclusion constraints enforce the same rule against concurrent
+inserts.
+"""
+from collections import deque, namedtuple
+from datetime import datetime, timedelta
+from itertools import groupby
+
+# also the range length of the Postgres exclusion constraints
+SHOW_DURATION = timedelta(hours=2)
+# ids per IN (...) list when loading the stored shows of a schedule
+IN_CHUNK_SIZE = 500
+
+# show_id is None for a booking that is not in the database yet; number is
+# the booking's record number in an imported schedule
+Booking = namedtuple('Booking', ['show_id', 'venue_id', 'artist_id', 'start_date', 'number'])
+Booking.__new__.__defaults__ = (None,)
+
+# kind is 'venue' or 'artist'; first starts no later than second
+Conflict = namedtuple('Conflict', ['kind', 'first', 'second'])
+
+
+def sweep(bookings, kind, duration=SHOW_DURATION):
+    """Yield the Conflicts among ``bookings``, which must be sorted by
+    (venue_id or artist_id, start_date) for ``kind`` 'venue' or 'artist'.
+
+    Works on any iterator, so a sorted query streams through in constant memory."""
+    owner = f'{kind}_id'
+    for _, owned in groupby(bookings, key=lambda booking: getattr(booking, owner)):
+        previous = None
+        for booking in owned:
+            if previous is not None and booking.start_date - previous.start_date < duration:
+                yield Conflict(kind, previous, booking)
+            # with one fixed duration the latest start always reaches furthest
+            previous = booking
+
+
+class BookingValidator:
+
+    def __init__(self, show, venue, artist, duration=SHOW_DURATION):
+        self.show = show
+        self.venue = venue
+        self.artist = artist
+        self.duration = duration
+
+    def _overlapping(self, session, owner_column, owner_id, start_date, exclude_id):
+        show = self.show
+        query = session.query(show.id).filter(
+            owner_column == owner_id,
+            show.start_date > start_date - self.duration,
+            show.start_date < start_date + self.duration)
+        if exclude_id is not None:
+            query = query.filter(show.id != exclude_id)
+        return query.limit(1)
+
+    def validate(self, session, venue_id, artist_id, start_date, exclude_id=None):
+        """Return a list of error messages for booking the show, empty if it is fine.
+
+        One round trip: the four checks are scalar subqueries of one SELECT."""
+        show = self.show
+        venue_exists, artist_exists, venue_clash, artist_clash = session.query(
+            session.query(self.venue.id).filter(self.venue.id == venue_id).label('venue'),
+            session.query(self.artist.id).filter(self.artist.id == artist_id).label('artist'),
+            self._overlapping(session, show.venue_id, venue_id, start_date, exclude_id).label('venue_clash'),
+            self._overlapping(session, show.artist_id, artist_id, start_date, exclude_id).label('artist_clash')
+        ).one()
+        errors = []
+        if venue_exists is None:
+            errors.append(f'venue {venue_id} does not exist')
+        if artist_exists is None:
+            errors.append(f'artist {artist_id} does not exist')
+        if venue_clash is not None:
+            errors.append(f'venue {venue_id} already has show {venue_clash} within '
+                          f'{self.duration} of that time')
+        if artist_clash is not None:
+            errors.append(f'artist {artist_id} is already booked for show {artist_clash} within '
+                          f'{self.duration} of that time')
+        return errors
+
+    def _stored(self, session, kind, owner_ids, earliest, latest, batch_size=10000):
+        show = self.show
+        owner_column = getattr(show, f'{kind}_id')
+        return (Booking(*row) for row in session.query(
+            show.id, show.venue_id, show.artist_id, show.start_date
+        ).filter(
+            owner_column.in_(owner_ids),
+            show.start_date > earliest - self.duration,
+            show.start_date < latest + self.duration
+        ).order_by(owner_column, show.start_date).yield_per(batch_size))
+
+    def check_schedule(self, session, bookings):
+        """Check new ``bookings`` (a list) against each other and the stored
+        shows in one sorted sweep per venue and per artist.
+
+        Returns {record number: [error messages]} for the rejected bookings.
+        Stored shows always win; of two new bookings that conflict, the one
+        starting later is rejected, and a rejected booking blocks nothing."""
+        errors = {}
+        if not bookings:
+            return errors
+
+        def reject(booking, message):
+            errors.setdefault(booking.number, []).append(message)
+
+        def describe(booking):
+            return f'show {booking.show_id}' if booking.show_id is not None else f'record {booking.number}'
+
+        earliest = min(booking.start_date for booking in bookings)
+        latest = max(booking.start_date for booking in bookings)
+        for kind, model in (('venue', self.venue), ('artist', self.artist)):
+            owner = f'{kind}_id'
+            owner_ids = sorted({getattr(booking, owner) for booking in bookings})
+            known = set()
+            stored = []
+            for start in range(0, len(owner_ids), IN_CHUNK_SIZE):
+                chunk = owner_ids[start:start + IN_CHUNK_SIZE]
+                known.update(row[0] for row in session.query(model.id).filter(model.id.in_(chunk)))
+                stored.extend(self._stored(session, kind, chunk, earliest, latest))
+            for booking in bookings:
+                if getattr(booking, owner) not in known:
+                    reject(booking, f'{kind} {getattr(booking, owner)} does not exist')
+
+            pending = [booking for booking in bookings if booking.number not in errors]
+            # stored shows sort first on ties, so they claim the slot
+            merged = sorted(pending + stored, key=lambda booking: (
+                getattr(booking, owner), booking.start_date, booking.show_id is None))
+            for _, owned in groupby(merged, key=lambda booking: getattr(booking, owner)):
+                # the kept bookings that the current one could still overlap
+                window = deque()
+                for booking in owned:
+                    while window and booking.start_date - window[0].start_date >= self.duration:
+                        window.popleft()
+                    if booking.show_id is None:
+                        if window:
+                            reject(booking, f'{kind} {getattr(booking, owner)} is already booked by '
+                                            f'{describe(window[-1])} within {self.duration} of that time')
+                            continue
+                    else:
+                        for other in [kept for kept in window if kept.show_id is None]:
+                            reject(other, f'{kind} {getattr(other, owner)} is already booked by '
+                                          f'{describe(booking)} within {self.duration} of that time')
+                        window = deque(kept for kept in window if kept.show_id is not None)
+                    window.append(booking)
+        return errors
+
+    def stored_conflicts(self, session, batch_size=10000):
+        """Yield every Conflict among the stored shows, streaming each index in order."""
+        show = self.show
+        for kind in ('venue', 'artist'):
+            owner_column = getattr(show, f'{kind}_id')
+            rows = session.query(show.id, show.venue_id, show.artist_id, show.start_date).order_by(
+                owner_column, show.start_date).execution_options(stream_results=True).yield_per(batch_size)
+            yield from sweep((Booking(*row) for row in rows), kind, self.duration)
+
+
+def schedule_from_records(records):
+    """Bookings for imported show records (form field names); records whose
+    ids or start time do not parse are left for form validation to reject."""
+    bookings = []
+    for number, record in enumerate(records, 1):
+        try:
+            bookings.append(Booking(None, int(record['venue_id']), int(record['artist_id']),
+                                    datetime.fromisoformat(str(record['start_time']).strip()), number))
+        except (KeyError, TypeError, ValueError):
+            continue
+    return bookings
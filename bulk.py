@@ -0,0 +1,245 @@
+"""Streaming bulk import/export behind ``flask fyyur import`` / ``flask fyyur export``.
+
+Records are CSV rows or JSON Lines objects whose fields are named like the
+form fields (plus ``id``, and ``genres`` as a list of genre names, ``;``
+separated in CSV). Imports are validated by the same WTForms classes as the
+HTML forms and written one chunk per transaction; exports are read through a
+server-side cursor so memory stays flat however large the table is.
+"""
+import csv
+import json
+import time
+from collections import namedtuple
+from datetime import datetime
+from itertools import islice
+
+import sqlalchemy as sa
+from werkzeug.datastructures import MultiDict
+
+IMPORT_CHUNK_SIZE = 1000
+EXPORT_BATCH_SIZE = 1000
+DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# fields: (record/form field name, model attribute name) pairs; genre_column is
+# the model's foreign key in its *_genre table, or None if it has no genres
+BulkSpec = namedtuple('BulkSpec', ['model', 'form_class', 'fields', 'genre_column'])
+
+
+class Throughput:
+
+    def __init__(self):
+        self.rows = 0
+        self.started = time.perf_counter()
+
+    def add(self, rows):
+        self.rows += rows
+
+    def __str__(self):
+        elapsed = time.perf_counter() - self.started
+        rate = self.rows / elapsed if elapsed else 0.0
+        return f'{self.rows} rows in {elapsed:.1f}s ({rate:.0f} rows/s)'
+
+
+def guess_format(filename):
+    return 'csv' if filename.lower().endswith('.csv') else 'jsonl'
+
+
+def read_records(stream, fmt):
+    if fmt == 'csv':
+        yield from csv.DictReader(stream)
+    else:
+        for line in stream:
+            if line.strip():
+                yield json.loads(line)
+
+
+def write_records(stream, fmt, fieldnames, records):
+    if fmt == 'csv':
+        writer = csv.DictWriter(stream, fieldnames)
+        writer.writeheader()
+        for record in records:
+            if 'genres' in record:
+                record['genres'] = ';'.join(record['genres'])
+            writer.writerow(record)
+    else:
+        for record in records:
+            stream.write(json.dumps(record, separators=(',', ':')) + '\n')
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _form_value(column, value):
+    # render a CSV/JSON value the way a browser would have posted it
+    if isinstance(column.type, sa.Boolean):
+        if isinstance(value, str):
+            value = value.strip().lower() not in ('', '0', 'false', 'no', 'n')
+        return 'y' if value else 'false'
+    if isinstance(column.type, sa.DateTime) and isinstance(value, str):
+        try:
+            return datetime.fromisoformat(value.strip()).strftime(DATETIME_FORMAT)
+        except ValueError:
+            return value
+    return str(value)
+
+
+def validate_record(spec, record, genre_registry):
+    """Return (column values, genre ids, None) or (None, None, errors)."""
+    columns = spec.model.__table__.c
+    formdata = MultiDict()
+    for field, attr in spec.fields:
+        if record.get(field) not in (None, ''):
+            formdata.add(field, _form_value(columns[attr], record[field]))
+
+    genre_ids = []
+    if spec.genre_column is not None:
+        names = record.get('genres') or []
+        if isinstance(names, str):
+            names = [name for name in names.split(';') if name.strip()]
+        genre_ids = genre_registry.ids_for_names(names)
+        unknown = [name for name, genre_id in zip(names, genre_ids) if genre_id is None]
+        if unknown:
+            return None, None, {'genres': [f'unknown genre {name!r}' for name in unknown]}
+        for genre_id in genre_ids:
+            formdata.add('genres', str(genre_id))
+
+    # a field the record leaves out is missing, not the form's default (a
+    # show's start_time defaults to now)
+    missing = {field: None for field, _ in spec.fields if field not in formdata}
+    form = spec.form_class(formdata=formdata, data=missing, meta={'csrf': False})
+    if spec.genre_column is not None:
+        form.genres.choices = genre_registry.choices()
+    if not form.validate():
+        return None, None, form.errors
+
+    values = {}
+    errors = {}
+    for field, attr in spec.fields:
+        value = form[field].data
+        if isinstance(columns[attr].type, sa.Integer) and value is not None:
+            try:
+                value = int(value)
+            except ValueError:
+                errors[field] = ['must be an integer']
+        values[attr] = value
+    if record.get('id') not in (None, ''):
+        try:
+            values['id'] = int(record['id'])
+        except (TypeError, ValueError):
+            errors['id'] = ['must be an integer']
+    if errors:
+        return None, None, errors
+    return values, sorted(set(genre_ids)), None
+
+
+def _write_chunk(session, spec, valid):
+    if spec.genre_column is None:
+        session.execute(spec.model.__table__.insert(), [values for values, _ in valid])
+        return
+    # the genre link rows need the new ids, so let the ORM batch the inserts
+    entities = [spec.model(**values) for values, _ in valid]
+    session.add_all(entities)
+    session.flush()
+    links = [{'genre_id': genre_id, spec.genre_column.name: entity.id}
+             for entity, (_, genre_ids) in zip(entities, valid) for genre_id in genre_ids]
+    if links:
+        session.execute(spec.genre_column.table.insert(), links)
+
+
+def reset_id_sequence(session, model):
+    # rows imported with explicit ids leave Postgres' serial sequence behind
+    if session.get_bind().dialect.name == 'postgresql':
+        table = model.__tablename__
+        session.execute(sa.text(
+            f"SELECT setval(pg_get_serial_sequence('\"{table}\"', 'id'), "
+            f'(SELECT coalesce(max(id), 1) FROM "{table}"))'))
+        session.commit()
+
+
+def import_records(session, spec, records, genre_registry,
+                   chunk_size=IMPORT_CHUNK_SIZE, report=print, prechecked=None):
+    """Validate and insert ``records``, committing every ``chunk_size`` rows.
+
+    Invalid records are skipped, as are records whose id is already taken
+    and those ``prechecked`` maps (by record number) to errors found
+    beforehand; returns the Throughput and a list of
+    (record number, errors) for every rejected record."""
+    progress = Throughput()
+    rejected = []
+    prechecked = prechecked or {}
+    # the explicit ids imported so far; the table's ids are checked per chunk
+    seen_ids = set()
+    for chunk in _chunks(enumerate(records, 1), chunk_size):
+        valid = []
+        for number, record in chunk:
+            if number in prechecked:
+                rejected.append((number, prechecked[number]))
+                continue
+            values, genre_ids, errors = validate_record(spec, record, genre_registry)
+            if errors:
+                rejected.append((number, errors))
+            else:
+                valid.append((number, values, genre_ids))
+        # an id taken by a stored row or an earlier record would fail the
+        # whole chunk's insert
+        explicit = [values['id'] for _, values, _ in valid if 'id' in values]
+        taken = {row[0] for row in session.query(spec.model.id).filter(spec.model.id.in_(explicit))} \
+            if explicit else set()
+        kept = []
+        for number, values, genre_ids in valid:
+            if 'id' in values:
+                if values['id'] in taken or values['id'] in seen_ids:
+                    rejected.append((number, {'id': [f'duplicate id {values["id"]}']}))
+                    continue
+                seen_ids.add(values['id'])
+            kept.append((values, genre_ids))
+        valid = kept
+        if valid:
+            _write_chunk(session, spec, valid)
+            session.commit()
+            # drop the flushed instances so memory does not grow with the file
+            session.expunge_all()
+        progress.add(len(valid))
+        report(progress)
+    reset_id_sequence(session, spec.model)
+    return progress, sorted(rejected, key=lambda item: item[0])
+
+
+def export_records(session, spec, genre_registry, batch_size=EXPORT_BATCH_SIZE):
+    """Yield every row of ``spec.model`` as a record, in id order."""
+    model = spec.model
+    columns = [getattr(model, attr) for _, attr in spec.fields]
+    rows = session.query(model.id, *columns).order_by(model.id).execution_options(
+        stream_results=True).yield_per(batch_size)
+
+    links = iter(())
+    if spec.genre_column is not None:
+        # merge-join a second ordered stream of (owner id, genre id)
+        links = iter(session.query(spec.genre_column, spec.genre_column.table.c.genre_id).order_by(
+            spec.genre_column).execution_options(stream_results=True).yield_per(batch_size))
+    link = next(links, None)
+
+    for row in rows:
+        record = {'id': row[0]}
+        for (field, _), value in zip(spec.fields, row[1:]):
+            record[field] = value.strftime(DATETIME_FORMAT) if isinstance(value, datetime) else value
+        if spec.genre_column is not None:
+            genre_ids = []
+            while link is not None and link[0] < row[0]:
+                link = next(links, None)
+            while link is not None and link[0] == row[0]:
+                genre_ids.append(link[1])
+                link = next(links, None)
+            record['genres'] = genre_registry.names_for_ids(genre_ids)
+        yield record
+
+
+def export_fieldnames(spec):
+    names = ['id'] + [field for field, _ in spec.fields]
+    return names + ['genres'] if spec.genre_column is not None else names
@@ -0,0 +1,53 @@
+"""Set-based deletes of venues and artists together with everything that refers to them.
+
+Deleting a venue or an artist also deletes its shows, their rows in the
+upcoming_show store and its genre links, in that order so no foreign key is
+ever left dangling. Everything happens in the caller's transaction with one
+DELETE ... WHERE ... IN (...) per table and chunk of ids, rather than a
+statement per row, so a failure part way leaves nothing deleted.
+"""
+from collections import namedtuple
+
+# ids per IN (...) list
+IN_CHUNK_SIZE = 500
+
+# model: Venue or Artist, show_column: its foreign key in Show,
+# counterpart_column: the other side's foreign key in Show, genre_column: its
+# foreign key in the *_genre table, store_column: its id in upcoming_show
+DeleteTarget = namedtuple(
+    'DeleteTarget', ['model', 'show_column', 'counterpart_column', 'genre_column', 'store_column'])
+
+
+class CascadeDelete:
+
+    def __init__(self, show, store, targets):
+        self.show = show
+        self.store = store
+        # {'venue': DeleteTarget, 'artist': DeleteTarget}
+        self.targets = targets
+
+    def delete(self, session, kind, ids):
+        """Delete the ``kind`` rows with ``ids`` and their dependents; the caller commits.
+
+        Returns ``(counts, counterpart_ids)``: the rows deleted per table, and
+        the ids on the other side of the deleted shows (the artists of a
+        deleted venue's shows, say), whose pages list those shows."""
+        target = self.targets[kind]
+        show = self.show
+        ids = sorted(set(ids))
+        counts = dict.fromkeys(
+            [self.store.__tablename__, show.__tablename__, target.genre_column.table.name,
+             target.model.__tablename__], 0)
+        counterpart_ids = set()
+        for start in range(0, len(ids), IN_CHUNK_SIZE):
+            chunk = ids[start:start + IN_CHUNK_SIZE]
+            counterpart_ids.update(row[0] for row in session.query(target.counterpart_column).filter(
+                target.show_column.in_(chunk)).distinct())
+            for table, query in (
+                    (self.store.__tablename__, session.query(self.store).filter(target.store_column.in_(chunk))),
+                    (show.__tablename__, session.query(show).filter(target.show_column.in_(chunk))),
+                    (target.genre_column.table.name,
+                     session.query(target.genre_column.table).filter(target.genre_column.in_(chunk))),
+                    (target.model.__tablename__, session.query(target.model).filter(target.model.id.in_(chunk)))):
+                counts[table] += query.delete(synchronize_session=False)
+        return counts, sorted(counterpart_ids)
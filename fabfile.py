@@ -1,15 +1,30 @@
 from fabric.api import local, settings, abort
 from fabric.contrib.console import confirm
 
+# the unit tests under tests/
+UNIT_TESTS = "python -m pytest -q tests"
+# every route once against a small seeded SQLite database; fails on a 5xx
+SMOKE_TEST = ("python benchmarks/route_benchmark.py --venues 50 --artists 50 --shows 500 "
+              "--requests 2 --warmup 0 --concurrency 1")
+# the listing and detail pages again after seeding ten times as much; fails
+# when one issues more queries on the larger dataset
+QUERY_COUNTS = "python benchmarks/query_count_check.py"
+# EXPLAIN of every query the read-only pages issue on a seeded database;
+# fails on a sequential scan of a table the page should reach by index
+EXPLAIN_CHECK = "python benchmarks/explain_check.py --venues 2000 --artists 2000 --shows 50000"
+# import app + create_app() under -X importtime; fails when it takes more than the
+# budget longer than importing flask and flask_sqlalchemy alone, or when a
+# module app.py imports on first use was loaded at startup
+STARTUP_BUDGET = "python benchmarks/startup_budget.py"
+
 # prepare for deployment
 
 
 def test():
     with settings(warn_only=True):
-        result = local(
-            "python test_tasks.py -v && python test_users.py -v", capture=True
-        )
-    if result.failed and not confirm("Tests failed. Continue?"):
+        results = [local(command, capture=True) for command in (
+            UNIT_TESTS, SMOKE_TEST, QUERY_COUNTS, EXPLAIN_CHECK, STARTUP_BUDGET)]
+    if any(result.failed for result in results) and not confirm("Tests failed. Continue?"):
         abort("Aborted at user request.")
 
 
@@ -39,9 +54,8 @@ def heroku():
 
 
 def heroku_test():
-    local(
-        "heroku run python test_tasks.py -v && heroku run python test_users.py -v"
-    )
+    # the smoke test seeds and uses its own temporary database, not the dyno's
+    local("heroku run " + SMOKE_TEST)
 
 
 def deploy():
@@ -1,7 +1,38 @@
 from datetime import datetime
-from flask_wtf import Form
-from wtforms import StringField, SelectField, SelectMultipleField, DateTimeField, BooleanField
-from wtforms.validators import DataRequired, AnyOf, URL, Length, Regexp
+from flask_wtf import FlaskForm, Form
+from wtforms import Field, StringField, SelectField, SelectMultipleField, DateTimeField, BooleanField, FileField
+from wtforms.validators import DataRequired, InputRequired, AnyOf, URL, Length, Regexp, Optional, ValidationError
+from images import InvalidImage, check_image, media_name
+
+
+class ImageLink(URL):
+    """A URL, or the /media/ link of an uploaded image."""
+
+    def __call__(self, form, field):
+        if media_name(field.data) is None:
+            super().__call__(form, field)
+
+
+class IdListField(Field):
+    """Integer ids, from repeated or comma separated values."""
+
+    def _value(self):
+        return ','.join(map(str, self.data or []))
+
+    def process_formdata(self, valuelist):
+        self.data = []
+        try:
+            self.data = sorted({int(value) for item in valuelist for value in str(item).split(',') if value.strip()})
+        except ValueError:
+            raise ValueError('ids must be a list of integers')
+
+
+def image_upload(form, field):
+    if field.data:
+        try:
+            check_image(field.data)
+        except InvalidImage as error:
+            raise ValidationError(str(error))
 
 
 class ShowForm(Form):
@@ -87,33 +118,14 @@ class VenueForm(Form):
     phone = StringField(
         'phone', validators=[Length(min=10, max=10, message=" phone number must be 10 digits"), Regexp('^[0-9]*$', message="phone number must be digits only.")]
     )
+    # an uploaded image replaces image_link
     image_link = StringField(
-        'image_link', validators=[URL(message='Must be a valid URL')]
+        'image_link', validators=[Optional(), ImageLink(message='Must be a valid URL')]
     )
+    image = FileField('image', validators=[image_upload])
     genres = SelectMultipleField(
-        # TODO implement enum restriction
-        'genres', validators=[DataRequired()],
-        choices=[
-            ('1', 'Alternative'),
-            ('2', 'Blues'),
-            ('3', 'Classical'),
-            ('4', 'Country'),
-            ('5', 'Electronic'),
-            ('6', 'Folk'),
-            ('7', 'Funk'),
-            ('8', 'Hip-Hop'),
-            ('9', 'Heavy Metal'),
-            ('10', 'Instrumental'),
-            ('11', 'Jazz'),
-            ('12', 'Musical Theatre'),
-            ('13', 'Pop'),
-            ('14', 'Punk'),
-            ('15', 'R&B'),
-            ('16', 'Reggae'),
-            ('17', 'Rock n Roll'),
-            ('18', 'Soul'),
-            ('19', 'Other'),
-        ]
+        # choices are filled in from the Genre table by app.with_genre_choices
+        'genres', validators=[DataRequired()]
     )
     
     facebook_link = StringField(
@@ -197,32 +209,14 @@ class ArtistForm(Form):
         
         'phone',validators=[Length(min=10, max=10, message=" phone number must be 10 digits"), Regexp('^[0-9]*$', message="phone number must be digits only.")]
     )
+    # an uploaded image replaces image_link
     image_link = StringField(
-        'image_link' ,validators=[URL()]
+        'image_link', validators=[Optional(), ImageLink()]
     )
+    image = FileField('image', validators=[image_upload])
     genres = SelectMultipleField(
-        'genres', validators=[DataRequired()],
-        choices=[
-            ('1', 'Alternative'),
-            ('2', 'Blues'),
-            ('3', 'Classical'),
-            ('4', 'Country'),
-            ('5', 'Electronic'),
-            ('6', 'Folk'),
-            ('7', 'Funk'),
-            ('8', 'Hip-Hop'),
-            ('9', 'Heavy Metal'),
-            ('10', 'Instrumental'),
-            ('11', 'Jazz'),
-            ('12', 'Musical Theatre'),
-            ('13', 'Pop'),
-            ('14', 'Punk'),
-            ('15', 'R&B'),
-            ('16', 'Reggae'),
-            ('17', 'Rock n Roll'),
-            ('18', 'Soul'),
-            ('19', 'Other'),
-        ]
+        # choices are filled in from the Genre table by app.with_genre_choices
+        'genres', validators=[DataRequired()]
     )
     facebook_link = StringField(
         'facebook_link', validators=[URL()]
@@ -237,3 +231,9 @@ class ArtistForm(Form):
     seeking_description = StringField(
         'seeking_description'
     )
+
+
+class DeleteForm(FlaskForm):
+    # the venues or artists to delete, posted as form fields or as a JSON
+    # body {"ids": [...], "csrf_token": "..."}; FlaskForm checks the token
+    ids = IdListField('ids', validators=[InputRequired()])
@@ -0,0 +1,59 @@
+"""Process-wide cache of the Genre table.
+
+The table is small and almost never written, so it is loaded once and shared
+by the venue and artist forms (as their ``genres`` choices) and by the
+submission handlers (to resolve the selected ids without a query). Writes to
+Genre in this process invalidate it; other processes pick changes up once
+their copy is ``max_age`` seconds old.
+"""
+import threading
+import time
+
+GENRE_CACHE_MAX_AGE = 600
+
+
+class GenreRegistry:
+
+    def __init__(self, loader, max_age=GENRE_CACHE_MAX_AGE):
+        # loader returns (id, name) rows in display order
+        self.loader = loader
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._genres = None
+        self._loaded_at = None
+
+    def invalidate(self):
+        with self._lock:
+            self._genres = None
+
+    def _get(self):
+        with self._lock:
+            if self._genres is None or time.monotonic() - self._loaded_at >= self.max_age:
+                self._genres = {genre_id: name for genre_id, name in self.loader()}
+                self._loaded_at = time.monotonic()
+            return self._genres
+
+    def choices(self):
+        return [(str(genre_id), name) for genre_id, name in self._get().items()]
+
+    def resolve(self, values):
+        """Turn submitted genre ids into a de-duplicated list of known int ids."""
+        genres = self._get()
+        ids = []
+        for value in values:
+            try:
+                genre_id = int(value)
+            except (TypeError, ValueError):
+                continue
+            if genre_id in genres and genre_id not in ids:
+                ids.append(genre_id)
+        return ids
+
+    def ids_for_names(self, names):
+        """Map genre names (case-insensitive) to ids; unknown names map to None."""
+        by_name = {name.lower(): genre_id for genre_id, name in self._get().items()}
+        return [by_name.get(name.strip().lower()) for name in names]
+
+    def names_for_ids(self, ids):
+        genres = self._get()
+        return [genres[genre_id] for genre_id in ids if genre_id in genres]
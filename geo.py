@@ -0,0 +1,118 @@
+"""Venue coordinates and the geohash cells that index them.
+
+There is no network geocoder, so a venue is placed at the centroid of its
+city from the bundled data/city_centroids.csv, or of its state when the city
+is not listed. Its position is also stored as a 60 bit geohash integer:
+latitude and longitude bits interleaved, so that the venues of one grid cell
+at any precision form a single contiguous range of that column. A radius
+search covers the circle with the 3x3 block of cells around the centre, at
+the finest precision whose cells are still at least the radius across, and
+reads each cell with one index range scan. ``distance_km_sql`` then filters
+and orders the venues of those cells by exact distance in the database, so
+only the nearest are read back; it needs the SQL math functions PostgreSQL
+and SQLite 3.35+ have.
+"""
+import csv
+import math
+import os
+from functools import lru_cache
+
+import sqlalchemy as sa
+
+CENTROIDS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'city_centroids.csv')
+GEOHASH_BITS = 60
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+
+def _place_key(name):
+    # 'St. Louis ', 'st louis' and 'ST LOUIS' are the same place
+    return ' '.join(name.replace('.', ' ').split()).casefold()
+
+
+@lru_cache(maxsize=None)
+def centroids():
+    """{(state, city key): (latitude, longitude)}, with city key '' for a state's centroid."""
+    with open(CENTROIDS_PATH, encoding='utf-8') as stream:
+        return {(row['state'].upper(), _place_key(row['city'])): (float(row['latitude']), float(row['longitude']))
+                for row in csv.DictReader(stream)}
+
+
+def locate(city, state):
+    """Return (latitude, longitude) for a city, falling back to its state, or None."""
+    state = (state or '').strip().upper()
+    table = centroids()
+    return table.get((state, _place_key(city or ''))) or table.get((state, ''))
+
+
+def _cell(latitude, longitude, lon_bits, lat_bits):
+    x = int((longitude + 180) / 360 * (1 << lon_bits))
+    y = int((latitude + 90) / 180 * (1 << lat_bits))
+    return min(x, (1 << lon_bits) - 1), min(y, (1 << lat_bits) - 1)
+
+
+def _interleave(x, y, bits):
+    # geohash order: the first, most significant bit splits longitude
+    lon_bits, lat_bits = (bits + 1) // 2, bits // 2
+    key = 0
+    for i in range(bits):
+        if i % 2 == 0:
+            bit = x >> (lon_bits - 1 - i // 2) & 1
+        else:
+            bit = y >> (lat_bits - 1 - i // 2) & 1
+        key = key << 1 | bit
+    return key
+
+
+def geohash(latitude, longitude):
+    """The 60 bit geohash of a point, as an integer."""
+    half = GEOHASH_BITS // 2
+    return _interleave(*_cell(latitude, longitude, half, half), GEOHASH_BITS)
+
+
+def distance_km(lat1, lon1, lat2, lon2):
+    """Great-circle (haversine) distance in kilometres."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    a = (math.sin((phi2 - phi1) / 2) ** 2 +
+         math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def distance_km_sql(latitude, longitude, latitude_column, longitude_column):
+    """distance_km from a point to each row's coordinates, as an SQL expression."""
+    phi1, phi2 = math.radians(latitude), sa.func.radians(latitude_column)
+    a = (sa.func.power(sa.func.sin((phi2 - phi1) / 2), 2) + math.cos(phi1) * sa.func.cos(phi2) *
+         sa.func.power(sa.func.sin(sa.func.radians(longitude_column - longitude) / 2), 2))
+    # a only reaches 1, where asin would need clamping against rounding, for
+    # antipodal points, far beyond any radius searched
+    return 2 * EARTH_RADIUS_KM * sa.func.asin(sa.func.sqrt(a))
+
+
+def geohash_ranges(latitude, longitude, radius_km):
+    """Return sorted, merged inclusive (low, high) geohash ranges that cover
+    every point within ``radius_km`` of the given one."""
+    lat_span = radius_km / KM_PER_DEGREE
+    cos_lat = math.cos(math.radians(min(abs(latitude) + lat_span, 90.0)))
+    lon_span = radius_km / (KM_PER_DEGREE * cos_lat) if cos_lat > 1e-9 else 360.0
+
+    bits = GEOHASH_BITS
+    while bits > 0:
+        lon_bits, lat_bits = (bits + 1) // 2, bits // 2
+        if 360 / (1 << lon_bits) >= lon_span and 180 / (1 << lat_bits) >= lat_span:
+            break
+        bits -= 1
+    if bits < 2:
+        return [(0, (1 << GEOHASH_BITS) - 1)]
+
+    x, y = _cell(latitude, longitude, lon_bits, lat_bits)
+    shift = GEOHASH_BITS - bits
+    cells = sorted({_interleave((x + dx) % (1 << lon_bits), y + dy, bits)
+                    for dx in (-1, 0, 1) for dy in (-1, 0, 1) if 0 <= y + dy < 1 << lat_bits})
+    ranges = []
+    for cell in cells:
+        low, high = cell << shift, ((cell + 1) << shift) - 1
+        if ranges and low == ranges[-1][1] + 1:
+            ranges[-1] = (ranges[-1][0], high)
+        else:
+            ranges.append((low, high))
+    return ranges
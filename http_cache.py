@@ -0,0 +1,83 @@
+"""Browser/CDN caching helpers.
+
+``conditional_response`` answers ``If-None-Match`` from a cheap validator
+before any template is rendered, and ``init_static_fingerprints``
+appends a content hash to every ``url_for('static', ...)`` URL so static files
+can be cached for a year and still change on deploy.
+"""
+import hashlib
+import os
+from flask import make_response, request
+from werkzeug.http import is_resource_modified
+
+STATIC_MAX_AGE = 365 * 24 * 60 * 60
+
+_static_fingerprints = {}
+
+
+def file_fingerprint(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    key = (path, stat.st_mtime_ns, stat.st_size)
+    if key not in _static_fingerprints:
+        with open(path, 'rb') as f:
+            _static_fingerprints[key] = hashlib.md5(f.read()).hexdigest()[:12]
+    return _static_fingerprints[key]
+
+
+def templates_fingerprint(app):
+    # part of every page ETag, so a deploy that changes a template also
+    # changes the ETag of pages whose data did not change
+    digest = hashlib.md5()
+    for root, _, files in sorted(os.walk(os.path.join(app.root_path, app.template_folder))):
+        for name in sorted(files):
+            digest.update((file_fingerprint(os.path.join(root, name)) or '').encode())
+    return digest.hexdigest()[:12]
+
+
+def page_etag(validators):
+    return hashlib.md5(repr(validators).encode()).hexdigest()
+
+
+def conditional_response(validators, render, cacheable=True):
+    """Return a 304 if the client already holds the page described by
+    ``validators``, otherwise ``render()`` it and attach its ETag.
+
+    There is deliberately no Last-Modified: the newest ``updated_at`` a page
+    depends on stays put when a row is deleted, so ``If-Modified-Since``
+    would answer 304 for a page that lost a row; the counts in
+    ``validators`` do change. Non-cacheable pages (those showing a one-off
+    flash message) are always rendered."""
+    etag = page_etag(validators)
+
+    if cacheable and not is_resource_modified(request.environ, etag=etag):
+        response = make_response('', 304)
+    else:
+        response = make_response(render())
+    if cacheable:
+        response.set_etag(etag)
+        response.cache_control.no_cache = True
+    else:
+        response.cache_control.no_store = True
+    return response
+
+
+def init_static_fingerprints(app):
+
+    @app.url_defaults
+    def add_static_fingerprint(endpoint, values):
+        if endpoint == 'static' and 'filename' in values:
+            fingerprint = file_fingerprint(os.path.join(app.static_folder, values['filename']))
+            if fingerprint:
+                values['v'] = fingerprint
+
+    @app.after_request
+    def cache_fingerprinted_static(response):
+        # only the URL add_static_fingerprint builds is immutable: any other
+        # ?v= names no particular version of the file
+        if request.endpoint == 'static' and response.status_code == 200 and request.args.get('v') and \
+                request.args['v'] == file_fingerprint(os.path.join(app.static_folder, request.view_args['filename'])):
+            response.headers['Cache-Control'] = f'public, max-age={STATIC_MAX_AGE}, immutable'
+        return response
@@ -0,0 +1,198 @@
+"""Uploaded venue and artist images and their thumbnails.
+
+An uploaded image is stored once under MEDIA_DIR, named by the hash of its
+content (``<hash>.jpg``), and the venue's or artist's image_link becomes its
+``/media/`` path. Every size in THUMBNAIL_SIZES is written next to it in
+WebP and JPEG (``<hash>-tile.webp``, ``<hash>-tile.jpg``, ...) by a pool of
+worker processes, so the request that uploaded the image returns once the
+original is saved. Names never change meaning, so everything under /media/
+can be cached for good.
+
+Pages ask ``thumbnail_sources`` for the size each tile shows, and get None,
+meaning the plain image_link, for remote links and for uploads whose
+thumbnails are not written yet. A detail page's ETag includes whether its
+record's upload is still ``missing`` thumbnails, so browsers holding the page
+rendered with the original image fetch it again once the thumbnails exist.
+Pillow is imported on first use, and by the workers, so it stays out
+of worker startup.
+"""
+import hashlib
+import logging
+import os
+import re
+import tempfile
+import threading
+
+logger = logging.getLogger(__name__)
+
+MEDIA_URL = '/media/'
+# (width, height) boxes thumbnails are scaled down to fit: 'tile' for the
+# show and recommendation tiles (200px high), 'detail' for the picture at the
+# top of a detail page (half the page wide), both with room for 2x screens
+THUMBNAIL_SIZES = {'tile': (400, 400), 'detail': (1200, 1000)}
+# extension, Pillow format, save options
+THUMBNAIL_FORMATS = (
+    ('webp', 'WEBP', {'quality': 80, 'method': 4}),
+    ('jpg', 'JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+)
+# the upload formats accepted, by Pillow format, and the extension they keep
+UPLOAD_FORMATS = {'JPEG': 'jpg', 'PNG': 'png', 'GIF': 'gif', 'WEBP': 'webp'}
+HASH_LENGTH = 32
+MEDIA_LINK = re.compile(r'^/media/([0-9a-f]{%d})\.(%s)$' % (HASH_LENGTH, '|'.join(UPLOAD_FORMATS.values())))
+
+
+class InvalidImage(ValueError):
+    pass
+
+
+def media_name(link):
+    """The content hash of an uploaded image's link, or None for any other link."""
+    match = MEDIA_LINK.match(link or '')
+    return match.group(1) if match else None
+
+
+def thumbnail_names(name, sizes):
+    return [f'{name}-{size}.{extension}' for size in sizes for extension, _, _ in THUMBNAIL_FORMATS]
+
+
+def check_image(upload):
+    """The extension to store ``upload`` (a file storage) under; raises
+    InvalidImage if it is not an image in one of UPLOAD_FORMATS."""
+    from PIL import Image, UnidentifiedImageError
+
+    try:
+        # reads the header only
+        with Image.open(upload.stream) as image:
+            image_format = image.format
+    except (UnidentifiedImageError, OSError):
+        raise InvalidImage('The file is not an image.')
+    except Image.DecompressionBombError:
+        raise InvalidImage('The image is too large.')
+    finally:
+        upload.stream.seek(0)
+    if image_format not in UPLOAD_FORMATS:
+        raise InvalidImage(f'{image_format} images are not supported; upload a JPEG, PNG, GIF or WebP image.')
+    return UPLOAD_FORMATS[image_format]
+
+
+def write_atomically(path, write):
+    # readers check whether a file exists, so it has to appear whole
+    descriptor, temporary = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(descriptor, 'wb') as f:
+            write(f)
+        os.replace(temporary, path)
+    except BaseException:
+        os.unlink(temporary)
+        raise
+
+
+def make_thumbnails(directory, original, name, sizes):
+    """Write the thumbnails of ``original`` for ``sizes``; runs in a worker process."""
+    from PIL import Image, ImageOps
+
+    # largest first, each scaled down from the one before
+    boxes = sorted(sizes.items(), key=lambda item: -item[1][0] * item[1][1])
+    with Image.open(os.path.join(directory, original)) as image:
+        # JPEGs are decoded at the smallest of 1/2, 1/4 or 1/8 scale that is
+        # still larger than the largest thumbnail
+        image.draft(None, boxes[0][1])
+        thumbnail = ImageOps.exif_transpose(image)
+        if thumbnail.mode not in ('RGB', 'RGBA'):
+            thumbnail = thumbnail.convert(
+                'RGBA' if 'transparency' in thumbnail.info or thumbnail.mode == 'LA' else 'RGB')
+        for size, box in boxes:
+            thumbnail = thumbnail.copy()
+            thumbnail.thumbnail(box, Image.LANCZOS)
+            for extension, image_format, options in THUMBNAIL_FORMATS:
+                picture = thumbnail
+                if image_format == 'JPEG' and picture.mode == 'RGBA':
+                    # JPEG has no alpha; flatten onto white
+                    picture = Image.new('RGB', thumbnail.size, (255, 255, 255))
+                    picture.paste(thumbnail, mask=thumbnail.getchannel('A'))
+                write_atomically(os.path.join(directory, f'{name}-{size}.{extension}'),
+                                 lambda f: picture.save(f, image_format, **options))
+    return thumbnail_names(name, sizes)
+
+
+class ImageStore:
+
+    def __init__(self, sizes=THUMBNAIL_SIZES, workers=2):
+        self.sizes = sizes
+        self.workers = workers
+        self.directory = None
+        self._pool = None
+        self._lock = threading.Lock()
+        # (name, size) pairs whose thumbnails are known to exist
+        self._ready = set()
+
+    def init_app(self, app):
+        self.directory = app.config['MEDIA_DIR']
+        self.workers = app.config.get('THUMBNAIL_WORKERS', self.workers)
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _executor(self):
+        with self._lock:
+            if self._pool is None:
+                import multiprocessing
+                from concurrent.futures import ProcessPoolExecutor
+
+                # spawned rather than forked, so that workers inherit neither
+                # the app's database connections nor its threads
+                self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('spawn'))
+            return self._pool
+
+    def save(self, upload):
+        """Store ``upload`` unless the same image already is; return its link."""
+        extension = check_image(upload)
+        data = upload.stream.read()
+        name = hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+        path = os.path.join(self.directory, f'{name}.{extension}')
+        if not os.path.exists(path):
+            write_atomically(path, lambda f: f.write(data))
+        return f'{MEDIA_URL}{name}.{extension}'
+
+    def missing(self, link):
+        """Whether ``link`` is an upload some of whose thumbnails are not written."""
+        name = media_name(link)
+        return name is not None and not all(
+            os.path.exists(os.path.join(self.directory, thumbnail)) for thumbnail in thumbnail_names(name, self.sizes))
+
+    def generate(self, link, on_ready=None):
+        """Have a worker write the thumbnails of the upload at ``link``, then
+        call ``on_ready()`` (in this process, on a pool thread); return the
+        future, or None when there is nothing to write."""
+        if not self.missing(link):
+            return None
+        from concurrent.futures.process import BrokenProcessPool
+
+        task = (make_thumbnails, self.directory, link[len(MEDIA_URL):], media_name(link), self.sizes)
+        try:
+            future = self._executor().submit(*task)
+        except BrokenProcessPool:
+            # a worker died, taking the pool with it; start a new one
+            with self._lock:
+                self._pool = None
+            future = self._executor().submit(*task)
+
+        def done(future):
+            if future.exception() is not None:
+                logger.error('making the thumbnails of %s failed', link, exc_info=future.exception())
+                return
+            if on_ready is not None:
+                on_ready()
+        future.add_done_callback(done)
+        return future
+
+    def thumbnail_sources(self, link, size):
+        """{'webp': url, 'jpg': url} of the ``size`` thumbnails of the upload
+        at ``link``, or None when there are none (yet)."""
+        name = media_name(link)
+        if name is None:
+            return None
+        if (name, size) not in self._ready:
+            if not all(os.path.exists(os.path.join(self.directory, thumbnail))
+                       for thumbnail in thumbnail_names(name, [size])):
+                return None
+            self._ready.add((name, size))
+        return {extension: f'{MEDIA_URL}{name}-{size}.{extension}' for extension, _, _ in THUMBNAIL_FORMATS}
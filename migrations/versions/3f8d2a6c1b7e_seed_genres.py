@@ -0,0 +1,36 @@
+"""seed genres
+
+Revision ID: 3f8d2a6c1b7e
+Revises: 7c1e4b9a2d3f
+Create Date: 2026-10-18 06:02:47.530911
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f8d2a6c1b7e'
+down_revision = '7c1e4b9a2d3f'
+branch_labels = None
+depends_on = None
+
+# the ids and names the venue/artist forms used to hard-code
+GENRES = ['Alternative', 'Blues', 'Classical', 'Country', 'Electronic', 'Folk',
+          'Funk', 'Hip-Hop', 'Heavy Metal', 'Instrumental', 'Jazz', 'Musical Theatre',
+          'Pop', 'Punk', 'R&B', 'Reggae', 'Rock n Roll', 'Soul', 'Other']
+
+genre = sa.table('Genre', sa.column('id', sa.Integer), sa.column('name', sa.String))
+
+
+def upgrade():
+    existing = {row[0] for row in op.get_bind().execute(sa.text('SELECT id FROM "Genre"'))}
+    op.bulk_insert(genre, [{'id': i, 'name': name}
+                           for i, name in enumerate(GENRES, 1) if i not in existing])
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute("""SELECT setval(pg_get_serial_sequence('"Genre"', 'id'),
+                      (SELECT max(id) FROM "Genre"))""")
+
+
+def downgrade():
+    pass
@@ -0,0 +1,62 @@
+"""search indexes
+
+Revision ID: 7c1e4b9a2d3f
+Revises: 520542c3d5a1
+Create Date: 2026-10-18 05:40:12.118204
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '7c1e4b9a2d3f'
+down_revision = '520542c3d5a1'
+branch_labels = None
+depends_on = None
+
+SEARCH_COLUMNS = ('name', 'city', 'state')
+FTS_TABLES = (('Venue', 'venue_fts'), ('Artist', 'artist_fts'))
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        for table in ('Venue', 'Artist'):
+            for column in SEARCH_COLUMNS:
+                op.create_index(f'ix_{table}_{column}_trgm', table, [column],
+                                postgresql_using='gin',
+                                postgresql_ops={column: 'gin_trgm_ops'})
+    elif dialect == 'sqlite':
+        # external-content FTS5 tables kept in sync with their model by triggers
+        for table, fts in FTS_TABLES:
+            op.execute(f"""CREATE VIRTUAL TABLE {fts} USING fts5(
+                name, city, state, content='{table}', content_rowid='id', tokenize='trigram')""")
+            op.execute(f"""CREATE TRIGGER {fts}_ai AFTER INSERT ON "{table}" BEGIN
+                INSERT INTO {fts}(rowid, name, city, state)
+                VALUES (new.id, new.name, new.city, new.state);
+            END""")
+            op.execute(f"""CREATE TRIGGER {fts}_ad AFTER DELETE ON "{table}" BEGIN
+                INSERT INTO {fts}({fts}, rowid, name, city, state)
+                VALUES ('delete', old.id, old.name, old.city, old.state);
+            END""")
+            op.execute(f"""CREATE TRIGGER {fts}_au AFTER UPDATE ON "{table}" BEGIN
+                INSERT INTO {fts}({fts}, rowid, name, city, state)
+                VALUES ('delete', old.id, old.name, old.city, old.state);
+                INSERT INTO {fts}(rowid, name, city, state)
+                VALUES (new.id, new.name, new.city, new.state);
+            END""")
+            op.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        for table in ('Venue', 'Artist'):
+            for column in SEARCH_COLUMNS:
+                op.drop_index(f'ix_{table}_{column}_trgm', table_name=table)
+    elif dialect == 'sqlite':
+        for table, fts in FTS_TABLES:
+            for suffix in ('ai', 'ad', 'au'):
+                op.execute(f'DROP TRIGGER IF EXISTS {fts}_{suffix}')
+            op.execute(f'DROP TABLE IF EXISTS {fts}')
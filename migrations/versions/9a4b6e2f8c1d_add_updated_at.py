@@ -0,0 +1,35 @@
+"""add updated_at
+
+Revision ID: 9a4b6e2f8c1d
+Revises: 3f8d2a6c1b7e
+Create Date: 2026-10-18 06:31:09.204417
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9a4b6e2f8c1d'
+down_revision = '3f8d2a6c1b7e'
+branch_labels = None
+depends_on = None
+
+TABLES = ('Genre', 'Venue', 'Artist', 'Show')
+
+
+def upgrade():
+    # SQLite cannot add a NOT NULL column without a constant default, and
+    # rebuilding Venue/Artist in batch mode would drop their search triggers,
+    # so add with a placeholder default and backfill instead
+    for table in TABLES:
+        op.add_column(table, sa.Column('updated_at', sa.DateTime(), nullable=False,
+                                       server_default='1970-01-01 00:00:00'))
+        op.execute(f'UPDATE "{table}" SET updated_at = CURRENT_TIMESTAMP')
+        if op.get_bind().dialect.name != 'sqlite':
+            op.alter_column(table, 'updated_at', server_default=None)
+
+
+def downgrade():
+    for table in reversed(TABLES):
+        op.execute(f'ALTER TABLE "{table}" DROP COLUMN updated_at')
@@ -0,0 +1,34 @@
+"""replication position
+
+Revision ID: a7c3e9f1d4b8
+Revises: f5b2d8e1a7c3
+Create Date: 2026-10-18 15:06:41.227905
+
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7c3e9f1d4b8'
+down_revision = 'f5b2d8e1a7c3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # the single row replicas.py bumps on every write to the primary and
+    # compares with the replica's copy
+    replication_position = op.create_table('replication_position',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('position', sa.BigInteger(), nullable=False),
+    sa.Column('written_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.bulk_insert(replication_position, [{'id': 1, 'position': 0, 'written_at': datetime.now()}])
+
+
+def downgrade():
+    op.drop_table('replication_position')
@@ -0,0 +1,38 @@
+"""hot path indexes
+
+Revision ID: b2d5f7a9c3e4
+Revises: 9a4b6e2f8c1d
+Create Date: 2026-10-18 07:12:36.871530
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'b2d5f7a9c3e4'
+down_revision = '9a4b6e2f8c1d'
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ('ix_Show_venue_id_start_date', 'Show', ['venue_id', 'start_date'], False),
+    ('ix_Show_artist_id_start_date', 'Show', ['artist_id', 'start_date'], False),
+    ('ix_Show_start_date_id', 'Show', ['start_date', 'id'], False),
+    ('ix_Show_updated_at', 'Show', ['updated_at'], False),
+    ('ix_Venue_state_city', 'Venue', ['state', 'city'], False),
+    ('ix_Venue_updated_at', 'Venue', ['updated_at'], False),
+    ('ix_Artist_updated_at', 'Artist', ['updated_at'], False),
+    ('ix_venue_genre_venue_id', 'venue_genre', ['venue_id'], False),
+    ('ix_artist_genre_artist_id', 'artist_genre', ['artist_id'], False),
+    ('ix_Genre_name', 'Genre', ['name'], True),
+]
+
+
+def upgrade():
+    for name, table, columns, unique in INDEXES:
+        op.create_index(name, table, columns, unique=unique)
+
+
+def downgrade():
+    for name, table, _, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
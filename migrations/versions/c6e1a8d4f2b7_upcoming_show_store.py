@@ -0,0 +1,52 @@
+"""upcoming show store
+
+Revision ID: c6e1a8d4f2b7
+Revises: b2d5f7a9c3e4
+Create Date: 2026-10-18 08:02:44.519306
+
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c6e1a8d4f2b7'
+down_revision = 'b2d5f7a9c3e4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('upcoming_show',
+    sa.Column('show_id', sa.Integer(), nullable=False),
+    sa.Column('venue_id', sa.Integer(), nullable=False),
+    sa.Column('artist_id', sa.Integer(), nullable=False),
+    sa.Column('start_date', sa.DateTime(), nullable=False),
+    sa.Column('venue_name', sa.String(), nullable=False),
+    sa.Column('venue_image_link', sa.String(length=500), nullable=True),
+    sa.Column('artist_name', sa.String(), nullable=False),
+    sa.Column('artist_image_link', sa.String(length=500), nullable=True),
+    sa.ForeignKeyConstraint(['show_id'], ['Show.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('show_id')
+    )
+    op.create_index('ix_upcoming_show_start_date_show_id', 'upcoming_show', ['start_date', 'show_id'])
+    op.create_index('ix_upcoming_show_venue_id_start_date', 'upcoming_show', ['venue_id', 'start_date'])
+    op.create_index('ix_upcoming_show_artist_id_start_date', 'upcoming_show', ['artist_id', 'start_date'])
+
+    # start times are stored as local times, so compare with the local clock
+    # rather than the database's CURRENT_TIMESTAMP
+    op.get_bind().execute(sa.text(
+        'INSERT INTO upcoming_show (show_id, venue_id, artist_id, start_date, venue_name, '
+        'venue_image_link, artist_name, artist_image_link) '
+        'SELECT s.id, s.venue_id, s.artist_id, s.start_date, v.name, v.image_link, a.name, a.image_link '
+        'FROM "Show" s JOIN "Venue" v ON v.id = s.venue_id JOIN "Artist" a ON a.id = s.artist_id '
+        'WHERE s.start_date > :now'), {'now': datetime.now()})
+
+
+def downgrade():
+    op.drop_index('ix_upcoming_show_artist_id_start_date', table_name='upcoming_show')
+    op.drop_index('ix_upcoming_show_venue_id_start_date', table_name='upcoming_show')
+    op.drop_index('ix_upcoming_show_start_date_show_id', table_name='upcoming_show')
+    op.drop_table('upcoming_show')
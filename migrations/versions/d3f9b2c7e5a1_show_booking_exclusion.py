@@ -0,0 +1,51 @@
+"""show booking exclusion constraints
+
+Revision ID: d3f9b2c7e5a1
+Revises: c6e1a8d4f2b7
+Create Date: 2026-10-18 08:41:17.302958
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd3f9b2c7e5a1'
+down_revision = 'c6e1a8d4f2b7'
+branch_labels = None
+depends_on = None
+
+# bookings.SHOW_DURATION; start_date is a naive local time, hence tsrange
+# rather than tstzrange
+SLOT = "interval '2 hours'"
+CONSTRAINTS = (('ex_Show_venue_booking', 'venue_id'), ('ex_Show_artist_booking', 'artist_id'))
+
+
+def upgrade():
+    # SQLite has no exclusion constraints; bookings.BookingValidator is the
+    # only check there
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+
+    bind = op.get_bind()
+    for name, column in CONSTRAINTS:
+        # the sorted sweep of bookings.stored_conflicts, as a window function
+        clashes = bind.execute(sa.text(
+            f'SELECT id FROM (SELECT id, start_date - lag(start_date) OVER ('
+            f'PARTITION BY {column} ORDER BY start_date) AS gap FROM "Show") AS gaps '
+            f'WHERE gap < {SLOT} LIMIT 20')).fetchall()
+        if clashes:
+            raise RuntimeError(
+                f'shows {", ".join(str(row[0]) for row in clashes)} double-book their {column[:-3]}; '
+                f'list them all with `flask fyyur check-bookings`, fix them and upgrade again')
+        op.execute(
+            f'ALTER TABLE "Show" ADD CONSTRAINT "{name}" EXCLUDE USING gist '
+            f'({column} WITH =, tsrange(start_date, start_date + {SLOT}) WITH &&)')
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    for name, _ in reversed(CONSTRAINTS):
+        op.execute(f'ALTER TABLE "Show" DROP CONSTRAINT "{name}"')
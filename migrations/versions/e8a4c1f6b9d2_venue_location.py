@@ -0,0 +1,48 @@
+"""venue location
+
+Revision ID: e8a4c1f6b9d2
+Revises: d3f9b2c7e5a1
+Create Date: 2026-10-18 09:27:05.114682
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# the same centroid table and geohash the app places new venues with
+from geo import geohash, locate
+
+
+# revision identifiers, used by Alembic.
+revision = 'e8a4c1f6b9d2'
+down_revision = 'd3f9b2c7e5a1'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 1000
+COLUMNS = (('latitude', sa.Float()), ('longitude', sa.Float()), ('geohash', sa.BigInteger()))
+
+
+def upgrade():
+    # plain ADD COLUMN: a batch rebuild of Venue would drop its search triggers
+    for name, type_ in COLUMNS:
+        op.add_column('Venue', sa.Column(name, type_, nullable=True))
+    op.create_index('ix_Venue_geohash', 'Venue', ['geohash'])
+
+    bind = op.get_bind()
+    # venues sharing a city share a position, so place each (city, state) once
+    located = []
+    for city, state in bind.execute(sa.text('SELECT DISTINCT city, state FROM "Venue"')).fetchall():
+        position = locate(city, state)
+        if position is not None:
+            located.append({'city': city, 'state': state, 'latitude': position[0],
+                            'longitude': position[1], 'geohash': geohash(*position)})
+    update = sa.text('UPDATE "Venue" SET latitude = :latitude, longitude = :longitude, '
+                     'geohash = :geohash WHERE city = :city AND state = :state')
+    for start in range(0, len(located), BATCH_SIZE):
+        bind.execute(update, located[start:start + BATCH_SIZE])
+
+
+def downgrade():
+    op.drop_index('ix_Venue_geohash', table_name='Venue')
+    for name, _ in reversed(COLUMNS):
+        op.execute(f'ALTER TABLE "Venue" DROP COLUMN {name}')
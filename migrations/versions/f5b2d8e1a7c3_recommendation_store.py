@@ -0,0 +1,36 @@
+"""recommendation store
+
+Revision ID: f5b2d8e1a7c3
+Revises: e8a4c1f6b9d2
+Create Date: 2026-10-18 11:42:17.308215
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f5b2d8e1a7c3'
+down_revision = 'e8a4c1f6b9d2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # filled by `flask fyyur refresh-recommendations`, which needs NumPy and
+    # SciPy; until then the detail pages show no recommendations
+    op.create_table('recommendation',
+    sa.Column('owner_kind', sa.String(length=6), nullable=False),
+    sa.Column('owner_id', sa.Integer(), nullable=False),
+    sa.Column('rank', sa.Integer(), nullable=False),
+    sa.Column('target_id', sa.Integer(), nullable=False),
+    sa.Column('score', sa.Float(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('owner_kind', 'owner_id', 'rank')
+    )
+    op.create_index('ix_recommendation_owner_kind_target_id', 'recommendation', ['owner_kind', 'target_id'])
+
+
+def downgrade():
+    op.drop_index('ix_recommendation_owner_kind_target_id', table_name='recommendation')
+    op.drop_table('recommendation')
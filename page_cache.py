@@ -0,0 +1,188 @@
+"""Rendered-page cache for the venue and artist detail pages.
+
+Entries are grouped by entity (``'venue', 3``) and then by variant (the
+``past_page`` being viewed), so one ``invalidate`` call drops every cached page
+of an entity. Each entry carries its own expiry: the configured TTL, or
+sooner when the page's next upcoming show starts and it would move to "past".
+
+Entries also carry the ETag of the data they were rendered from. A lookup
+under a different ETag means the entity changed without this process
+invalidating it (another host, a script, a migration), so the entity's
+pages are dropped rather than served under the new ETag.
+"""
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import quote
+
+
+class MemoryBackend:
+    """LRU of entities, each holding an LRU of variant -> (expires_at, etag, html)."""
+
+    def __init__(self, max_entries=1024, max_variants=8):
+        self.max_entries = max_entries
+        self.max_variants = max_variants
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, variant):
+        with self._lock:
+            variants = self._entries.get(key)
+            if variants is None:
+                return None
+            self._entries.move_to_end(key)
+            if variant in variants:
+                variants.move_to_end(variant)
+            return variants.get(variant)
+
+    def set(self, key, variant, expires_at, etag, value):
+        with self._lock:
+            variants = self._entries.setdefault(key, OrderedDict())
+            variants[variant] = (expires_at, etag, value)
+            variants.move_to_end(variant)
+            while len(variants) > self.max_variants:
+                variants.popitem(last=False)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class FileSystemBackend:
+    """One directory per entity and one file per variant, shared by every
+    worker process on the host. The first two lines of a file are its expiry
+    and its ETag."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key, variant=None):
+        path = os.path.join(self.directory, quote(key, safe=''))
+        return path if variant is None else os.path.join(path, quote(variant, safe=''))
+
+    def get(self, key, variant):
+        try:
+            with open(self._path(key, variant), encoding='utf-8') as f:
+                expires_at = float(f.readline())
+                etag = f.readline().rstrip('\n')
+                return expires_at, etag, f.read()
+        except (OSError, ValueError):
+            return None
+
+    def set(self, key, variant, expires_at, etag, value):
+        directory = self._path(key)
+        os.makedirs(directory, exist_ok=True)
+        # write to a temporary file and rename so readers never see half a page
+        fd, tmp = tempfile.mkstemp(dir=directory)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(f'{expires_at}\n{etag}\n')
+            f.write(value)
+        os.replace(tmp, self._path(key, variant))
+
+    def delete(self, key):
+        shutil.rmtree(self._path(key), ignore_errors=True)
+
+    def clear(self):
+        for name in os.listdir(self.directory):
+            shutil.rmtree(os.path.join(self.directory, name), ignore_errors=True)
+
+
+class NullBackend:
+
+    def get(self, key, variant):
+        return None
+
+    def set(self, key, variant, expires_at, etag, value):
+        pass
+
+    def delete(self, key):
+        pass
+
+    def clear(self):
+        pass
+
+
+class PageCache:
+
+    def __init__(self, backend=None, ttl=60):
+        # caches nothing until init_app picks the configured backend
+        self.backend = backend or NullBackend()
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    def init_app(self, app):
+        self.backend = create_backend(app.config)
+        self.ttl = app.config.get('PAGE_CACHE_TTL', 60)
+
+    @staticmethod
+    def _key(kind, entity_id):
+        return f'{kind}:{entity_id}'
+
+    def get(self, kind, entity_id, variant, etag):
+        key = self._key(kind, entity_id)
+        entry = self.backend.get(key, str(variant))
+        if entry is not None and entry[1] != etag:
+            # rendered from data that has changed since; so were the entity's
+            # other variants, which share its ETag
+            self.backend.delete(key)
+            entry = None
+        if entry is None or entry[0] <= time.time():
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry[2]
+
+    def set(self, kind, entity_id, variant, etag, html, expires_at=None):
+        """Cache ``html``, rendered from the data ``etag`` describes, for at
+        most ``ttl`` seconds, or until ``expires_at`` (a unix timestamp) if
+        that is sooner."""
+        deadline = time.time() + self.ttl
+        if expires_at is not None:
+            deadline = min(deadline, expires_at)
+        self.backend.set(self._key(kind, entity_id), str(variant), deadline, etag, html)
+
+    def invalidate(self, kind, *entity_ids):
+        for entity_id in entity_ids:
+            self.backend.delete(self._key(kind, entity_id))
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'backend': type(self.backend).__name__,
+            'ttl': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / lookups if lookups else 0.0
+        }
+
+
+def create_backend(config):
+    cache_type = config.get('PAGE_CACHE_TYPE', 'memory')
+    if cache_type == 'memory':
+        backend = MemoryBackend(config.get('PAGE_CACHE_MAX_ENTRIES', 1024), config.get('PAGE_CACHE_MAX_VARIANTS', 8))
+    elif cache_type == 'filesystem':
+        backend = FileSystemBackend(config['PAGE_CACHE_DIR'])
+    elif cache_type == 'null':
+        backend = NullBackend()
+    else:
+        raise ValueError(f'unknown PAGE_CACHE_TYPE {cache_type!r}')
+    return backend
+
+
+def create_page_cache(config):
+    return PageCache(create_backend(config), config.get('PAGE_CACHE_TTL', 60))
@@ -0,0 +1,187 @@
+"""Per-request SQL and timing profile, logged as JSON lines and served at /__metrics.
+
+/__metrics is only registered in debug and testing, or with
+ENABLE_INTERNAL_ENDPOINTS set.
+
+A sampled request records every statement it executes (count, total time
+and the slowest few), how long its templates took to render and how long it
+took overall, up to the moment the last byte of a streamed body was sent.
+Requests with a statement slower than PROFILER_SLOW_QUERY_MS, or slower
+than PROFILER_SLOW_REQUEST_MS overall, are written to the ``fyyur.profiler``
+logger as one JSON object per line. Every sampled request feeds the
+per-route percentiles returned by ``metrics()``.
+"""
+import heapq
+import json
+import logging
+import random
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+from flask import before_render_template, g, has_app_context, request, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger('fyyur.profiler')
+logger.setLevel(logging.INFO)
+logger.propagate = False
+
+STATEMENT_LENGTH = 500
+
+
+class RequestProfile:
+    __slots__ = ('started', 'queries', 'db_time', 'render_time', 'render_started', 'slowest')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.render_time = 0.0
+        self.render_started = None
+        # (seconds, statement) min-heap of the slowest statements so far
+        self.slowest = []
+
+
+def percentiles(values):
+    ordered = sorted(values)
+    if not ordered:
+        return {}
+
+    def rank(fraction):
+        return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+    return {'p50': rank(0.50), 'p95': rank(0.95), 'p99': rank(0.99), 'max': ordered[-1]}
+
+
+class RequestProfiler:
+
+    def __init__(self, app=None):
+        self._routes = {}
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config.get('PROFILER_ENABLED', True)
+        self.sample_rate = app.config.get('PROFILER_SAMPLE_RATE', 1.0)
+        self.slow_query = app.config.get('PROFILER_SLOW_QUERY_MS', 100) / 1000
+        self.slow_request = app.config.get('PROFILER_SLOW_REQUEST_MS', 500) / 1000
+        self.slowest_kept = app.config.get('PROFILER_SLOWEST_STATEMENTS', 5)
+        self.window = app.config.get('PROFILER_WINDOW', 1000)
+        if not self.enabled:
+            return
+        app.before_request(self._start_request)
+        app.after_request(self._finish_request)
+        before_render_template.connect(self._start_render, app)
+        template_rendered.connect(self._finish_render, app)
+        # every engine, including ones created after this call
+        event.listen(Engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', self._after_cursor_execute)
+
+    @staticmethod
+    def _current():
+        return g.get('profile') if has_app_context() else None
+
+    def _start_request(self):
+        if random.random() < self.sample_rate:
+            g.profile = RequestProfile()
+
+    def _start_render(self, sender, template, context, **extra):
+        profile = self._current()
+        if profile is not None:
+            profile.render_started = time.perf_counter()
+
+    def _finish_render(self, sender, template, context, **extra):
+        profile = self._current()
+        if profile is not None and profile.render_started is not None:
+            profile.render_time += time.perf_counter() - profile.render_started
+            profile.render_started = None
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if self._current() is not None:
+            conn.info.setdefault('profiler_started', []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        profile = self._current()
+        started = conn.info.get('profiler_started')
+        if profile is None or not started:
+            return
+        elapsed = time.perf_counter() - started.pop()
+        profile.queries += 1
+        profile.db_time += elapsed
+        entry = (elapsed, ' '.join(statement.split())[:STATEMENT_LENGTH])
+        if len(profile.slowest) < self.slowest_kept:
+            heapq.heappush(profile.slowest, entry)
+        elif elapsed > profile.slowest[0][0]:
+            heapq.heapreplace(profile.slowest, entry)
+
+    def _finish_request(self, response):
+        profile = self._current()
+        if profile is None:
+            return response
+        route = f'{request.method} {request.url_rule.rule if request.url_rule else "<unmatched>"}'
+        path = request.full_path.rstrip('?')
+        handled = time.perf_counter()
+
+        def finish():
+            # a streamed body renders while it is sent, after after_request
+            if response.is_streamed:
+                profile.render_time += time.perf_counter() - handled
+            self._record(route, path, response.status_code, profile)
+
+        response.call_on_close(finish)
+        return response
+
+    def _record(self, route, path, status, profile):
+        total = time.perf_counter() - profile.started
+        slowest = sorted(profile.slowest, reverse=True)
+        with self._lock:
+            stats = self._routes.get(route)
+            if stats is None:
+                stats = self._routes[route] = {
+                    'queries': deque(maxlen=self.window),
+                    'db_ms': deque(maxlen=self.window),
+                    'render_ms': deque(maxlen=self.window),
+                    'total_ms': deque(maxlen=self.window),
+                    'slowest': []
+                }
+            stats['queries'].append(profile.queries)
+            stats['db_ms'].append(profile.db_time * 1000)
+            stats['render_ms'].append(profile.render_time * 1000)
+            stats['total_ms'].append(total * 1000)
+            stats['slowest'] = heapq.nlargest(
+                self.slowest_kept, stats['slowest'] + slowest, key=lambda entry: entry[0])
+
+        if total >= self.slow_request or (slowest and slowest[0][0] >= self.slow_query):
+            logger.info(json.dumps({
+                'time': datetime.utcnow().isoformat() + 'Z',
+                'route': route,
+                'path': path,
+                'status': status,
+                'queries': profile.queries,
+                'db_ms': round(profile.db_time * 1000, 2),
+                'render_ms': round(profile.render_time * 1000, 2),
+                'total_ms': round(total * 1000, 2),
+                'slowest': [{'ms': round(seconds * 1000, 2), 'statement': statement}
+                            for seconds, statement in slowest]
+            }, separators=(',', ':')))
+
+    def metrics(self):
+        with self._lock:
+            routes = {route: {
+                'requests': len(stats['total_ms']),
+                'queries': percentiles(stats['queries']),
+                'db_ms': percentiles(stats['db_ms']),
+                'render_ms': percentiles(stats['render_ms']),
+                'total_ms': percentiles(stats['total_ms']),
+                'slowest': [{'ms': round(seconds * 1000, 2), 'statement': statement}
+                            for seconds, statement in stats['slowest']]
+            } for route, stats in self._routes.items()}
+        return {
+            'sample_rate': self.sample_rate,
+            'slow_query_ms': self.slow_query * 1000,
+            'slow_request_ms': self.slow_request * 1000,
+            'window': self.window,
+            'routes': routes
+        }
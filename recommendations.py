@@ -0,0 +1,448 @@
+"""Recommended artists on venue pages and recommended venues on artist pages.
+
+A venue page recommends artists seeking a venue, and an artist page venues
+seeking talent. Every pair is scored on
+
+- genre overlap: the cosine of their rows of the sparse genre incidence
+  matrices (entities x genres),
+- show history: how well the genres of the acts a venue has booked match the
+  artist, and the genres of the venues an artist has played match the venue,
+- place: the same state, and more for the same city.
+
+The score is symmetric. NumPy/SciPy compute it for a batch of owners against
+every candidate at once, and only each owner's top ``count`` are kept in the
+recommendation table, so a page reads its panel with one indexed query.
+
+The features live in process, like the typeahead index. ``reload`` loads
+them whole; a FeatureReloader calls it on a background thread when the
+process starts serving and every ``interval`` seconds after, so no request
+waits for it. A write refreshes, in the caller's transaction:
+- the changed entities' own lists,
+- the lists of the owners that list a changed entity,
+- the lists a changed entity now scores high enough to enter.
+The lists are scored with a copy of the features with only the changed
+rows reloaded, which replaces the process's own once the transaction
+commits; a rollback discards it. Each refresh first catches up with the
+venues, artists and shows written since the features were last synced (by
+``updated_at``), which is how the writes other worker processes make reach
+this one. Writes made before the reloader's first load are left for it to
+refresh once it has loaded; without a reloader the first refresh loads the
+features itself.
+
+``rebuild`` recomputes every list. It repairs what incremental refreshes
+leave behind, for example the history of the other side of a deleted show.
+NumPy and SciPy are imported on first use, so they stay out of worker
+startup.
+"""
+import logging
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+import sqlalchemy as sa
+from sqlalchemy import orm
+
+logger = logging.getLogger(__name__)
+
+RECOMMENDATION_COUNT = 6
+# owners scored per block; a block holds batch x candidates floats
+RECOMMENDATION_BATCH_SIZE = 256
+# seconds between a FeatureReloader's full reloads of the features
+RECOMMENDATION_RELOAD_INTERVAL = 600
+# ids per IN (...) list
+IN_CHUNK_SIZE = 500
+# seconds before the last sync whose writes the next sync reads again, for
+# transactions that set updated_at before it and committed after it
+SYNC_OVERLAP = 5
+# session.info key: the features a refresh scored with, installed on commit
+STAGED_FEATURES = 'fyyur_recommendation_features'
+
+GENRE_WEIGHT = 0.45
+HISTORY_WEIGHT = 0.25
+STATE_WEIGHT = 0.1
+# on top of STATE_WEIGHT, so the best possible score is 1
+CITY_WEIGHT = 0.2
+
+# model: Venue or Artist, seeking: its column saying it wants the other side,
+# genre_column: its foreign key in the *_genre table, show_column: its
+# foreign key in Show; the model and Show have an updated_at column
+RecommendationSide = namedtuple('RecommendationSide', ['model', 'seeking', 'genre_column', 'show_column'])
+
+# one row per venue or per artist: ids, L2-normalised genre incidence (CSR)
+# and show history genre profile (dense), place codes, seeking flags
+Features = namedtuple('Features', ['ids', 'genres', 'history', 'city', 'state', 'seeking'])
+
+# the Features of both sides, {kind: {entity id: row}}, the genre columns of
+# their matrices, the newest updated_at of the writes they include and, as
+# _written_since returns them, the rows written within SYNC_OVERLAP of it
+FeatureSet = namedtuple('FeatureSet', ['features', 'indexes', 'genre_count', 'synced_at', 'recent'])
+
+
+def newest(*values):
+    values = [value for value in values if value is not None]
+    return max(values) if values else None
+
+
+class Recommender:
+
+    def __init__(self, store, sides, count=RECOMMENDATION_COUNT):
+        self.store = store
+        # {'venue': RecommendationSide, 'artist': RecommendationSide}
+        self.sides = sides
+        self.count = count
+        # set by a started FeatureReloader, which refreshes the changes
+        # written before its first load
+        self.deferred = False
+        self._lock = threading.Lock()
+        self._features = None
+        self._pending = {}
+        self._places_lock = threading.Lock()
+        self._places = {}
+        event_listeners = (('after_commit', self._after_commit), ('after_transaction_end', self._after_end))
+        for name, listener in event_listeners:
+            sa.event.listen(orm.Session, name, listener)
+
+    def _other(self, kind):
+        return next(other for other in self.sides if other != kind)
+
+    def _query(self, session, kind, ids=None):
+        """The entity, genre link and show history rows of ``kind``, for
+        ``ids`` or for every entity."""
+        side, other = self.sides[kind], self.sides[self._other(kind)]
+        genre_id = side.genre_column.table.c.genre_id
+        other_genre_id = other.genre_column.table.c.genre_id
+
+        entities = session.query(side.model.id, side.model.city, side.model.state, side.seeking)
+        links = session.query(side.genre_column, genre_id)
+        # the genres of the other side of every show, counted per entity
+        history = session.query(side.show_column, other_genre_id, sa.func.count()).join(
+            other.genre_column.table, other.genre_column == other.show_column).group_by(
+            side.show_column, other_genre_id)
+        if ids is None:
+            return entities.all(), links.all(), history.all()
+        rows = ([], [], [])
+        for start in range(0, len(ids), IN_CHUNK_SIZE):
+            chunk = ids[start:start + IN_CHUNK_SIZE]
+            rows[0].extend(entities.filter(side.model.id.in_(chunk)))
+            rows[1].extend(links.filter(side.genre_column.in_(chunk)))
+            rows[2].extend(history.filter(side.show_column.in_(chunk)))
+        return rows
+
+    def _place_code(self, key):
+        # reload builds features on the reloader's thread while refreshes do
+        with self._places_lock:
+            return self._places.setdefault(key, len(self._places))
+
+    def _build(self, genre_count, entities, links, history):
+        import numpy as np
+        from scipy import sparse
+
+        def normalized(triples):
+            rows, columns, values = zip(*triples) if triples else ((), (), ())
+            matrix = sparse.csr_matrix((np.array(values, dtype=np.float32), (rows, columns)),
+                                       shape=(len(entities), genre_count))
+            norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+            norms[norms == 0] = 1
+            return sparse.csr_matrix(sparse.diags(1 / norms) @ matrix, dtype=np.float32)
+
+        index = {row[0]: i for i, row in enumerate(entities)}
+        states = [(row[2] or '').strip().upper() for row in entities]
+        return Features(
+            ids=np.array([row[0] for row in entities], dtype=np.int64),
+            genres=normalized([(index[owner], genre, 1) for owner, genre in links if owner in index]),
+            history=normalized([(index[owner], genre, count) for owner, genre, count in history
+                                if owner in index]).toarray(),
+            city=np.array([self._place_code((state, ' '.join((row[1] or '').split()).casefold()))
+                           for state, row in zip(states, entities)], dtype=np.int64),
+            state=np.array([self._place_code(state) for state in states], dtype=np.int64),
+            seeking=np.array([bool(row[3]) for row in entities], dtype=bool))
+
+    @staticmethod
+    def _feature_set(features, genre_count, synced_at, recent):
+        indexes = {kind: {entity_id: row for row, entity_id in enumerate(side.ids.tolist())}
+                   for kind, side in features.items()}
+        return FeatureSet(features, indexes, genre_count, synced_at, recent)
+
+    def _synced_at(self, session):
+        # the newest write the features about to be read include
+        show_table = next(iter(self.sides.values())).show_column.table
+        columns = [side.model.updated_at for side in self.sides.values()] + [show_table.c.updated_at]
+        return newest(*session.query(*[session.query(sa.func.max(column)).label(f'synced_{i}')
+                                       for i, column in enumerate(columns)]).one())
+
+    def _load(self, session):
+        synced_at = self._synced_at(session)
+        queried = {kind: self._query(session, kind) for kind in self.sides}
+        genre_count = 1 + max([row[1] for rows in queried.values() for row in rows[1] + rows[2]], default=0)
+        return self._feature_set({kind: self._build(genre_count, *rows) for kind, rows in queried.items()},
+                                 genre_count, synced_at, self._written_since(session, synced_at))
+
+    def _written_since(self, session, synced_at):
+        """{(kind or 'show', id): (updated_at, [(kind, id) of the entities
+        whose features it feeds])} of the venues, artists and shows written
+        within SYNC_OVERLAP of ``synced_at`` or since; deletions leave nothing
+        behind to find."""
+        since = synced_at - timedelta(seconds=SYNC_OVERLAP) if synced_at is not None else datetime.min
+        written = {}
+        for kind, side in self.sides.items():
+            for entity_id, updated_at in session.query(side.model.id, side.model.updated_at).filter(
+                    side.model.updated_at >= since):
+                written[kind, entity_id] = (updated_at, [(kind, entity_id)])
+        show_table = next(iter(self.sides.values())).show_column.table
+        for row in session.query(show_table.c.id, show_table.c.updated_at,
+                                 *[side.show_column for side in self.sides.values()]).filter(
+                show_table.c.updated_at >= since):
+            written['show', row[0]] = (row[1], list(zip(self.sides, row[2:])))
+        return written
+
+    @staticmethod
+    def _widened(features, genre_count):
+        # features with empty columns added for genres created since they loaded
+        import numpy as np
+        from scipy import sparse
+
+        added = genre_count - features.genres.shape[1]
+        if not added:
+            return features
+        genres = features.genres
+        return features._replace(
+            genres=sparse.csr_matrix((genres.data, genres.indices, genres.indptr),
+                                     shape=(genres.shape[0], genre_count)),
+            history=np.pad(features.history, ((0, 0), (0, added))))
+
+    def _update(self, session, feature_set, changes, recent):
+        """A copy of ``feature_set`` with the features of ``changes`` ({kind:
+        ids}) reloaded, dropping the ones that no longer exist, and the
+        ``recent`` writes."""
+        import numpy as np
+        from scipy import sparse
+
+        synced_at = self._synced_at(session)
+        queried = {kind: self._query(session, kind, ids) for kind, ids in changes.items()}
+        genre_count = max([feature_set.genre_count] + [
+            1 + row[1] for rows in queried.values() for row in rows[1] + rows[2]])
+        features = {kind: self._widened(side, genre_count) for kind, side in feature_set.features.items()}
+        for kind, ids in changes.items():
+            old, fresh = features[kind], self._build(genre_count, *queried[kind])
+            index = feature_set.indexes[kind]
+            changed = {index[entity_id] for entity_id in ids if entity_id in index}
+            keep = np.array([row for row in range(len(old.ids)) if row not in changed], dtype=np.int64)
+            features[kind] = Features(
+                ids=np.concatenate([old.ids[keep], fresh.ids]),
+                genres=sparse.vstack([old.genres[keep], fresh.genres], format='csr'),
+                history=np.vstack([old.history[keep], fresh.history]),
+                city=np.concatenate([old.city[keep], fresh.city]),
+                state=np.concatenate([old.state[keep], fresh.state]),
+                seeking=np.concatenate([old.seeking[keep], fresh.seeking]))
+        return self._feature_set(features, genre_count, newest(synced_at, feature_set.synced_at), recent)
+
+    def _stage(self, session, feature_set):
+        session.info[STAGED_FEATURES] = (self, feature_set)
+
+    def _after_commit(self, session):
+        staged = session.info.get(STAGED_FEATURES)
+        if staged is not None and staged[0] is self:
+            with self._lock:
+                self._features = staged[1]
+
+    def _after_end(self, session, transaction):
+        if transaction.parent is None:
+            session.info.pop(STAGED_FEATURES, None)
+
+    def _scores(self, owner, rows, other):
+        """Scores of the ``rows`` of ``owner`` against every entity of ``other``."""
+        block = owner.genres[rows]
+        scores = GENRE_WEIGHT * (block @ other.genres.T).toarray()
+        scores += HISTORY_WEIGHT / 2 * (block @ other.history.T)
+        scores += HISTORY_WEIGHT / 2 * (other.genres @ owner.history[rows].T).T
+        scores += STATE_WEIGHT * (owner.state[rows, None] == other.state[None, :])
+        scores += CITY_WEIGHT * (owner.city[rows, None] == other.city[None, :])
+        return scores
+
+    def _lists(self, feature_set, kind, rows):
+        """Yield (owner id, [(target id, score), ...] best first) for ``rows``."""
+        import numpy as np
+
+        owner, other = feature_set.features[kind], feature_set.features[self._other(kind)]
+        count = min(self.count, len(other.ids))
+        for start in range(0, len(rows), RECOMMENDATION_BATCH_SIZE):
+            batch = rows[start:start + RECOMMENDATION_BATCH_SIZE]
+            if not count:
+                yield from ((int(owner.ids[row]), []) for row in batch)
+                continue
+            scores = self._scores(owner, batch, other)
+            scores[:, ~other.seeking] = 0
+            # the top count of each row in any order, then just those sorted
+            top = np.argpartition(-scores, count - 1, axis=1)[:, :count]
+            top_scores = np.take_along_axis(scores, top, axis=1)
+            order = np.argsort(-top_scores, axis=1, kind='stable')
+            top = np.take_along_axis(top, order, axis=1)
+            top_scores = np.take_along_axis(top_scores, order, axis=1)
+            for i, row in enumerate(batch):
+                yield int(owner.ids[row]), [(int(other.ids[target]), float(score))
+                                            for target, score in zip(top[i], top_scores[i]) if score > 0]
+
+    def _insert(self, session, kind, lists):
+        now = datetime.utcnow()
+        records = []
+        for owner_id, targets in lists:
+            records.extend({'owner_kind': kind, 'owner_id': owner_id, 'rank': rank, 'target_id': target_id,
+                            'score': score, 'updated_at': now} for rank, (target_id, score) in enumerate(targets))
+            if len(records) >= 10000:
+                session.execute(self.store.__table__.insert(), records)
+                records = []
+        if records:
+            session.execute(self.store.__table__.insert(), records)
+
+    def rebuild(self, session):
+        """Recompute every list from the database; the caller commits."""
+        import numpy as np
+
+        with self._lock:
+            feature_set = self._load(session)
+            session.query(self.store).delete(synchronize_session=False)
+            for kind, features in feature_set.features.items():
+                self._insert(session, kind, self._lists(feature_set, kind, np.arange(len(features.ids))))
+            self._stage(session, feature_set)
+
+    def _listing(self, session, kind, target_ids):
+        # the owners of kind whose lists contain any of target_ids
+        store = self.store
+        owners = set()
+        for start in range(0, len(target_ids), IN_CHUNK_SIZE):
+            owners.update(row[0] for row in session.query(store.owner_id).filter(
+                store.owner_kind == kind, store.target_id.in_(target_ids[start:start + IN_CHUNK_SIZE])
+            ).distinct())
+        return owners
+
+    def _entered(self, session, feature_set, kind, ids):
+        # the owners on the other side whose lists the changed ids now belong in
+        import numpy as np
+
+        store, other_kind = self.store, self._other(kind)
+        features, other = feature_set.features[kind], feature_set.features[other_kind]
+        index = feature_set.indexes[kind]
+        rows = np.array([index[entity_id] for entity_id in ids if entity_id in index], dtype=np.int64)
+        rows = rows[features.seeking[rows]]
+        if not len(rows) or not len(other.ids):
+            return set()
+        # the score is symmetric, so these rows are the changed ids' scores
+        # from every owner's side too; best: each owner's highest of them
+        best = np.zeros(len(other.ids), dtype=np.float32)
+        for start in range(0, len(rows), RECOMMENDATION_BATCH_SIZE):
+            scores = self._scores(features, rows[start:start + RECOMMENDATION_BATCH_SIZE], other)
+            best = np.maximum(best, scores.max(axis=0))
+        candidates = dict(zip(other.ids[best > 0].tolist(), best[best > 0]))
+        # an owner with a full list takes a score above its lowest, the one
+        # ranked last, and one with a short list any positive score
+        owner_ids = sorted(candidates)
+        for start in range(0, len(owner_ids), IN_CHUNK_SIZE):
+            for owner_id, lowest in session.query(store.owner_id, store.score).filter(
+                    store.owner_kind == other_kind, store.rank == self.count - 1,
+                    store.owner_id.in_(owner_ids[start:start + IN_CHUNK_SIZE])):
+                if candidates[owner_id] <= np.float32(lowest):
+                    del candidates[owner_id]
+        return set(candidates)
+
+    def _rewrite(self, session, feature_set, kind, owner_ids):
+        import numpy as np
+
+        store, index = self.store, feature_set.indexes[kind]
+        owner_ids = sorted(owner_ids)
+        for start in range(0, len(owner_ids), IN_CHUNK_SIZE):
+            session.query(store).filter(
+                store.owner_kind == kind, store.owner_id.in_(owner_ids[start:start + IN_CHUNK_SIZE])
+            ).delete(synchronize_session=False)
+        rows = np.array([index[owner_id] for owner_id in owner_ids if owner_id in index], dtype=np.int64)
+        self._insert(session, kind, self._lists(feature_set, kind, rows))
+
+    def reload(self, session):
+        """Load the features whole, then refresh the changes written before
+        they were first loaded; the caller commits.
+
+        Returns {kind: owner ids whose lists were rewritten}."""
+        feature_set = self._load(session)
+        with self._lock:
+            # writes committed while loading are caught up with by the next
+            # refresh, like those of other processes
+            self._features = feature_set
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return {kind: set() for kind in self.sides}
+        try:
+            return self.refresh(session, pending)
+        except Exception:
+            with self._lock:
+                for kind, ids in pending.items():
+                    self._pending.setdefault(kind, set()).update(ids)
+            raise
+
+    def refresh(self, session, changes):
+        """Bring the lists up to date after ``changes`` ({kind: ids}) were
+        written, or deleted, in this transaction; the caller commits.
+
+        Returns {kind: owner ids whose lists were rewritten}, whose pages
+        render them."""
+        changes = {kind: sorted(set(ids)) for kind, ids in changes.items() if ids}
+        with self._lock:
+            feature_set = self._features
+            if feature_set is None and self.deferred:
+                # the reloader refreshes them once it has loaded the features
+                for kind, ids in changes.items():
+                    self._pending.setdefault(kind, set()).update(ids)
+                return {kind: set() for kind in self.sides}
+            if feature_set is None:
+                feature_set = self._load(session)
+            else:
+                # this transaction's changes, and whatever else was written
+                # since the features were synced
+                reload = {kind: set(ids) for kind, ids in changes.items()}
+                written = self._written_since(session, feature_set.synced_at)
+                for key, (updated_at, entities) in written.items():
+                    if key not in feature_set.recent or feature_set.recent[key][0] != updated_at:
+                        for kind, entity_id in entities:
+                            reload.setdefault(kind, set()).add(entity_id)
+                feature_set = self._update(session, feature_set, {
+                    kind: sorted(ids) for kind, ids in reload.items() if ids}, written)
+            rewritten = {kind: set() for kind in self.sides}
+            for kind, ids in changes.items():
+                other_kind = self._other(kind)
+                rewritten[kind].update(ids)
+                rewritten[other_kind].update(self._listing(session, other_kind, ids))
+                rewritten[other_kind].update(self._entered(session, feature_set, kind, ids))
+            for kind, owner_ids in rewritten.items():
+                self._rewrite(session, feature_set, kind, owner_ids)
+            self._stage(session, feature_set)
+            return rewritten
+
+
+class FeatureReloader:
+    """Calls ``reload`` on a daemon thread once started, and again every
+    ``interval`` seconds; an interval of 0 never starts it. Every process
+    keeps its own features, so every process runs one."""
+
+    def __init__(self, recommender, reload, interval=RECOMMENDATION_RELOAD_INTERVAL):
+        self.recommender = recommender
+        self.reload = reload
+        self.interval = interval
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        if self._thread is not None or not self.interval:
+            return
+        with self._lock:
+            if self._thread is None:
+                self.recommender.deferred = True
+                self._thread = threading.Thread(
+                    target=self._run, name='recommendation-reloader', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                self.reload()
+            except Exception:
+                logger.exception('reloading the recommendation features failed')
+            time.sleep(self.interval)
@@ -0,0 +1,260 @@
+"""Read-replica routing for the SQLAlchemy session.
+
+With DATABASE_REPLICA_URL set, GET and HEAD requests (and POST views marked
+``read_only``, such as the searches) run their SELECTs on the replica;
+flushes, INSERT/UPDATE/DELETE statements and every other request use the
+primary. The database keeps the replica current: streaming replication, or
+a copy of the SQLite file when trying this out locally. Nothing here writes
+to the replica.
+
+Both databases report a replication position that only grows: on
+PostgreSQL the WAL location, the primary's ``pg_current_wal_lsn()`` against
+the replica's ``pg_last_wal_replay_lsn()``; elsewhere the single row of
+``replication_position``, which every writing transaction bumps before it
+commits (SQLite runs one writer at a time anyway). The replica has replayed
+a write once its position reaches the write's, which gives the two checks
+made before each read request:
+
+- read-your-writes: a write stores the primary's position after its commit
+  in the user's session, and that user reads from the primary until the
+  replica has caught up with it;
+- lag: a replica behind the primary is taken to lag by the time since this
+  process first saw the primary at a position the replica has not reached;
+  past ``max_lag`` seconds every read goes to the primary, as it does when
+  the replica is down. A replica that has replayed everything never lags,
+  however long ago the last write was.
+
+The positions are read at most every ``check_interval`` seconds per process.
+"""
+import logging
+import threading
+import time
+from collections import deque, namedtuple
+from datetime import datetime
+
+from flask import current_app, g, has_app_context, has_request_context, request, session as user_session
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.sql.dml import UpdateBase
+
+logger = logging.getLogger(__name__)
+
+# the user's session key holding the position of their last write
+WRITTEN_POSITION_KEY = '_db_written'
+# connection.info flag: the connection's transaction has run a write
+WROTE = 'fyyur_wrote'
+# session.info key: the primary connection of the session's transaction
+PRIMARY_CONNECTION = 'fyyur_primary_connection'
+# session.info key: the committing transaction wrote; its position, if known
+COMMITTING_WRITE = 'fyyur_committing_write'
+READ_METHODS = ('GET', 'HEAD')
+WRITE_STATEMENTS = ('INSERT', 'UPDATE', 'DELETE')
+
+# primary, replica: their replication positions; lag: seconds
+ReplicaStatus = namedtuple('ReplicaStatus', ['primary', 'replica', 'lag'])
+
+
+def read_only(view):
+    """Mark a POST view that only reads, so it can be served from the replica."""
+    view.read_only = True
+    return view
+
+
+def reading_from_replica():
+    return has_app_context() and g.get('db_replica') is not None
+
+
+class ReplicaReads:
+    """Session mixin sending reads to the replica while the current request
+    reads from it (see ``ReplicaRouter``)."""
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        replica = g.get('db_replica') if has_app_context() else None
+        if (replica is not None and kwargs.get('bind') is None and not self._flushing
+                and not isinstance(clause, UpdateBase)):
+            return replica
+        return super().get_bind(mapper, clause, **kwargs)
+
+
+def mark_write(conn, cursor, statement, parameters, context, executemany):
+    if statement.lstrip()[:6].upper() in WRITE_STATEMENTS:
+        conn.info[WROTE] = True
+
+
+def clear_write(conn):
+    conn.info.pop(WROTE, None)
+
+
+def parse_lsn(lsn):
+    # '16/B374D848' -> 0x16B374D848
+    high, low = lsn.split('/')
+    return (int(high, 16) << 32) + int(low, 16)
+
+
+class WalPositions:
+    """PostgreSQL's WAL locations; nothing is written to read them."""
+
+    def primary(self, connection):
+        return parse_lsn(connection.execute(text('SELECT pg_current_wal_lsn()::text')).scalar())
+
+    def replica(self, connection):
+        # a "replica" that is not a standby (the primary itself, in
+        # development) has replayed everything it has
+        return parse_lsn(connection.execute(text(
+            'SELECT (CASE WHEN pg_is_in_recovery() THEN pg_last_wal_replay_lsn() '
+            'ELSE pg_current_wal_lsn() END)::text')).scalar())
+
+    def before_commit(self, connection):
+        # the commit's own location is only known once it has happened
+        return None
+
+
+class TablePositions:
+    """The replication_position row, for databases without a replication
+    position of their own. Every writing transaction updates the row, so
+    writers run one at a time: use it only where they do anyway (SQLite)."""
+
+    def __init__(self, model):
+        self.table = model.__table__
+
+    def primary(self, connection):
+        return connection.execute(self.table.select()).first().position
+
+    replica = primary
+
+    def before_commit(self, connection):
+        connection.execute(self.table.update().values(position=self.table.c.position + 1,
+                                                      written_at=datetime.now()))
+        return self.primary(connection)
+
+
+class ReplicaRouter:
+
+    def __init__(self, position, session_class, max_lag=5, check_interval=1):
+        # position: the model of the replication_position row
+        self.position = position
+        self.session_class = session_class
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.engine = None
+        self.positions = None
+        self._primary = None
+        self._status = None
+        self._checked_at = 0
+        # (primary position, monotonic time it was first seen) for each
+        # position the replica had not reached when last checked
+        self._seen = deque()
+        self._lock = threading.Lock()
+
+    def init_app(self, app, primary):
+        """Route ``app``'s reads when DATABASE_REPLICA_URL is set; ``primary``
+        returns the primary engine."""
+        url = app.config.get('DATABASE_REPLICA_URL')
+        if not url:
+            return
+        self.engine = create_engine(url, **app.config.get('DB_REPLICA_ENGINE_OPTIONS', {}))
+        self._primary = primary
+        self.max_lag = app.config.get('DB_REPLICA_MAX_LAG', self.max_lag)
+        self.check_interval = app.config.get('DB_REPLICA_CHECK_INTERVAL', self.check_interval)
+        app.before_request(self._route)
+        if not event.contains(Engine, 'before_cursor_execute', mark_write):
+            event.listen(Engine, 'before_cursor_execute', mark_write)
+            event.listen(Engine, 'commit', clear_write)
+            event.listen(Engine, 'rollback', clear_write)
+        for name, listener in (('after_begin', self._after_begin), ('before_commit', self._before_commit),
+                               ('after_commit', self._after_commit),
+                               ('after_transaction_end', self._after_transaction_end)):
+            if not event.contains(self.session_class, name, listener):
+                event.listen(self.session_class, name, listener)
+
+    def _positions(self):
+        if self.positions is None:
+            self.positions = (WalPositions() if self._primary().dialect.name == 'postgresql'
+                              else TablePositions(self.position))
+        return self.positions
+
+    def _saw_primary(self, position, now):
+        # call with self._lock held
+        if not self._seen or self._seen[-1][0] < position:
+            self._seen.append((position, now))
+
+    def status(self):
+        """The replica's ReplicaStatus as of the last check, or None when it
+        cannot be read."""
+        now = time.monotonic()
+        if self._checked_at and now - self._checked_at < self.check_interval:
+            return self._status
+        with self._lock:
+            if not self._checked_at or now - self._checked_at >= self.check_interval:
+                positions = self._positions()
+                try:
+                    with self._primary().connect() as connection:
+                        primary = positions.primary(connection)
+                    with self.engine.connect() as connection:
+                        replica = positions.replica(connection)
+                except SQLAlchemyError:
+                    logger.warning('reading the replication position failed; reading from the primary',
+                                   exc_info=True)
+                    self._status = None
+                else:
+                    self._saw_primary(primary, now)
+                    while self._seen and self._seen[0][0] <= replica:
+                        self._seen.popleft()
+                    lag = now - self._seen[0][1] if self._seen else 0
+                    self._status = ReplicaStatus(primary, replica, lag)
+                self._checked_at = now
+            return self._status
+
+    def _route(self):
+        view = current_app.view_functions.get(request.endpoint)
+        if request.method not in READ_METHODS and not getattr(view, 'read_only', False):
+            return
+        status = self.status()
+        if status is None or status.lag > self.max_lag:
+            return
+        written = user_session.get(WRITTEN_POSITION_KEY)
+        if written is not None:
+            if status.replica < written:
+                return
+            user_session.pop(WRITTEN_POSITION_KEY)
+        g.db_replica = self.engine
+        g.db_replica_behind = status.replica < status.primary
+
+    def behind(self):
+        """Whether the current request reads from a replica that has not
+        replayed every write yet; pages it renders may be stale."""
+        return reading_from_replica() and g.get('db_replica_behind', False)
+
+    def _after_begin(self, session, transaction, connection):
+        if connection.engine is not self.engine:
+            session.info[PRIMARY_CONNECTION] = connection
+
+    def _after_transaction_end(self, session, transaction):
+        if transaction.parent is None:
+            session.info.pop(PRIMARY_CONNECTION, None)
+            session.info.pop(COMMITTING_WRITE, None)
+
+    def _before_commit(self, session):
+        connection = session.info.get(PRIMARY_CONNECTION)
+        if connection is None or not connection.info.get(WROTE):
+            return
+        session.info[COMMITTING_WRITE] = self._positions().before_commit(connection)
+        clear_write(connection)
+
+    def _after_commit(self, session):
+        if COMMITTING_WRITE not in session.info:
+            return
+        position = session.info.pop(COMMITTING_WRITE)
+        if position is None:
+            # the primary's position now is at or past the commit
+            with self._primary().connect() as connection:
+                position = self._positions().primary(connection)
+        if has_request_context():
+            user_session[WRITTEN_POSITION_KEY] = position
+        # this process now knows the replica is behind, without waiting for
+        # the next check
+        with self._lock:
+            self._saw_primary(position, time.monotonic())
+            if self._status is not None and self._status.primary < position:
+                self._status = self._status._replace(primary=position)
@@ -0,0 +1,109 @@
+"""Venue and artist search.
+
+Postgres answers searches from the pg_trgm GIN indexes and SQLite from the FTS5
+trigram tables, both created by the search index migration. Terms too short
+for a trigram index, and databases without one, use a plain ILIKE scan.
+"""
+from collections import namedtuple
+
+import sqlalchemy as sa
+
+SEARCH_RESULT_LIMIT = 50
+MIN_INDEXED_TERM_LENGTH = 3
+
+# model: Venue or Artist, genre_column: its foreign key in the *_genre table,
+# genre_model: Genre, fts_table: name of the SQLite FTS5 table mirroring the model
+SearchTarget = namedtuple(
+    'SearchTarget', ['model', 'genre_column', 'genre_model', 'fts_table'])
+
+_fts_tables = {}
+
+
+def search(session, target, term, limit=SEARCH_RESULT_LIMIT):
+    """Return up to ``limit`` (id, name) rows matching ``term`` on name, city,
+    state or genre, best matches first."""
+    term = (term or '').strip()
+    if not term:
+        return []
+
+    if len(term) >= MIN_INDEXED_TERM_LENGTH:
+        bind = session.get_bind()
+        if bind.dialect.name == 'postgresql':
+            return _trigram_search(session, target, term, limit)
+        if bind.dialect.name == 'sqlite' and _has_fts_table(session, target.fts_table):
+            return _fts_search(session, target, term, limit)
+    return _ilike_search(session, target, term, limit)
+
+
+def _like_pattern(term):
+    escaped = term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f'%{escaped}%'
+
+
+def _genre_matches(session, target, like):
+    genre = target.genre_model
+    link = target.genre_column.table
+    return session.query(target.genre_column.label('id')).join(
+        genre, genre.id == link.c.genre_id).filter(genre.name.ilike(like, escape='\\'))
+
+
+def _ranked(session, target, hits, limit):
+    # an entity can be hit by both its text and its genres; keep its best score
+    model = target.model
+    hits = hits.subquery()
+    return session.query(model.id, model.name).join(
+        hits, hits.c.id == model.id).group_by(model.id, model.name).order_by(
+        sa.func.max(hits.c.score).desc(), model.name).limit(limit).all()
+
+
+def _ilike_search(session, target, term, limit):
+    model = target.model
+    like = _like_pattern(term)
+    name_match = model.name.ilike(like, escape='\\')
+    genre_ids = _genre_matches(session, target, like).subquery()
+    return session.query(model.id, model.name).filter(sa.or_(
+        name_match,
+        model.city.ilike(like, escape='\\'),
+        model.state.ilike(like, escape='\\'),
+        model.id.in_(session.query(genre_ids.c.id))
+    )).order_by(name_match.desc(), model.name).limit(limit).all()
+
+
+def _trigram_search(session, target, term, limit):
+    model = target.model
+    like = _like_pattern(term)
+    name_match = model.name.ilike(like, escape='\\')
+    # each ILIKE below is served by its own gin_trgm_ops index (BitmapOr)
+    text_hits = session.query(
+        model.id.label('id'),
+        (sa.func.similarity(model.name, term) + sa.cast(name_match, sa.Integer)).label('score')
+    ).filter(sa.or_(
+        name_match,
+        model.city.ilike(like, escape='\\'),
+        model.state.ilike(like, escape='\\')
+    ))
+    genre_hits = _genre_matches(session, target, like).add_columns(
+        sa.literal(0.0).label('score'))
+    return _ranked(session, target, text_hits.union_all(genre_hits), limit)
+
+
+def _fts_search(session, target, term, limit):
+    fts = sa.table(target.fts_table, sa.column('rowid'), sa.column(target.fts_table))
+    phrase = '"{}"'.format(term.replace('"', '""'))
+    # bm25 is lower-is-better; weight name hits over city and state
+    rank = sa.func.bm25(sa.literal_column(target.fts_table), 10.0, 1.0, 1.0)
+    text_hits = session.query(
+        fts.c.rowid.label('id'), (-rank).label('score')
+    ).filter(fts.c[target.fts_table].match(phrase))
+    genre_hits = _genre_matches(session, target, _like_pattern(term)).add_columns(
+        sa.literal(0.0).label('score'))
+    return _ranked(session, target, text_hits.union_all(genre_hits), limit)
+
+
+def _has_fts_table(session, table):
+    key = (str(session.get_bind().url), table)
+    if key not in _fts_tables:
+        _fts_tables[key] = session.execute(
+            sa.text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+            {'name': table}).first() is not None
+    return _fts_tables[key]
@@ -2,3 +2,62 @@ window.parseISOString = function parseISOString(s) {
   var b = s.split(/\D+/);
   return new Date(Date.UTC(b[0], --b[1], b[2], b[3], b[4], b[5], b[6]));
 };
+
+// Typeahead suggestions for the navbar search boxes, debounced so a burst of
+// keystrokes results in a single request to /api/search.
+(function () {
+  var DEBOUNCE_MS = 200;
+
+  function debounce(fn, wait) {
+    var timer;
+    return function () {
+      var args = arguments;
+      clearTimeout(timer);
+      timer = setTimeout(function () { fn.apply(null, args); }, wait);
+    };
+  }
+
+  function attach(form) {
+    var input = form.querySelector('input[name="search_term"]');
+    var type = form.getAttribute('action').indexOf('/artists') === 0 ? 'artist' : 'venue';
+    var list = document.createElement('ul');
+    var latest = '';
+    list.className = 'typeahead';
+    form.appendChild(list);
+
+    function render(data) {
+      list.innerHTML = '';
+      data.forEach(function (item) {
+        var li = document.createElement('li');
+        var a = document.createElement('a');
+        a.href = '/' + type + 's/' + item.id;
+        a.textContent = item.name;
+        li.appendChild(a);
+        list.appendChild(li);
+      });
+    }
+
+    input.setAttribute('autocomplete', 'off');
+    input.addEventListener('input', debounce(function () {
+      var q = input.value.trim();
+      latest = q;
+      if (!q) {
+        render([]);
+        return;
+      }
+      fetch('/api/search?type=' + type + '&q=' + encodeURIComponent(q))
+        .then(function (response) { return response.json(); })
+        .then(function (result) {
+          // drop responses that arrive after the user kept typing
+          if (q === latest) {
+            render(result.data);
+          }
+        });
+    }, DEBOUNCE_MS));
+    input.addEventListener('blur', function () {
+      setTimeout(function () { render([]); }, DEBOUNCE_MS);
+    });
+  }
+
+  Array.prototype.forEach.call(document.querySelectorAll('form.search'), attach);
+})();
@@ -0,0 +1,26 @@
+"""Fixtures the tests share: the app under TestingConfig, its tables created
+from the models on a fresh in-memory SQLite database for every test."""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def fyyur_app():
+    from app import create_app, db
+
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+
+
+@pytest.fixture
+def session(fyyur_app):
+    from app import db
+
+    return db.session
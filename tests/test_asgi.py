@@ -0,0 +1,56 @@
+import asyncio
+
+import pytest
+
+
+@pytest.fixture
+def asgi(fyyur_app, session, monkeypatch):
+    # asgi.py builds an app from FYYUR_ENV on import; requests go to fyyur_app
+    monkeypatch.setenv('FYYUR_ENV', 'testing')
+    import asgi
+    from app import Venue
+
+    session.add(Venue(id=1, name='Venue', city='San Francisco', state='CA', address='1 Main St'))
+    session.commit()
+    monkeypatch.setattr(asgi, 'app', fyyur_app)
+    return asgi
+
+
+def call(asgi, method, path, query_string=b''):
+    messages = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        messages.append(message)
+    asyncio.run(asgi.application({'type': 'http', 'method': method, 'path': path, 'query_string': query_string,
+                                  'headers': [], 'http_version': '1.1', 'scheme': 'http'}, receive, send))
+    start, body = messages
+    return start['status'], dict(start['headers']), body['body']
+
+
+def test_api(asgi):
+    status, headers, body = call(asgi, 'GET', '/api/v1/venues/1', b'fields=id,name')
+    assert status == 200
+    assert headers[b'content-type'] == b'application/json'
+    assert b'"Venue"' in body
+
+
+def test_head_and_method_not_allowed(asgi):
+    status, headers, body = call(asgi, 'HEAD', '/api/v1/venues/1')
+    assert (status, body) == (200, b'')
+    status, headers, body = call(asgi, 'POST', '/api/v1/venues/1')
+    assert status == 405
+    assert b'GET' in headers[b'allow']
+
+
+def test_profiled(asgi, fyyur_app):
+    def requests():
+        routes = fyyur_app.test_client().get('/__metrics').get_json()['routes']
+        return routes.get('GET /api/v1/<path:path>', {}).get('requests', 0)
+
+    # the profiler is shared by every app in the process
+    before = requests()
+    call(asgi, 'GET', '/api/v1/venues')
+    assert requests() == before + 1
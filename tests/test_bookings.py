@@ -0,0 +1,110 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from bookings import SHOW_DURATION, Booking, sweep
+
+START = datetime(2030, 5, 1, 20, 0)
+
+
+@pytest.fixture
+def validator(session):
+    from app import Artist, Show, Venue, booking_validator
+
+    for number in (1, 2):
+        session.add(Venue(id=number, name=f'Venue {number}', city='San Francisco', state='CA',
+                          address=f'{number} Main St'))
+        session.add(Artist(id=number, name=f'Artist {number}', city='San Francisco', state='CA'))
+    # stored: artist 1 at venue 1 at START
+    session.add(Show(id=1, venue_id=1, artist_id=1, start_date=START))
+    session.commit()
+    return booking_validator
+
+
+def check(session, validator, *bookings):
+    return validator.check_schedule(session, [
+        Booking(None, venue_id, artist_id, start_date, number)
+        for number, (venue_id, artist_id, start_date) in enumerate(bookings, 1)])
+
+
+def test_no_conflict(session, validator):
+    assert check(session, validator,
+                 (1, 2, START + SHOW_DURATION * 2),
+                 (2, 2, START - SHOW_DURATION),
+                 (2, 1, START + timedelta(days=1))) == {}
+
+
+def test_overlap_with_stored_show(session, validator):
+    errors = check(session, validator, (1, 2, START + timedelta(minutes=30)))
+    assert list(errors) == [1]
+    assert errors[1] == [f'venue 1 is already booked by show 1 within {SHOW_DURATION} of that time']
+
+
+def test_overlap_between_new_bookings_rejects_the_later(session, validator):
+    errors = check(session, validator,
+                   (2, 2, START + timedelta(hours=1)),
+                   (2, 1, START + timedelta(days=1)),
+                   (2, 2, START))
+    assert list(errors) == [1]
+    assert 'record 3' in errors[1][0]
+
+
+def test_touching_endpoints_do_not_conflict(session, validator):
+    # each show ends exactly when the next one at the venue starts
+    assert check(session, validator,
+                 (1, 2, START + SHOW_DURATION),
+                 (1, 2, START + SHOW_DURATION * 2),
+                 (1, 2, START - SHOW_DURATION)) == {}
+
+
+def test_same_artist_at_two_venues(session, validator):
+    errors = check(session, validator,
+                   (2, 1, START + timedelta(minutes=90)),
+                   (2, 2, START + timedelta(days=1)),
+                   (1, 2, START + timedelta(days=1, minutes=30)))
+    assert sorted(errors) == [1, 3]
+    assert errors[1] == [f'artist 1 is already booked by show 1 within {SHOW_DURATION} of that time']
+    assert errors[3] == [f'artist 2 is already booked by record 2 within {SHOW_DURATION} of that time']
+
+
+def test_unknown_venue_and_artist(session, validator):
+    errors = check(session, validator, (9, 8, START + timedelta(days=2)))
+    assert errors == {1: ['venue 9 does not exist', 'artist 8 does not exist']}
+
+
+def test_rejected_booking_blocks_nothing(session, validator):
+    # the second would clash with the first, which the stored show rejects
+    assert list(check(session, validator,
+                      (1, 2, START + timedelta(hours=1)),
+                      (1, 2, START + timedelta(hours=2, minutes=30)))) == [1]
+
+
+def test_validate_single_booking(session, validator):
+    assert validator.validate(session, 1, 2, START + SHOW_DURATION) == []
+    assert validator.validate(session, 1, 2, START + timedelta(minutes=119)) == [
+        f'venue 1 already has show 1 within {SHOW_DURATION} of that time']
+    # a show does not clash with itself when it is edited
+    assert validator.validate(session, 1, 1, START + timedelta(minutes=30), exclude_id=1) == []
+
+
+def test_sweep():
+    bookings = sorted([
+        Booking(1, 1, 1, START),
+        Booking(2, 1, 2, START + SHOW_DURATION),
+        Booking(3, 1, 3, START + SHOW_DURATION + timedelta(minutes=1)),
+        Booking(4, 2, 1, START + timedelta(minutes=10)),
+    ], key=lambda booking: (booking.venue_id, booking.start_date))
+    assert [(conflict.first.show_id, conflict.second.show_id)
+            for conflict in sweep(bookings, 'venue')] == [(2, 3)]
+    bookings.sort(key=lambda booking: (booking.artist_id, booking.start_date))
+    assert [(conflict.first.show_id, conflict.second.show_id)
+            for conflict in sweep(bookings, 'artist')] == [(1, 4)]
+
+
+def test_stored_conflicts(session, validator):
+    from app import Show
+
+    session.add(Show(id=2, venue_id=2, artist_id=1, start_date=START + timedelta(hours=1)))
+    session.commit()
+    assert [(conflict.kind, conflict.first.show_id, conflict.second.show_id)
+            for conflict in validator.stored_conflicts(session)] == [('artist', 1, 2)]
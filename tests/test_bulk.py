@@ -0,0 +1,102 @@
+import pytest
+
+from bulk import import_records, validate_record
+
+VENUE = {'name': 'The Musical Hop', 'city': 'San Francisco', 'state': 'CA', 'address': '1015 Folsom Street',
+         'phone': '1231231234', 'facebook_link': 'https://www.facebook.com/TheMusicalHop',
+         'genres': 'Jazz;Reggae', 'seeking_talent': 'true'}
+
+
+@pytest.fixture
+def genres(session):
+    from app import Genre
+
+    session.add_all(Genre(name=name) for name in ('Jazz', 'Reggae', 'Folk'))
+    session.commit()
+    return {genre.name: genre.id for genre in Genre.query}
+
+
+def validate(kind, record):
+    from app import bulk_spec, genre_registry
+
+    return validate_record(bulk_spec(kind), record, genre_registry)
+
+
+def test_valid_venue(genres):
+    values, genre_ids, errors = validate('venues', VENUE)
+    assert errors is None
+    assert values['name'] == 'The Musical Hop'
+    assert values['talent'] is True
+    assert values['website_Link'] is None
+    assert genre_ids == sorted([genres['Jazz'], genres['Reggae']])
+
+
+@pytest.mark.parametrize('changes, field', [
+    ({'name': ''}, 'name'),
+    ({'address': None}, 'address'),
+    ({'phone': '123'}, 'phone'),
+    ({'phone': '123456789x'}, 'phone'),
+    ({'state': 'XX'}, 'state'),
+    ({'facebook_link': 'not a link'}, 'facebook_link'),
+    ({'genres': ''}, 'genres'),
+    ({'genres': 'Jazz;Polka'}, 'genres'),
+    ({'id': 'seven'}, 'id'),
+])
+def test_malformed_venue(genres, changes, field):
+    values, genre_ids, errors = validate('venues', {**VENUE, **changes})
+    assert values is None and genre_ids is None
+    assert list(errors) == [field]
+
+
+def test_unknown_genre_is_named(genres):
+    assert validate('venues', {**VENUE, 'genres': ['Jazz', 'Polka']})[2] == {'genres': ["unknown genre 'Polka'"]}
+
+
+def test_repeated_genres_link_once(genres):
+    values, genre_ids, errors = validate('venues', {**VENUE, 'genres': 'Jazz; Jazz ;jazz'})
+    assert errors is None
+    assert genre_ids == [genres['Jazz']]
+
+
+def test_booleans(genres):
+    for value, expected in (('false', False), ('0', False), ('no', False), ('', False), ('Y', True), (True, True)):
+        assert validate('venues', {**VENUE, 'seeking_talent': value})[0]['talent'] is expected, value
+
+
+@pytest.mark.parametrize('record, field', [
+    ({'venue_id': 'one', 'artist_id': '1', 'start_time': '2030-05-01 20:00:00'}, 'venue_id'),
+    ({'venue_id': '1', 'artist_id': '1', 'start_time': 'tomorrow'}, 'start_time'),
+    ({'venue_id': '1', 'artist_id': '1'}, 'start_time'),
+])
+def test_malformed_show(session, record, field):
+    values, _, errors = validate('shows', record)
+    assert values is None
+    assert field in errors
+
+
+def test_show_start_time_formats(session):
+    for start_time in ('2030-05-01 20:00:00', '2030-05-01T20:00:00', ' 2030-05-01T20:00 '):
+        values, _, errors = validate('shows', {'venue_id': '1', 'artist_id': '2', 'start_time': start_time})
+        assert errors is None, start_time
+        assert (values['venue_id'], values['artist_id'], str(values['start_date'])) == (1, 2, '2030-05-01 20:00:00')
+
+
+def test_import_rejects_duplicate_ids(session, genres):
+    from app import Venue, bulk_spec, genre_registry
+
+    session.add(Venue(id=5, name='Stored', city='San Francisco', state='CA', address='1 Main St'))
+    session.commit()
+    records = [
+        {**VENUE, 'id': '1'},
+        {**VENUE, 'id': '5'},  # stored already
+        {**VENUE, 'id': '1'},  # earlier in the file
+        {**VENUE, 'name': ''},
+        {**VENUE, 'id': '2'},
+        VENUE,  # no id, so a new one
+    ]
+    progress, rejected = import_records(session, bulk_spec('venues'), records, genre_registry,
+                                        chunk_size=2, report=lambda progress: None)
+    assert progress.rows == 3
+    assert [(number, list(errors)) for number, errors in rejected] == [(2, ['id']), (3, ['id']), (4, ['name'])]
+    assert rejected[0][1] == {'id': ['duplicate id 5']}
+    assert sorted(row[0] for row in session.query(Venue.name)) == ['Stored'] + ['The Musical Hop'] * 3
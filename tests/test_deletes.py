@@ -0,0 +1,69 @@
+from datetime import datetime
+
+import pytest
+
+
+@pytest.fixture
+def seeded(session):
+    from app import Artist, Show, Venue
+
+    for number in (1, 2, 3):
+        session.add(Venue(id=number, name=f'Venue {number}', city='San Francisco', state='CA', address='1 Main St'))
+        session.add(Artist(id=number, name=f'Artist {number}', city='San Francisco', state='CA'))
+    session.add(Show(venue_id=1, artist_id=2, start_date=datetime(2030, 5, 1, 20, 0)))
+    session.commit()
+    return session
+
+
+def ids(session, model):
+    return sorted(row[0] for row in session.query(model.id))
+
+
+def test_delete_venue(fyyur_app, seeded):
+    from app import Show, Venue
+
+    response = fyyur_app.test_client().post('/venues/1')
+    assert response.status_code == 200
+    assert ids(seeded, Venue) == [2, 3]
+    assert ids(seeded, Show) == []
+
+
+@pytest.mark.parametrize('path', ['/venues/9', '/artists/9'])
+def test_delete_missing_is_not_found(fyyur_app, seeded, path):
+    assert fyyur_app.test_client().post(path).status_code == 404
+
+
+def test_bulk_delete(fyyur_app, seeded):
+    from app import Artist
+
+    client = fyyur_app.test_client()
+    response = client.post('/artists/delete', json={'ids': [1, 2, 9]})
+    assert response.status_code == 200
+    assert response.get_json()['requested'] == 3
+    assert response.get_json()['deleted']['Artist'] == 2
+    assert ids(seeded, Artist) == [3]
+
+
+@pytest.mark.parametrize('body', [{'json': {'ids': ['x']}}, {'json': [1, 2]}, {'data': {'ids': '1,two'}}])
+def test_bulk_delete_rejects_malformed_ids(fyyur_app, seeded, body):
+    from app import Venue
+
+    assert fyyur_app.test_client().post('/venues/delete', **body).status_code == 400
+    assert ids(seeded, Venue) == [1, 2, 3]
+
+
+def test_bulk_delete_requires_csrf_token(fyyur_app, seeded):
+    from app import Venue
+
+    fyyur_app.config['WTF_CSRF_ENABLED'] = True
+    client = fyyur_app.test_client()
+    assert client.post('/venues/delete', json={'ids': [1]}).status_code == 400
+    assert client.post('/venues/delete', data={'ids': '1', 'csrf_token': 'forged'}).status_code == 400
+    assert ids(seeded, Venue) == [1, 2, 3]
+
+    token = client.get('/venues/delete').get_json()['csrf_token']
+    assert client.post('/venues/delete', json={'ids': [1], 'csrf_token': token}).status_code == 200
+    assert client.post('/venues/delete', data={'ids': '2,3', 'csrf_token': token}).status_code == 200
+    assert ids(seeded, Venue) == []
+    # a token is only good with the session it was issued to
+    assert fyyur_app.test_client().post('/venues/delete', json={'ids': [1], 'csrf_token': token}).status_code == 400
@@ -0,0 +1,92 @@
+import math
+import random
+
+import pytest
+
+from geo import GEOHASH_BITS, distance_km, geohash, geohash_ranges
+
+# on the antimeridian, by the poles, on cell boundaries at every precision,
+# and somewhere ordinary
+CENTRES = [(0.0, 179.999), (-12.5, -179.999), (60.0, 180.0), (89.99, 10.0), (-89.9, -45.0), (90.0, 0.0),
+           (0.0, 0.0), (45.0, -90.0), (37.7749, -122.4194)]
+RADII = [0.5, 25, 120, 500]
+
+
+def destination(latitude, longitude, bearing, km):
+    # the point km along the great circle leaving (latitude, longitude) at bearing
+    phi, lam, theta, delta = math.radians(latitude), math.radians(longitude), math.radians(bearing), km / 6371.0088
+    phi2 = math.asin(math.sin(phi) * math.cos(delta) + math.cos(phi) * math.sin(delta) * math.cos(theta))
+    lam2 = lam + math.atan2(math.sin(theta) * math.sin(delta) * math.cos(phi),
+                            math.cos(delta) - math.sin(phi) * math.sin(phi2))
+    return math.degrees(phi2), (math.degrees(lam2) + 180) % 360 - 180
+
+
+def covered(ranges, latitude, longitude):
+    key = geohash(latitude, longitude)
+    return any(low <= key <= high for low, high in ranges)
+
+
+@pytest.mark.parametrize('centre', CENTRES)
+@pytest.mark.parametrize('radius', RADII)
+def test_ranges_cover_every_point_within_the_radius(centre, radius):
+    rng = random.Random(f'{centre}{radius}')
+    ranges = geohash_ranges(*centre, radius)
+    points = [destination(*centre, rng.uniform(0, 360), radius * math.sqrt(rng.random())) for _ in range(2000)]
+    # the rim, where the circle crosses into the neighbouring cells
+    points += [destination(*centre, bearing, radius * 0.999) for bearing in range(0, 360, 5)]
+    missed = [point for point in points if distance_km(*centre, *point) <= radius and not covered(ranges, *point)]
+    assert missed == []
+
+
+@pytest.mark.parametrize('centre', CENTRES)
+def test_ranges_are_sorted_and_disjoint(centre):
+    ranges = geohash_ranges(*centre, 25)
+    assert all(low <= high for low, high in ranges)
+    assert all(previous[1] + 1 < current[0] for previous, current in zip(ranges, ranges[1:]))
+    assert 0 <= ranges[0][0] and ranges[-1][1] < 1 << GEOHASH_BITS
+
+
+def test_small_radius_reads_few_cells():
+    # 3x3 cells of about the radius across, not the whole world
+    ranges = geohash_ranges(37.7749, -122.4194, 1)
+    assert sum(high - low + 1 for low, high in ranges) < (1 << GEOHASH_BITS) >> 24
+
+
+def test_antimeridian_wraps():
+    ranges = geohash_ranges(0.0, 179.999, 25)
+    assert covered(ranges, 0.0, -179.9)
+    assert covered(ranges, 0.0, 179.9)
+
+
+def test_geohash_interleaves_longitude_first():
+    assert geohash(-90, -180) == 0
+    assert geohash(90, 180) == (1 << GEOHASH_BITS) - 1
+    # the eastern hemisphere has the top bit set, the northern the next one
+    assert geohash(-45, 90) >> (GEOHASH_BITS - 2) == 0b10
+    assert geohash(45, -90) >> (GEOHASH_BITS - 2) == 0b01
+
+
+def test_venues_near_matches_brute_force(session, fyyur_app):
+    from app import NEAR_RESULT_LIMIT, Venue
+    from geo import centroids
+
+    rng = random.Random(7)
+    # venues are placed at their city's centroid, so many share a position
+    cities = [(state, city) for state, city in centroids() if city]
+    session.add_all(Venue(id=number, name=f'Venue {number:03d}', city=city, state=state, address='1 Main St')
+                    for number, (state, city) in enumerate(rng.choices(cities, k=1500), 1))
+    session.commit()
+    positions = session.query(Venue.name, Venue.latitude, Venue.longitude).all()
+
+    client = fyyur_app.test_client()
+    centre = (40.2, -75.1)
+    counts = []
+    for radius in (40, 150, 500):
+        expected = sorted((distance_km(*centre, latitude, longitude), name) for name, latitude, longitude in positions)
+        expected = [name for distance, name in expected if distance <= radius][:NEAR_RESULT_LIMIT]
+        page = client.get(f'/venues/near?lat={centre[0]}&lon={centre[1]}&radius={radius}').get_data(as_text=True)
+        assert [line.strip()[len('<h5>'):-len('</h5>')] for line in page.splitlines()
+                if line.strip().startswith('<h5>Venue ')] == expected
+        counts.append(len(expected))
+    # some within the smaller radii, and more than the page lists within the largest
+    assert 0 < counts[0] < counts[1] < counts[2] == NEAR_RESULT_LIMIT
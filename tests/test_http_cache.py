@@ -0,0 +1,65 @@
+from datetime import datetime
+
+import pytest
+
+
+@pytest.fixture
+def shows(session):
+    from app import Artist, Show, Venue
+
+    session.add(Venue(id=1, name='Venue', city='San Francisco', state='CA', address='1 Main St'))
+    session.add(Artist(id=1, name='Artist', city='San Francisco', state='CA'))
+    session.add_all([Show(id=number, venue_id=1, artist_id=1, start_date=datetime(2030, 5, number, 20, 0))
+                     for number in (1, 2)])
+    session.commit()
+    return session
+
+
+def get(client, path, **kwargs):
+    response = client.get(path, **kwargs)
+    response.get_data()  # streamed pages query while they are read
+    return response
+
+
+def test_not_modified(fyyur_app, shows):
+    client = fyyur_app.test_client()
+    first = get(client, '/shows')
+    assert first.status_code == 200
+    assert get(client, '/shows', headers={'If-None-Match': first.headers['ETag']}).status_code == 304
+
+
+def test_delete_changes_etag(fyyur_app, shows):
+    from app import Show
+
+    client = fyyur_app.test_client()
+    first = get(client, '/shows')
+    # deleting leaves the newest updated_at as it was; the count changes
+    shows.query(Show).filter(Show.id == 1).delete()
+    shows.commit()
+    response = get(client, '/shows', headers={'If-None-Match': first.headers['ETag']})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != first.headers['ETag']
+
+
+def test_no_last_modified(fyyur_app, shows):
+    client = fyyur_app.test_client()
+    assert 'Last-Modified' not in get(client, '/shows').headers
+    response = get(client, '/shows', headers={'If-Modified-Since': 'Fri, 01 Jan 2100 00:00:00 GMT'})
+    assert response.status_code == 200
+
+
+def test_fingerprinted_static_is_immutable(fyyur_app):
+    from flask import url_for
+
+    with fyyur_app.test_request_context():
+        url = url_for('static', filename='css/main.css')
+    assert '?v=' in url
+    client = fyyur_app.test_client()
+    assert 'immutable' in client.get(url).headers['Cache-Control']
+
+
+@pytest.mark.parametrize('query', ['', '?v=0123456789ab', '?v=anything'])
+def test_other_static_urls_are_not_immutable(fyyur_app, query):
+    response = fyyur_app.test_client().get('/static/css/main.css' + query)
+    assert response.status_code == 200
+    assert 'immutable' not in response.headers.get('Cache-Control', '')
@@ -0,0 +1,30 @@
+import pytest
+
+INTERNAL_PATHS = ['/__metrics', '/__cache']
+
+
+def build(**settings):
+    from app import create_app
+    from config import get_config
+
+    config = get_config('testing')
+    for name, value in settings.items():
+        setattr(config, name, value)
+    return create_app(config)
+
+
+@pytest.mark.parametrize('path', INTERNAL_PATHS)
+def test_off_in_production(path):
+    assert build(TESTING=False).test_client().get(path).status_code == 404
+
+
+@pytest.mark.parametrize('path', INTERNAL_PATHS)
+def test_on_when_enabled(path):
+    response = build(TESTING=False, ENABLE_INTERNAL_ENDPOINTS=True).test_client().get(path)
+    assert response.status_code == 200
+    assert response.is_json
+
+
+@pytest.mark.parametrize('path', INTERNAL_PATHS)
+def test_on_in_testing(path):
+    assert build().test_client().get(path).status_code == 200
@@ -0,0 +1,170 @@
+import pytest
+
+import search as search_module
+from search import MIN_INDEXED_TERM_LENGTH, search
+from typeahead import PrefixIndex
+
+VENUES = [
+    # id, name, city, state, genres
+    (1, 'The Musical Hop', 'San Francisco', 'CA', ['Jazz', 'Reggae']),
+    (2, 'Park Square Live Music & Coffee', 'San Francisco', 'CA', ['Rock n Roll']),
+    (3, 'The Dueling Pianos Bar', 'New York', 'NY', ['Classical', 'Musical Theatre']),
+    (4, 'Hopscotch Hall', 'Musical Springs', 'TN', ['Folk']),
+]
+
+
+@pytest.fixture
+def migrated(fyyur_app):
+    # the search indexes only exist in the migrated schema
+    from flask_migrate import downgrade, upgrade
+
+    from app import Genre, Venue, db, init_migrations, venue_genre
+
+    db.drop_all()
+    init_migrations(fyyur_app)
+    upgrade()
+    # the migrations add the standard genres
+    genres = {genre.name: genre for genre in Genre.query}
+    for venue_id, name, city, state, genre_names in VENUES:
+        db.session.add(Venue(id=venue_id, name=name, city=city, state=state, address='1 Main St'))
+        for genre_name in genre_names:
+            if genre_name not in genres:
+                genres[genre_name] = Genre(name=genre_name)
+                db.session.add(genres[genre_name])
+    db.session.flush()
+    db.session.execute(venue_genre.insert(), [
+        {'venue_id': venue_id, 'genre_id': genres[genre_name].id}
+        for venue_id, _, _, _, genre_names in VENUES for genre_name in genre_names])
+    db.session.commit()
+    yield db.session
+    db.session.remove()
+    downgrade(revision='base')
+    search_module._fts_tables.clear()
+
+
+def names(rows):
+    return [row[1] for row in rows]
+
+
+def venue_search(session, term):
+    from app import venue_search as target
+
+    return search(session, target, term)
+
+
+def test_name_matches_rank_first(migrated):
+    # 'Musical' also matches venue 3's genre and venue 4's city
+    assert names(venue_search(migrated, 'musical'))[0] == 'The Musical Hop'
+    assert set(names(venue_search(migrated, 'musical'))) == {
+        'The Musical Hop', 'The Dueling Pianos Bar', 'Hopscotch Hall'}
+
+
+def test_partial_and_case_insensitive(migrated):
+    # the cases the original TODO asked for
+    assert set(names(venue_search(migrated, 'Hop'))) == {'The Musical Hop', 'Hopscotch Hall'}
+    assert set(names(venue_search(migrated, 'Music'))[:2]) == {'The Musical Hop', 'Park Square Live Music & Coffee'}
+    assert venue_search(migrated, 'MUSIC') == venue_search(migrated, 'music')
+
+
+def test_city_state_and_genre(migrated):
+    assert names(venue_search(migrated, 'new york')) == ['The Dueling Pianos Bar']
+    assert names(venue_search(migrated, 'reggae')) == ['The Musical Hop']
+
+
+def test_special_characters_are_literal(migrated):
+    assert names(venue_search(migrated, '& Co')) == ['Park Square Live Music & Coffee']
+    assert venue_search(migrated, '100%') == []
+    assert venue_search(migrated, 'a_b') == []
+    assert venue_search(migrated, '"') == []
+
+
+def test_empty_term(migrated):
+    assert venue_search(migrated, '') == []
+    assert venue_search(migrated, '   ') == []
+
+
+def test_indexed_search_agrees_with_the_fallback(migrated):
+    # the ILIKE scan answers short terms and databases without an index
+    from app import venue_search as target
+
+    for term in ('musical', 'Hop', 'san francisco', 'jazz', 'coffee', 'zzz'):
+        indexed = search(migrated, target, term)
+        fallback = search_module._ilike_search(migrated, target, term, search_module.SEARCH_RESULT_LIMIT)
+        assert set(indexed) == set(fallback), term
+
+
+def test_backend_index_is_used(migrated):
+    from app import venue_search as target
+
+    statements = []
+    engine = migrated.get_bind()
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    from sqlalchemy import event
+    event.listen(engine, 'before_cursor_execute', listener)
+    try:
+        search(migrated, target, 'musical')
+        search(migrated, target, 'mu'[:MIN_INDEXED_TERM_LENGTH - 1])
+    finally:
+        event.remove(engine, 'before_cursor_execute', listener)
+    index_use = 'similarity(' if engine.dialect.name == 'postgresql' else 'venue_fts MATCH'
+    assert index_use in statements[-2]
+    assert index_use not in statements[-1]
+
+
+def test_missing_fts_table_falls_back(session):
+    # create_all makes no FTS tables, as on a database not yet migrated
+    from app import Venue, venue_search as target
+
+    if session.get_bind().dialect.name != 'sqlite':
+        pytest.skip('FTS5 is the SQLite index')
+    session.add(Venue(id=1, name='The Musical Hop', city='San Francisco', state='CA', address='1 Main St'))
+    session.commit()
+    assert names(search(session, target, 'musical')) == ['The Musical Hop']
+    search_module._fts_tables.clear()
+
+
+def prefix_index(rows, **kwargs):
+    return PrefixIndex(lambda: rows, **kwargs)
+
+
+def test_prefix_index_matches_any_word():
+    index = prefix_index([(1, 'The Musical Hop'), (2, 'Park Square Live Music & Coffee'), (3, 'Hopscotch')])
+    assert [row['id'] for row in index.lookup('hop')] == [1, 3]
+    assert [row['id'] for row in index.lookup('music')] == [2, 1]
+    assert index.lookup('musical hop') == [{'id': 1, 'name': 'The Musical Hop'}]
+    assert index.lookup('usical') == []
+
+
+def test_prefix_index_folds_case_and_spaces():
+    index = prefix_index([(1, 'The Musical Hop')])
+    assert index.lookup('MUSICAL') == index.lookup('musical') == index.lookup('  musical   HOP ')
+    assert index.lookup('') == index.lookup('   ') == []
+
+
+def test_prefix_index_orders_and_limits():
+    # alphabetical by the matching words, each entity once
+    index = prefix_index([(1, 'Blue Bar'), (2, 'Bar Blue'), (3, 'Barn'), (4, 'Bar Bar')])
+    assert [row['id'] for row in index.lookup('bar')] == [1, 4, 2, 3]
+    assert [row['id'] for row in index.lookup('bar', limit=2)] == [1, 4]
+
+
+def test_prefix_index_writes():
+    index = prefix_index([(1, 'The Musical Hop')])
+    index.add(2, 'Hop House')
+    # not loaded yet, so the add was a no-op; the lookup loads the index
+    assert [row['id'] for row in index.lookup('hop')] == [1]
+    index.add(2, 'Hop House')
+    assert [row['id'] for row in index.lookup('hop')] == [1, 2]
+    index.add(1, 'The Jazz Cellar')
+    assert [row['id'] for row in index.lookup('hop')] == [2]
+    assert index.lookup('jazz') == [{'id': 1, 'name': 'The Jazz Cellar'}]
+    index.remove(2)
+    assert index.lookup('hop') == []
+
+
+def test_prefix_index_reloads_when_stale():
+    rows = [(1, 'The Musical Hop')]
+    index = prefix_index(rows, max_age=0)
+    assert len(index.lookup('hop')) == 1
+    rows.append((2, 'Hop House'))
+    assert len(index.lookup('hop')) == 2
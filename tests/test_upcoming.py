@@ -0,0 +1,61 @@
+from collections import namedtuple
+from datetime import datetime
+
+import pytest
+
+from upcoming import ICS_LINE_LENGTH, _ics_line, _ics_text, ics_calendar
+
+
+def physical_lines(folded):
+    assert folded.endswith('\r\n')
+    return folded[:-2].split('\r\n')
+
+
+def unfold(folded):
+    return folded[:-2].replace('\r\n ', '')
+
+
+@pytest.mark.parametrize('line', [
+    'SUMMARY:' + 'a' * (ICS_LINE_LENGTH - len('SUMMARY:')),
+    'SUMMARY:' + 'a' * (ICS_LINE_LENGTH - len('SUMMARY:') + 1),
+    'SUMMARY:' + 'a' * 500,
+    # two, three and four octet characters over the fold points
+    'SUMMARY:' + 'é' * 100,
+    'SUMMARY:' + 'a' + '€' * 60,
+    'SUMMARY:' + 'ab' + '🎸' * 40,
+    'LOCATION:' + 'Café Müller, 東京 ' * 12,
+])
+def test_folded_lines_fit_and_unfold(line):
+    folded = _ics_line(line)
+    lines = physical_lines(folded)
+    assert all(len(part.encode('utf-8')) <= ICS_LINE_LENGTH for part in lines)
+    assert all(part.startswith(' ') for part in lines[1:])
+    assert unfold(folded) == line
+
+
+def test_line_at_the_limit_is_not_folded():
+    line = 'SUMMARY:' + 'é' * ((ICS_LINE_LENGTH - len('SUMMARY:')) // 2) + 'a'
+    assert len(line.encode('utf-8')) == ICS_LINE_LENGTH
+    assert _ics_line(line) == line + '\r\n'
+
+
+def test_multibyte_character_moves_to_the_next_line():
+    # the 75th octet would be the first of '€''s three
+    line = 'X' * (ICS_LINE_LENGTH - 1) + '€'
+    assert physical_lines(_ics_line(line)) == ['X' * (ICS_LINE_LENGTH - 1), ' €']
+
+
+def test_text_escaping():
+    assert _ics_text('Rock; Roll, \\ and\nmore') == 'Rock\; Roll\\, \\\\ and\\nmore'
+    assert _ics_text(None) == ''
+
+
+def test_calendar():
+    Row = namedtuple('Row', ['show_id', 'start_date', 'artist_name', 'venue_name'])
+    rows = [Row(7, datetime(2030, 5, 1, 20, 0), 'Guns N Petals', 'The Musical Hop, SF')]
+    feed = ''.join(ics_calendar('The Musical Hop', rows, lambda row: f'http://localhost/shows/{row.show_id}'))
+    lines = feed.split('\r\n')
+    assert lines[0] == 'BEGIN:VCALENDAR' and lines[-2:] == ['END:VCALENDAR', '']
+    assert 'UID:show-7@fyyur' in lines
+    assert 'DTSTART:20300501T200000' in lines
+    assert 'SUMMARY:Guns N Petals at The Musical Hop\\, SF' in lines
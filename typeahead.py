@@ -0,0 +1,91 @@
+"""In-process prefix index behind the /api/search typeahead.
+
+Every word position of every name is stored as a lowercased key in one sorted
+list, so a keystroke is two bisects and a short slice instead of a query. The
+index loads itself from the database on first use and is then kept current by
+the create/edit/delete handlers. Other worker processes only see those writes
+after their own copy expires, so entries are reloaded every ``max_age`` seconds.
+"""
+import threading
+import time
+from bisect import bisect_left, bisect_right, insort
+
+TYPEAHEAD_LIMIT = 10
+TYPEAHEAD_MAX_AGE = 300
+
+
+class PrefixIndex:
+
+    def __init__(self, loader, max_age=TYPEAHEAD_MAX_AGE):
+        # loader returns an iterable of (id, name) rows
+        self.loader = loader
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._keys = []
+        self._names = {}
+        self._loaded_at = None
+
+    @staticmethod
+    def _keys_for(entity_id, name):
+        words = name.lower().split()
+        return [(' '.join(words[i:]), entity_id) for i in range(len(words))]
+
+    def _is_fresh(self):
+        return self._loaded_at is not None and time.monotonic() - self._loaded_at < self.max_age
+
+    def load(self):
+        rows = list(self.loader())
+        keys = []
+        for entity_id, name in rows:
+            keys.extend(self._keys_for(entity_id, name))
+        keys.sort()
+        with self._lock:
+            self._keys = keys
+            self._names = dict(rows)
+            self._loaded_at = time.monotonic()
+
+    def _discard(self, entity_id):
+        name = self._names.pop(entity_id, None)
+        if name is None:
+            return
+        for key in self._keys_for(entity_id, name):
+            i = bisect_left(self._keys, key)
+            if i < len(self._keys) and self._keys[i] == key:
+                del self._keys[i]
+
+    def add(self, entity_id, name):
+        """Insert or rename an entity. A no-op until the index is first loaded."""
+        with self._lock:
+            if self._loaded_at is None:
+                return
+            self._discard(entity_id)
+            self._names[entity_id] = name
+            for key in self._keys_for(entity_id, name):
+                insort(self._keys, key)
+
+    def remove(self, entity_id):
+        with self._lock:
+            self._discard(entity_id)
+
+    def lookup(self, prefix, limit=TYPEAHEAD_LIMIT):
+        """Return up to ``limit`` {id, name} dicts whose name has a word starting
+        with ``prefix``, in alphabetical order of the matching key."""
+        prefix = ' '.join(prefix.lower().split())
+        if not prefix:
+            return []
+        if not self._is_fresh():
+            self.load()
+
+        results = []
+        seen = set()
+        with self._lock:
+            i = bisect_left(self._keys, (prefix,))
+            end = bisect_right(self._keys, (prefix + '\uffff',))
+            for j in range(i, end):
+                entity_id = self._keys[j][1]
+                if entity_id not in seen:
+                    seen.add(entity_id)
+                    results.append({'id': entity_id, 'name': self._names[entity_id]})
+                    if len(results) == limit:
+                        break
+        return results
@@ -0,0 +1,211 @@
+"""The upcoming-shows store behind /shows, the detail pages and the .ics feeds.
+
+``upcoming_show`` holds one row per show that has not started yet, with the
+venue's and artist's names and images copied in, so those pages read one
+indexed table instead of joining Show to Venue and Artist. Writes keep it
+current incrementally in the same transaction as the change; a background
+``UpcomingRefresher`` drops rows as their shows start and periodically
+rebuilds the whole table to repair anything written behind its back. Readers
+still filter on ``start_date``, so a row the refresher has not dropped yet is
+never shown as upcoming.
+
+Every worker process starts a refresher, but on PostgreSQL only the one
+holding ``RefresherLock`` runs it, and rebuilds take a transaction lock, so
+the refresher and ``flask fyyur refresh-upcoming`` never rebuild at once.
+"""
+import logging
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+
+logger = logging.getLogger(__name__)
+
+ICS_LINE_LENGTH = 75
+# PostgreSQL advisory lock keys
+REFRESHER_LOCK = 4_700_001
+REBUILD_LOCK = 4_700_002
+
+
+class UpcomingShows:
+
+    def __init__(self, store, show, venue, artist):
+        self.store = store
+        self.show = show
+        self.venue = venue
+        self.artist = artist
+        self.columns = ['show_id', 'venue_id', 'artist_id', 'start_date', 'venue_name',
+                        'venue_image_link', 'artist_name', 'artist_image_link']
+
+    def _source(self, session, now, *filters):
+        show, venue, artist = self.show, self.venue, self.artist
+        return session.query(
+            show.id, show.venue_id, show.artist_id, show.start_date, venue.name,
+            venue.image_link, artist.name, artist.image_link
+        ).join(venue, venue.id == show.venue_id).join(artist, artist.id == show.artist_id).filter(
+            show.start_date > now, *filters)
+
+    def _insert(self, session, source):
+        session.execute(self.store.__table__.insert().from_select(self.columns, source.statement))
+
+    def rebuild(self, session, now=None):
+        """Replace the whole table from Show; the caller commits."""
+        if session.get_bind().dialect.name == 'postgresql':
+            # a second rebuild would insert the rows of shows the first one
+            # inserted after its DELETE, and fail on their keys
+            session.execute(text('SELECT pg_advisory_xact_lock(:key)'), {'key': REBUILD_LOCK})
+        session.query(self.store).delete(synchronize_session=False)
+        self._insert(session, self._source(session, now or datetime.now()))
+
+    def expire(self, session, now=None):
+        """Drop the shows that have started; return how many there were."""
+        return session.query(self.store).filter(
+            self.store.start_date <= (now or datetime.now())).delete(synchronize_session=False)
+
+    def upsert_shows(self, session, *show_ids):
+        self.remove_shows(session, *show_ids)
+        self._insert(session, self._source(session, datetime.now(), self.show.id.in_(show_ids)))
+
+    def remove_shows(self, session, *show_ids):
+        session.query(self.store).filter(
+            self.store.show_id.in_(show_ids)).delete(synchronize_session=False)
+
+    def sync_venue(self, session, venue):
+        session.query(self.store).filter(self.store.venue_id == venue.id).update({
+            self.store.venue_name: venue.name,
+            self.store.venue_image_link: venue.image_link
+        }, synchronize_session=False)
+
+    def sync_artist(self, session, artist):
+        session.query(self.store).filter(self.store.artist_id == artist.id).update({
+            self.store.artist_name: artist.name,
+            self.store.artist_image_link: artist.image_link
+        }, synchronize_session=False)
+
+
+class RefresherLock:
+    """A PostgreSQL session advisory lock one process at a time holds, on a
+    connection of its own, for as long as it runs; when the process exits the
+    connection closes and another process takes the lock. Other databases
+    always grant it: they serve a single process in development."""
+
+    def __init__(self, key=REFRESHER_LOCK):
+        self.key = key
+        self._connection = None
+
+    def acquire(self, engine):
+        """Whether this process holds the lock, taking it if it is free."""
+        if engine.dialect.name != 'postgresql':
+            return True
+        if self._connection is not None:
+            try:
+                # the lock lives as long as the connection does
+                self._connection.execute(text('SELECT 1'))
+                return True
+            except SQLAlchemyError:
+                logger.warning('lost the upcoming refresher lock connection', exc_info=True)
+                self.release()
+        connection = engine.connect().execution_options(isolation_level='AUTOCOMMIT')
+        try:
+            held = connection.execute(text('SELECT pg_try_advisory_lock(:key)'), {'key': self.key}).scalar()
+        except SQLAlchemyError:
+            connection.close()
+            raise
+        if held:
+            self._connection = connection
+        else:
+            connection.close()
+        return bool(held)
+
+    def release(self):
+        if self._connection is not None:
+            try:
+                self._connection.close()
+            except SQLAlchemyError:
+                pass
+            self._connection = None
+
+
+class UpcomingRefresher:
+    """Calls ``expire`` every ``interval`` seconds and ``rebuild`` every
+    ``rebuild_interval`` seconds on a daemon thread, once started, skipping
+    the ticks on which ``lock()`` (if given) is false."""
+
+    def __init__(self, expire, rebuild, interval=60, rebuild_interval=3600, lock=None):
+        self.expire = expire
+        self.rebuild = rebuild
+        self.interval = interval
+        self.rebuild_interval = rebuild_interval
+        self.lock = lock
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        if self._thread is not None or not self.interval:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name='upcoming-refresher', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        rebuilt_at = time.monotonic()
+        while True:
+            time.sleep(self.interval)
+            try:
+                if self.lock is not None and not self.lock():
+                    continue
+                if self.rebuild_interval and time.monotonic() - rebuilt_at >= self.rebuild_interval:
+                    self.rebuild()
+                    rebuilt_at = time.monotonic()
+                else:
+                    self.expire()
+            except Exception:
+                logger.exception('refreshing upcoming shows failed')
+
+
+def _ics_text(value):
+    return (value or '').replace('\\', '\\\\').replace(';', '\\;').replace(
+        ',', '\\,').replace('\r\n', '\\n').replace('\n', '\\n')
+
+
+def _ics_line(line):
+    # fold at 75 octets without splitting a UTF-8 sequence (RFC 5545, 3.1)
+    encoded = line.encode('utf-8')
+    if len(encoded) <= ICS_LINE_LENGTH:
+        return line + '\r\n'
+    parts = []
+    limit = ICS_LINE_LENGTH
+    while encoded:
+        cut = min(limit, len(encoded))
+        while cut < len(encoded) and (encoded[cut] & 0xC0) == 0x80:
+            cut -= 1
+        parts.append(encoded[:cut].decode('utf-8'))
+        encoded = encoded[cut:]
+        limit = ICS_LINE_LENGTH - 1
+    return '\r\n '.join(parts) + '\r\n'
+
+
+def ics_calendar(name, rows, event_url, host='fyyur'):
+    """Yield an iCalendar feed of ``rows`` (upcoming_show rows) chunk by chunk.
+
+    Start times are written as floating local times, the way they are
+    stored. ``event_url(row)`` returns the page to link each event to."""
+    stamp = datetime.utcnow().strftime('%Y%m%dT%H%M%SZ')
+    yield ''.join(_ics_line(line) for line in (
+        'BEGIN:VCALENDAR', 'VERSION:2.0', f'PRODID:-//{host}//upcoming shows//EN',
+        'CALSCALE:GREGORIAN', f'X-WR-CALNAME:{_ics_text(name)}'))
+    for row in rows:
+        yield ''.join(_ics_line(line) for line in (
+            'BEGIN:VEVENT',
+            f'UID:show-{row.show_id}@{host}',
+            f'DTSTAMP:{stamp}',
+            f'DTSTART:{row.start_date.strftime("%Y%m%dT%H%M%S")}',
+            f'SUMMARY:{_ics_text(row.artist_name)} at {_ics_text(row.venue_name)}',
+            f'LOCATION:{_ics_text(row.venue_name)}',
+            f'URL:{event_url(row)}',
+            'END:VEVENT'))
+    yield 'END:VCALENDAR\r\n'